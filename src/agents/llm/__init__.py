@@ -1,14 +1,47 @@
-from .base import BaseModel
+from .base import BaseModel, BatchResult, ToolCall, ToolCallResponse
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_breaker
+from .client_pool import ClientPool, get_client_pool
 from .factory import model_factory
+from .fallback import FallbackModel
 from .manager import ModelManager
 from .model_adapter import OpenAIModel, XFSparkModel
+from .rate_limiter import RateLimiter, TokenBucket, estimate_tokens, get_rate_limiter
 from .registry import ModelRegistry
+from .response_cache import (
+    LRUCacheBackend,
+    ResponseCache,
+    SqliteCacheBackend,
+    get_response_cache,
+)
+from .router import LatencyStats, ModelRouter
+from .single_flight import SingleFlight, get_single_flight
 
 __all__ = [
     "BaseModel",
+    "BatchResult",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "ClientPool",
+    "FallbackModel",
     "ModelRegistry",
     "ModelManager",
+    "ModelRouter",
+    "LatencyStats",
+    "RateLimiter",
+    "TokenBucket",
+    "estimate_tokens",
+    "get_rate_limiter",
+    "LRUCacheBackend",
+    "ResponseCache",
+    "SqliteCacheBackend",
+    "get_response_cache",
+    "SingleFlight",
+    "get_single_flight",
     "OpenAIModel",
     "XFSparkModel",
+    "ToolCall",
+    "ToolCallResponse",
+    "get_circuit_breaker",
+    "get_client_pool",
     "model_factory",
 ]
@@ -1,10 +1,105 @@
+import json
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+)
 
 import anyio
 
+from .circuit_breaker import is_provider_failure
+from .rate_limiter import estimate_tokens, headers_from_error, retry_after_from_error
+from .response_cache import is_deterministic, request_fingerprint
+
+if TYPE_CHECKING:
+    from .circuit_breaker import CircuitBreaker
+    from .rate_limiter import RateLimiter
+    from .response_cache import ResponseCache
+    from .single_flight import SingleFlight
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class ToolCall:
+    """模型返回的一次结构化工具调用；参数不是合法 JSON 对象时 error 非空"""
+
+    id: str
+    name: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+    error: str = ""
+
+
+@dataclass(frozen=True)
+class ToolCallResponse:
+    """原生函数调用的模型输出：content 为文本部分，tool_calls 可能包含多个并行调用"""
+
+    content: str = ""
+    tool_calls: List[ToolCall] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ToolCallResponse":
+        return cls(
+            content=data.get("content", ""),
+            tool_calls=[ToolCall(**call) for call in data.get("tool_calls", [])],
+        )
+
+    @property
+    def final_answer(self) -> str:
+        return self.content.split("Final Answer:")[-1].strip()
+
+    def to_react_text(self) -> str:
+        """转换为 ReAct 文本记录，与文本解析模式共用同一种 scratchpad 格式"""
+        if not self.tool_calls:
+            return f"Final Answer: {self.final_answer}"
+        lines = []
+        content = self.content.strip()
+        if content:
+            lines.append(
+                content if content.startswith("Thought:") else f"Thought: {content}"
+            )
+        for call in self.tool_calls:
+            lines.append(f"Action: {call.name}")
+            lines.append(
+                f"Action Input: {json.dumps(call.arguments, ensure_ascii=False)}"
+            )
+        return "\n".join(lines)
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    """批量生成中单个提示词的结果；失败时 output 为 None，error 为对应异常"""
+
+    index: int
+    output: Optional[str] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 
 class BaseModel(ABC):
+    # 可选的响应缓存、请求合并器、限流器与熔断器，由工厂按配置挂载，
+    # 作用于 *_with_retry 调用；限流器与熔断器同时作用于 stream_with_breaker
+    response_cache: Optional["ResponseCache"] = None
+    single_flight: Optional["SingleFlight"] = None
+    rate_limiter: Optional["RateLimiter"] = None
+    circuit_breaker: Optional["CircuitBreaker"] = None
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -20,6 +115,11 @@ class BaseModel(ABC):
     def function_calling(self) -> bool:
         pass
 
+    @property
+    def api_key_hash(self) -> str:
+        """API Key 摘要：缓存与请求合并按它区分租户，不使用密钥的模型为空串"""
+        return ""
+
     @abstractmethod
     async def generate(self, prompt: str, **kwargs) -> str:
         pass
@@ -29,6 +129,12 @@ class BaseModel(ABC):
         response = await self.generate(prompt, **kwargs)
         yield response
 
+    async def generate_tool_calls(
+        self, prompt: str, tools: List[Dict[str, Any]], **kwargs
+    ) -> ToolCallResponse:
+        """原生函数调用：传入 OpenAI 格式的工具列表，返回结构化的工具调用"""
+        raise NotImplementedError(f"{self.name} 不支持原生函数调用")
+
     async def generate_with_retry(
         self,
         prompt: str,
@@ -36,8 +142,218 @@ class BaseModel(ABC):
         timeout_s: float = 60.0,
         max_retries: int = 2,
         backoff_s: float = 0.5,
+        use_cache: bool = True,
+        coalesce: bool = True,
+        rate_limit_key: Optional[str] = None,
         **kwargs: Any,
     ) -> str:
+        return await self._shared_call(
+            "text",
+            prompt,
+            kwargs,
+            lambda: self._call_with_retry(
+                lambda: self.generate(prompt, **kwargs),
+                timeout_s=timeout_s,
+                max_retries=max_retries,
+                backoff_s=backoff_s,
+                rate_limit_key=rate_limit_key,
+                estimate=lambda: self._estimate_request_tokens(prompt, kwargs),
+            ),
+            use_cache=use_cache,
+            coalesce=coalesce,
+        )
+
+    async def generate_tool_calls_with_retry(
+        self,
+        prompt: str,
+        tools: List[Dict[str, Any]],
+        *,
+        timeout_s: float = 60.0,
+        max_retries: int = 2,
+        backoff_s: float = 0.5,
+        use_cache: bool = True,
+        coalesce: bool = True,
+        rate_limit_key: Optional[str] = None,
+        **kwargs: Any,
+    ) -> ToolCallResponse:
+        return await self._shared_call(
+            "tools",
+            prompt,
+            {**kwargs, "tools": tools},
+            lambda: self._call_with_retry(
+                lambda: self.generate_tool_calls(prompt, tools, **kwargs),
+                timeout_s=timeout_s,
+                max_retries=max_retries,
+                backoff_s=backoff_s,
+                rate_limit_key=rate_limit_key,
+                estimate=lambda: self._estimate_request_tokens(prompt, kwargs),
+            ),
+            use_cache=use_cache,
+            coalesce=coalesce,
+            encode=ToolCallResponse.to_dict,
+            decode=ToolCallResponse.from_dict,
+        )
+
+    async def generate_batch(
+        self,
+        prompts: Sequence[str],
+        *,
+        max_concurrency: int = 8,
+        **kwargs: Any,
+    ) -> List[BatchResult]:
+        """
+        并发生成一批提示词，结果按输入顺序返回
+
+        每个提示词独立经过 generate_with_retry（含重试、缓存与请求合并），
+        单个失败不影响其余提示词，失败信息记录在对应 BatchResult.error 中。
+
+        注意：OpenAIModel 原有的 generate_batch 返回 list[str]，失败项为
+        "Error: ..." 字符串；现统一返回 BatchResult，旧调用方改为读取
+        item.output / item.error。
+        """
+        async with self.stream_batch(
+            prompts, max_concurrency=max_concurrency, **kwargs
+        ) as stream:
+            results = [item async for item in stream]
+        return sorted(results, key=lambda item: item.index)
+
+    @asynccontextmanager
+    async def stream_batch(
+        self,
+        prompts: Sequence[str],
+        *,
+        max_concurrency: int = 8,
+        **kwargs: Any,
+    ) -> AsyncIterator[AsyncIterator[BatchResult]]:
+        """
+        并发生成一批提示词，按完成顺序逐个产出结果
+
+        用法：``async with model.stream_batch(prompts) as stream:
+        async for item in stream: ...``。结果流归调用方所有，
+        可以随时 break；退出上下文时取消尚未完成的请求。
+        """
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency 必须为正整数")
+
+        limiter = anyio.CapacityLimiter(max_concurrency)
+        send, receive = anyio.create_memory_object_stream(len(prompts))
+
+        async def _worker(index: int, prompt: str, send: Any) -> None:
+            async with send:
+                async with limiter:
+                    try:
+                        output = await self.generate_with_retry(prompt, **kwargs)
+                        item = BatchResult(index=index, output=output)
+                    except Exception as e:
+                        item = BatchResult(index=index, error=e)
+                send.send_nowait(item)
+
+        # 每个 worker 持有一个发送端副本，全部完成后结果流自然结束
+        async with anyio.create_task_group() as tg, receive:
+            async with send:
+                for index, prompt in enumerate(prompts):
+                    tg.start_soon(_worker, index, prompt, send.clone())
+            yield receive
+            tg.cancel_scope.cancel()
+
+    async def _shared_call(
+        self,
+        kind: str,
+        prompt: str,
+        key_kwargs: Dict[str, Any],
+        call: Callable[[], Awaitable[T]],
+        *,
+        use_cache: bool,
+        coalesce: bool,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value,
+    ) -> T:
+        """依次经过响应缓存与请求合并，再执行（带重试的）实际调用"""
+        cache = self.response_cache if use_cache else None
+        cache_key = cache.make_key(self, kind, prompt, key_kwargs) if cache else None
+        if cache_key is not None:
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                return decode(cached)
+
+        async def _run() -> T:
+            result = await call()
+            if cache_key is not None and result is not None:
+                await cache.set(cache_key, encode(result))
+            return result
+
+        flights = self.single_flight if coalesce else None
+        # 采样调用（temperature > 0）各自独立，合并会让并发请求拿到同一份输出
+        if flights is None or not is_deterministic(self, key_kwargs):
+            return await _run()
+        # 重试发生在 leader 内部，等待者共享同一轮重试的最终结果
+        return await flights.do(
+            request_fingerprint(self, kind, prompt, key_kwargs), _run
+        )
+
+    def _estimate_request_tokens(self, prompt: str, kwargs: Dict[str, Any]) -> int:
+        """限流用的 token 预估：输入提示词 / 消息 + 最大输出 token 数"""
+        messages = kwargs.get("messages")
+        if messages:
+            text = "\n".join(str(m.get("content") or "") for m in messages)
+        else:
+            text = prompt
+        max_tokens = kwargs.get("max_tokens")
+        if max_tokens is None:
+            max_tokens = self.get_model_info().get("max_tokens") or 0
+        return estimate_tokens(text) + int(max_tokens)
+
+    async def stream_with_breaker(
+        self, prompt: str, *, rate_limit_key: Optional[str] = None, **kwargs: Any
+    ) -> AsyncIterator[str]:
+        """
+        经过限流与熔断器的流式生成
+
+        先等待限流名额再检查熔断器，半开状态的探测名额不会在排队期间被占用；
+        熔断时直接抛出 CircuitOpenError，流结束或失败时记录结果。流式输出不重试。
+        """
+        await self.throttle(prompt, rate_limit_key=rate_limit_key, **kwargs)
+        breaker = self.circuit_breaker
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            async for chunk in self.stream_generate(prompt, **kwargs):
+                yield chunk
+        except Exception as e:
+            if breaker is not None:
+                if is_provider_failure(e):
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+            raise
+        except BaseException:
+            # 取消或调用方提前关闭流：没有结论，归还探测名额
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+
+    async def throttle(
+        self, prompt: str, *, rate_limit_key: Optional[str] = None, **kwargs: Any
+    ) -> None:
+        """等待限流名额；*_with_retry 与 stream_with_breaker 已自动调用"""
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(
+                self._estimate_request_tokens(prompt, kwargs),
+                key=rate_limit_key or "default",
+            )
+
+    async def _call_with_retry(
+        self,
+        call: Callable[[], Awaitable[T]],
+        *,
+        timeout_s: float,
+        max_retries: int,
+        backoff_s: float,
+        rate_limit_key: Optional[str] = None,
+        estimate: Optional[Callable[[], int]] = None,
+    ) -> T:
         if timeout_s <= 0:
             raise ValueError("timeout_s 必须为正数")
         if max_retries < 0:
@@ -45,16 +361,43 @@ class BaseModel(ABC):
         if backoff_s < 0:
             raise ValueError("backoff_s 不能为负数")
 
+        limiter = self.rate_limiter
+        breaker = self.circuit_breaker
+        tokens = estimate() if limiter is not None and estimate is not None else 0
         last_error: Optional[Exception] = None
         for attempt in range(max_retries + 1):
+            # 先排队等待限流名额（不计入单次调用超时），再检查熔断器：
+            # 半开状态的探测名额只在真正发出请求前占用，排队期间不阻塞其他调用方
+            if limiter is not None:
+                await limiter.acquire(tokens, key=rate_limit_key or "default")
+            # 熔断时直接失败，不再等待超时与重试
+            if breaker is not None:
+                breaker.before_call()
             try:
                 with anyio.fail_after(timeout_s):
-                    return await self.generate(prompt, **kwargs)
+                    result = await call()
             except Exception as e:
                 last_error = e
+                if breaker is not None:
+                    if is_provider_failure(e):
+                        breaker.record_failure()
+                    else:
+                        breaker.release()
+                if limiter is not None:
+                    limiter.update_from_headers(headers_from_error(e))
                 if attempt >= max_retries:
                     raise
-                await anyio.sleep(backoff_s * (2**attempt))
+                # 服务端给出 Retry-After 时以其为准，否则指数退避
+                retry_after = retry_after_from_error(e)
+                await anyio.sleep(max(backoff_s * (2**attempt), retry_after or 0.0))
+            except BaseException:
+                if breaker is not None:
+                    breaker.release()
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
         raise last_error or RuntimeError("模型调用失败")
 
     def get_model_info(self) -> Dict[str, Any]:
@@ -0,0 +1,148 @@
+"""熔断器 - 服务商持续失败时快速失败，避免每个请求都等满超时与重试"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, Literal, Optional
+
+logger = logging.getLogger(__name__)
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态，调用被直接拒绝"""
+
+    def __init__(self, name: str, retry_in_s: float):
+        super().__init__(f"模型服务 {name} 已熔断，{retry_in_s:.1f} 秒后重试")
+        self.name = name
+        self.retry_in_s = retry_in_s
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    判断异常是否应计入熔断统计
+
+    请求本身有误（4xx，超时 / 冲突 / 限流除外）说明服务商是健康的，不计入。
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in (408, 409, 429)
+    return True
+
+
+class CircuitBreaker:
+    """
+    三态熔断器
+
+    - closed：正常放行，连续失败 failure_threshold 次后进入 open；
+    - open：直接抛出 CircuitOpenError，recovery_timeout_s 后进入 half_open；
+    - half_open：最多放行 half_open_max_calls 个探测请求，
+      探测成功则恢复 closed，失败则重新 open。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        recovery_timeout_s: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if failure_threshold <= 0 or half_open_max_calls <= 0:
+            raise ValueError("failure_threshold / half_open_max_calls 必须为正整数")
+        if recovery_timeout_s <= 0:
+            raise ValueError("recovery_timeout_s 必须为正数")
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout_s = recovery_timeout_s
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._state: CircuitState = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._counters: Dict[str, int] = {"rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> CircuitState:
+        if (
+            self._state == "open"
+            and self._clock() - self._opened_at >= self.recovery_timeout_s
+        ):
+            self._state = "half_open"
+            self._probes = 0
+        return self._state
+
+    def before_call(self) -> None:
+        """调用前检查；不允许调用时抛出 CircuitOpenError"""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return
+        self._counters["rejected"] += 1
+        retry_in = max(0.0, self._opened_at + self.recovery_timeout_s - self._clock())
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self) -> None:
+        if self._state != "closed":
+            logger.info(f"模型服务 {self.name} 已恢复，熔断器关闭")
+        self._state = "closed"
+        self._failures = 0
+        self._probes = 0
+
+    def record_failure(self) -> None:
+        if self._state == "half_open":
+            self._open()
+            return
+        self._failures += 1
+        if self._state == "closed" and self._failures >= self.failure_threshold:
+            self._open()
+
+    def release(self) -> None:
+        """调用被取消、没有结论时归还探测名额"""
+        if self._state == "half_open" and self._probes > 0:
+            self._probes -= 1
+
+    def _open(self) -> None:
+        logger.warning(
+            f"模型服务 {self.name} 连续失败，熔断 {self.recovery_timeout_s} 秒"
+        )
+        self._state = "open"
+        self._opened_at = self._clock()
+        self._failures = 0
+        self._probes = 0
+        self._counters["opened"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self._failures, **self._counters}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(
+    provider: str, base_url: Optional[str] = None
+) -> Optional[CircuitBreaker]:
+    """
+    获取服务商对应的熔断器；LLM_CIRCUIT_BREAKER=False 时返回 None
+
+    同一 provider 的不同 base_url（如远端服务与本地替身）分别熔断。
+    """
+    from src.config import settings
+
+    if not settings.LLM_CIRCUIT_BREAKER:
+        return None
+    key = f"{provider}@{base_url}" if base_url else provider
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = _breakers[key] = CircuitBreaker(
+            key,
+            failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout_s=settings.LLM_CIRCUIT_RECOVERY_S,
+        )
+    return breaker
@@ -0,0 +1,216 @@
+"""模型客户端池 - 在会话与请求之间复用 AsyncOpenAI 客户端和模型实例"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+)
+
+import anyio
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+if TYPE_CHECKING:
+    from .base import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+def hash_api_key(api_key: Optional[str]) -> str:
+    """API Key 只以摘要形式出现在缓存键中"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+class ClientPool:
+    """
+    客户端池
+
+    - 客户端按 (base_url, api_key 摘要) 复用，共享同一个 HTTP 连接池，
+      避免每个请求重新握手 TLS；
+    - 模型实例按 (base_url, api_key 摘要, model, 其余配置) 复用；
+    - 超过 idle_ttl_s 未被使用的条目在下次访问时被淘汰。
+    被淘汰的客户端先退役，再过 idle_ttl_s 后由 sweep 关闭其 HTTP 连接池，
+    淘汰前刚开始的长时间请求（如流式输出）不受影响。
+    """
+
+    def __init__(
+        self,
+        *,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        idle_ttl_s: float = 300.0,
+    ) -> None:
+        if max_connections <= 0 or max_keepalive_connections < 0:
+            raise ValueError("连接数配置必须为正整数")
+        if idle_ttl_s <= 0:
+            raise ValueError("idle_ttl_s 必须为正数")
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.idle_ttl_s = idle_ttl_s
+
+        self._clients: Dict[Hashable, Tuple[AsyncOpenAI, float]] = {}
+        self._models: Dict[Hashable, Tuple["BaseModel", float]] = {}
+        # 已淘汰、等待关闭的客户端及其淘汰时间
+        self._retired: List[Tuple[AsyncOpenAI, float]] = []
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def get_client(self, *, api_key: str, base_url: Optional[str]) -> AsyncOpenAI:
+        """获取（或创建）共享的 AsyncOpenAI 客户端"""
+        key = (base_url or "", hash_api_key(api_key))
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_sweep(now)
+            entry = self._clients.get(key)
+            if entry is None:
+                limits = httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                )
+                client = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    http_client=DefaultAsyncHttpxClient(limits=limits),
+                )
+            else:
+                client = entry[0]
+            self._clients[key] = (client, now)
+            return client
+
+    def get_model(
+        self,
+        config: Dict[str, Any],
+        create: Callable[[Dict[str, Any]], "BaseModel"],
+    ) -> "BaseModel":
+        """按配置复用模型实例，未命中时调用 create 创建"""
+        key = self._model_key(config)
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_sweep(now)
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models[key] = (entry[0], now)
+                return entry[0]
+
+        # 适配器会就地补全默认配置，这里传入副本
+        model = create(dict(config))
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                model = entry[0]
+            self._models[key] = (model, now)
+        return model
+
+    @staticmethod
+    def _model_key(config: Dict[str, Any]) -> Hashable:
+        rest = {
+            k: v for k, v in config.items() if k not in ("api_key", "base_url", "model")
+        }
+        return (
+            config.get("base_url") or "",
+            hash_api_key(config.get("api_key")),
+            config.get("model") or "",
+            json.dumps(rest, sort_keys=True, ensure_ascii=False, default=str),
+        )
+
+    def _maybe_sweep(self, now: float) -> None:
+        # 调用方需持有 self._lock
+        if now - self._last_sweep < self.idle_ttl_s / 2:
+            return
+        self._last_sweep = now
+        self._evict(now)
+
+    def _evict(self, now: float) -> int:
+        evicted = 0
+        for cache in (self._clients, self._models):
+            expired = [
+                k for k, (_, used) in cache.items() if now - used > self.idle_ttl_s
+            ]
+            for k in expired:
+                entry = cache.pop(k)
+                if cache is self._clients:
+                    self._retired.append((entry[0], now))
+            evicted += len(expired)
+        return evicted
+
+    def evict_idle(self) -> int:
+        """立即淘汰空闲条目，返回淘汰数量"""
+        with self._lock:
+            return self._evict(time.monotonic())
+
+    async def sweep(self) -> int:
+        """淘汰空闲条目，并关闭退役超过 idle_ttl_s 的客户端，返回淘汰数量"""
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._evict(now)
+            closing = [c for c, at in self._retired if now - at >= self.idle_ttl_s]
+            self._retired = [
+                (c, at) for c, at in self._retired if now - at < self.idle_ttl_s
+            ]
+        await self._close_clients(closing)
+        return evicted
+
+    async def run_sweeper(self, interval_s: float) -> None:
+        """后台定期清理，直到所在任务被取消"""
+        while True:
+            await anyio.sleep(interval_s)
+            try:
+                evicted = await self.sweep()
+            except Exception:
+                logger.exception("客户端池清理失败")
+                continue
+            if evicted:
+                logger.info("已淘汰 %d 个空闲模型客户端 / 实例", evicted)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "models": len(self._models),
+                "retired": len(self._retired),
+            }
+
+    @staticmethod
+    async def _close_clients(clients: List[AsyncOpenAI]) -> None:
+        for client in clients:
+            try:
+                await client.close()
+            except Exception:
+                logger.exception("关闭模型客户端失败")
+
+    async def aclose(self) -> None:
+        """关闭所有客户端（用于进程退出前）"""
+        with self._lock:
+            clients = [client for client, _ in self._clients.values()]
+            clients.extend(client for client, _ in self._retired)
+            self._clients.clear()
+            self._models.clear()
+            self._retired.clear()
+        await self._close_clients(clients)
+
+
+_default_pool: Optional[ClientPool] = None
+
+
+def get_client_pool() -> ClientPool:
+    """获取按配置创建的全局客户端池"""
+    global _default_pool
+    if _default_pool is None:
+        from src.config import settings
+
+        _default_pool = ClientPool(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            idle_ttl_s=settings.LLM_CLIENT_IDLE_TTL_S,
+        )
+    return _default_pool
@@ -1,12 +1,18 @@
 from typing import Any, Dict
 
 from .base import BaseModel
+from .circuit_breaker import get_circuit_breaker
+from .client_pool import get_client_pool
+from .fallback import FallbackModel
 from .model_adapter import (
     DeepSeekModel,
     OpenAICompatibleModel,
     OpenAIModel,
     XFSparkModel,
 )
+from .rate_limiter import get_rate_limiter
+from .response_cache import get_response_cache
+from .single_flight import get_single_flight
 
 
 class ModelFactory:
@@ -27,5 +33,43 @@ class ModelFactory:
 
         return model_class(config)
 
+    def get_or_create_model(self, config: Dict[str, Any]) -> BaseModel:
+        """
+        按配置复用模型实例，适合在请求之间共享
+
+        配置中的 fallbacks（或 settings.LLM_FALLBACK_CHAIN 中该 provider 的降级链）
+        非空时返回 FallbackModel，主模型失败或熔断后依次尝试备用模型。
+        """
+        from src.config import settings
+
+        config = dict(config)
+        fallbacks = config.pop("fallbacks", None)
+        if fallbacks is None:
+            provider = str(config.get("provider", "")).lower()
+            fallbacks = settings.LLM_FALLBACK_CHAIN.get(provider, [])
+        model = self._get_or_create_single(config)
+        if not fallbacks:
+            return model
+        chain = [model]
+        for fallback in fallbacks:
+            chain.append(self._get_or_create_single(dict(fallback)))
+        return FallbackModel(chain)
+
+    def _get_or_create_single(self, config: Dict[str, Any]) -> BaseModel:
+        model = get_client_pool().get_model(config, self.create_model)
+        if model.response_cache is None:
+            model.response_cache = get_response_cache()
+        if model.single_flight is None:
+            model.single_flight = get_single_flight()
+        if model.rate_limiter is None:
+            model.rate_limiter = get_rate_limiter(
+                model.provider, model.get_model_info().get("model")
+            )
+        if model.circuit_breaker is None:
+            model.circuit_breaker = get_circuit_breaker(
+                model.provider, model.get_model_info().get("base_url")
+            )
+        return model
+
 
 model_factory = ModelFactory()
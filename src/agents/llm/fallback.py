@@ -0,0 +1,132 @@
+"""降级链 - 主模型失败或熔断时依次尝试备用模型"""
+
+import logging
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+from .base import BaseModel, ToolCallResponse
+from .circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class FallbackModel(BaseModel):
+    """
+    按顺序组合多个模型，对外表现为主模型
+
+    每个成员独立经过自己的重试、缓存、限流与熔断；成员失败（含熔断快速失败）
+    时立即尝试下一个，全部失败时抛出最后一个成员的异常。
+    流式生成只在尚未输出任何内容时降级，避免拼接两个模型的半截回答。
+    """
+
+    def __init__(self, models: Sequence[BaseModel]):
+        if not models:
+            raise ValueError("降级链至少需要一个模型")
+        self.models: List[BaseModel] = list(models)
+
+    @property
+    def primary(self) -> BaseModel:
+        return self.models[0]
+
+    @property
+    def name(self) -> str:
+        return self.primary.name
+
+    @property
+    def provider(self) -> str:
+        return self.primary.provider
+
+    @property
+    def function_calling(self) -> bool:
+        return self.primary.function_calling
+
+    @property
+    def api_key_hash(self) -> str:
+        return self.primary.api_key_hash
+
+    async def _first_success(
+        self, action: str, call: Callable[[BaseModel], Awaitable[T]]
+    ) -> T:
+        last_error: Optional[Exception] = None
+        for index, model in enumerate(self.models):
+            try:
+                return await call(model)
+            except Exception as e:
+                last_error = e
+                if index + 1 < len(self.models):
+                    logger.warning(
+                        f"{model.name} {action}失败，降级到"
+                        f" {self.models[index + 1].name}: {e}"
+                    )
+        assert last_error is not None
+        raise last_error
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        return await self._first_success(
+            "生成", lambda model: model.generate(prompt, **kwargs)
+        )
+
+    async def generate_tool_calls(
+        self, prompt: str, tools: List[Dict[str, Any]], **kwargs
+    ) -> ToolCallResponse:
+        return await self._first_success(
+            "函数调用", lambda model: model.generate_tool_calls(prompt, tools, **kwargs)
+        )
+
+    async def generate_with_retry(self, prompt: str, **kwargs: Any) -> str:
+        return await self._first_success(
+            "生成", lambda model: model.generate_with_retry(prompt, **kwargs)
+        )
+
+    async def generate_tool_calls_with_retry(
+        self, prompt: str, tools: List[Dict[str, Any]], **kwargs: Any
+    ) -> ToolCallResponse:
+        return await self._first_success(
+            "函数调用",
+            lambda model: model.generate_tool_calls_with_retry(prompt, tools, **kwargs),
+        )
+
+    async def stream_generate(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
+        async for chunk in self.stream_with_breaker(prompt, **kwargs):
+            yield chunk
+
+    async def stream_with_breaker(
+        self, prompt: str, *, rate_limit_key: Optional[str] = None, **kwargs: Any
+    ) -> AsyncGenerator[str, None]:
+        """依次尝试各成员，每个成员各自等待自己的限流名额并经过自己的熔断器"""
+        last_error: Optional[Exception] = None
+        for model in self.models:
+            started = False
+            try:
+                async for chunk in model.stream_with_breaker(
+                    prompt, rate_limit_key=rate_limit_key, **kwargs
+                ):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+                if not isinstance(e, CircuitOpenError):
+                    logger.warning(f"{model.name} 流式生成失败，尝试降级: {e}")
+                continue
+            return
+        assert last_error is not None
+        raise last_error
+
+    def get_model_info(self) -> Dict[str, Any]:
+        return {
+            **self.primary.get_model_info(),
+            "fallbacks": [model.get_model_info() for model in self.models[1:]],
+        }
@@ -1,13 +1,50 @@
-from typing import Optional
+from typing import Dict, List, Optional, Sequence
 
 from .base import BaseModel
+from .circuit_breaker import get_circuit_breaker
+from .fallback import FallbackModel
+from .rate_limiter import get_rate_limiter
 from .registry import ModelRegistry
+from .router import ModelRouter
+
+
+def _attach_guards(model: BaseModel) -> BaseModel:
+    """为直接注册的模型补上按服务商共享的限流器与熔断器（与工厂创建的模型一致）"""
+    info = model.get_model_info()
+    if model.rate_limiter is None:
+        model.rate_limiter = get_rate_limiter(model.provider, info.get("model"))
+    if model.circuit_breaker is None:
+        model.circuit_breaker = get_circuit_breaker(
+            model.provider, info.get("base_url")
+        )
+    return model
 
 
 class ModelManager:
-    def __init__(self, registry: Optional[ModelRegistry] = None):
+    def __init__(
+        self,
+        registry: Optional[ModelRegistry] = None,
+        router: Optional[ModelRouter] = None,
+    ):
         self._registry = registry or ModelRegistry()
+        self._router = router or ModelRouter(self._registry)
         self._default_model: Optional[str] = None
+        self._fallbacks: Dict[str, List[str]] = {}
+
+    @property
+    def router(self) -> ModelRouter:
+        return self._router
+
+    def set_model_group(self, group: str, model_names: Sequence[str]) -> None:
+        """配置可互相替代的模型组，generate(group=...) 时按延迟路由"""
+        self._router.set_group(group, model_names)
+
+    def set_fallback_chain(self, model_name: str, fallbacks: Sequence[str]) -> None:
+        """配置降级链：model_name 失败或熔断时依次尝试 fallbacks 中的模型"""
+        for name in (model_name, *fallbacks):
+            if name not in self._registry.list_models():
+                raise ValueError(f"Model '{name}' not found")
+        self._fallbacks[model_name] = list(fallbacks)
 
     def set_default_model(self, model_name: str) -> None:
         if model_name not in self._registry.list_models():
@@ -20,20 +57,40 @@ class ModelManager:
         return self._registry.get_model(self._default_model)
 
     async def generate(
-        self, prompt: str, model_name: Optional[str] = None, **kwargs
+        self,
+        prompt: str,
+        model_name: Optional[str] = None,
+        *,
+        group: Optional[str] = None,
+        hedge: Optional[bool] = None,
+        **kwargs,
     ) -> str:
+        if group is not None:
+            return await self._router.generate(group, prompt, hedge=hedge, **kwargs)
         model = self._get_model(model_name)
-        return await model.generate(prompt, **kwargs)
+        # 经过重试、限流与熔断；降级链中的每个成员各自生效
+        return await model.generate_with_retry(prompt, **kwargs)
 
     def _get_model(self, model_name: Optional[str]) -> BaseModel:
         if model_name:
             model = self._registry.get_model(model_name)
             if not model:
                 raise ValueError(f"Model '{model_name}' not found")
-            return model
+            return self._with_fallbacks(model)
 
         default_model = self.get_default_model()
         if not default_model:
             raise ValueError("No model specified and no default model set")
 
-        return default_model
+        return self._with_fallbacks(default_model)
+
+    def _with_fallbacks(self, model: BaseModel) -> BaseModel:
+        chain = [
+            self._registry.get_model(name)
+            for name in self._fallbacks.get(model.name, [])
+        ]
+        model = _attach_guards(model)
+        chain = [_attach_guards(fallback) for fallback in chain if fallback is not None]
+        if not chain:
+            return model
+        return FallbackModel([model, *chain])
@@ -1,9 +1,11 @@
+import json
 import logging
-from typing import Any, AsyncGenerator, Dict
+from typing import Any, AsyncGenerator, Dict, List
 
 from openai import AsyncOpenAI
 
-from ..base import BaseModel
+from ..base import BaseModel, ToolCall, ToolCallResponse
+from ..client_pool import get_client_pool, hash_api_key
 
 logger = logging.getLogger(__name__)
 
@@ -22,11 +24,22 @@ class OpenAICompatibleModel(BaseModel):
         self._max_tokens = config.get("max_tokens", 4096)
         self._temperature = config.get("temperature", 0.7)
         self._function_calling = config.get("function_calling", False)
+        # 部分兼容服务不接受 parallel_tool_calls 字段，未配置时不发送
+        self._parallel_tool_calls = config.get("parallel_tool_calls")
 
         if not self._api_key:
             raise ValueError(f"API key is required for {self._name}")
 
-        self.client = AsyncOpenAI(api_key=self._api_key, base_url=self._base_url)
+    @property
+    def client(self) -> AsyncOpenAI:
+        """从全局客户端池获取共享客户端，同一 base_url + api_key 复用连接"""
+        return get_client_pool().get_client(
+            api_key=self._api_key, base_url=self._base_url
+        )
+
+    @property
+    def api_key_hash(self) -> str:
+        return hash_api_key(self._api_key)
 
     @property
     def name(self) -> str:
@@ -40,16 +53,29 @@ class OpenAICompatibleModel(BaseModel):
     def function_calling(self) -> bool:
         return self._function_calling
 
-    async def generate(self, prompt: str, **kwargs) -> str:
-        messages = kwargs.get("messages", [{"role": "user", "content": prompt}])
+    def _build_messages(self, prompt: str, kwargs: Dict[str, Any]) -> List[Dict]:
+        messages = list(kwargs.get("messages", [{"role": "user", "content": prompt}]))
         # 如果提供了 system_prompt 且当前消息中没有 system 角色，则自动插入
         if "system_prompt" in kwargs and not any(
             m["role"] == "system" for m in messages
         ):
             messages.insert(0, {"role": "system", "content": kwargs["system_prompt"]})
+        return messages
+
+    async def _create_completion(self, **params: Any) -> Any:
+        """非流式补全；挂载了限流器时读取响应头中的限流信息"""
+        completions = self.client.chat.completions
+        if self.rate_limiter is None:
+            return await completions.create(**params)
+        raw = await completions.with_raw_response.create(**params)
+        self.rate_limiter.update_from_headers(raw.headers)
+        return await raw.parse()
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        messages = self._build_messages(prompt, kwargs)
 
         try:
-            completion = await self.client.chat.completions.create(
+            completion = await self._create_completion(
                 model=self._model,
                 messages=messages,
                 max_tokens=kwargs.get("max_tokens", self._max_tokens),
@@ -61,12 +87,57 @@ class OpenAICompatibleModel(BaseModel):
             logger.error(f"Error generating response from {self._name}: {e}")
             raise
 
+    async def generate_tool_calls(
+        self, prompt: str, tools: List[Dict[str, Any]], **kwargs
+    ) -> ToolCallResponse:
+        messages = self._build_messages(prompt, kwargs)
+        params: Dict[str, Any] = {}
+        parallel_tool_calls = kwargs.get(
+            "parallel_tool_calls", self._parallel_tool_calls
+        )
+        if parallel_tool_calls is not None:
+            params["parallel_tool_calls"] = parallel_tool_calls
+
+        try:
+            completion = await self._create_completion(
+                model=self._model,
+                messages=messages,
+                tools=tools,
+                max_tokens=kwargs.get("max_tokens", self._max_tokens),
+                temperature=kwargs.get("temperature", self._temperature),
+                stream=False,
+                **params,
+            )
+        except Exception as e:
+            logger.error(f"Error generating tool calls from {self._name}: {e}")
+            raise
+
+        message = completion.choices[0].message
+        tool_calls = []
+        for call in message.tool_calls or []:
+            arguments: Dict[str, Any] = {}
+            error = ""
+            try:
+                parsed = json.loads(call.function.arguments or "{}")
+            except json.JSONDecodeError as e:
+                error = f"参数 JSON 解析失败: {e}"
+            else:
+                if isinstance(parsed, dict):
+                    arguments = parsed
+                else:
+                    error = "参数必须是 JSON 对象"
+            tool_calls.append(
+                ToolCall(
+                    id=call.id,
+                    name=call.function.name,
+                    arguments=arguments,
+                    error=error,
+                )
+            )
+        return ToolCallResponse(content=message.content or "", tool_calls=tool_calls)
+
     async def stream_generate(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
-        messages = kwargs.get("messages", [{"role": "user", "content": prompt}])
-        if "system_prompt" in kwargs and not any(
-            m["role"] == "system" for m in messages
-        ):
-            messages.insert(0, {"role": "system", "content": kwargs["system_prompt"]})
+        messages = self._build_messages(prompt, kwargs)
 
         try:
             stream = await self.client.chat.completions.create(
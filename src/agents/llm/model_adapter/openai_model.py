@@ -15,18 +15,6 @@ class OpenAIModel(OpenAICompatibleModel):
 
         super().__init__(config)
 
-    # 保留批量生成接口，方便与旧代码兼容
-    async def generate_batch(self, prompts: list[str], **kwargs) -> list[str]:
-        # 当前顺序调用，如有需要可改为并发实现
-        results = []
-        for prompt in prompts:
-            try:
-                res = await self.generate(prompt, **kwargs)
-                results.append(res)
-            except Exception as e:
-                results.append(f"Error: {str(e)}")
-        return results
-
     async def get_embedding(self, text: str, **kwargs) -> list[float]:
         try:
             response = await self.client.embeddings.create(
@@ -0,0 +1,311 @@
+"""客户端限流 - 按服务商 / 模型限制每分钟请求数与 token 数，并按会话公平排队"""
+
+import logging
+import re
+import time
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, Mapping, Optional
+
+import anyio
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+_encoding: Any = None
+_encoding_failed = False
+
+
+def load_encoding() -> Any:
+    """
+    加载 tiktoken 编码（首次可能读取磁盘或下载编码文件，属于阻塞操作）
+
+    未安装或加载失败时返回 None，此后不再重试。
+    """
+    global _encoding, _encoding_failed
+    if tiktoken is not None and _encoding is None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _encoding_failed = True
+            logger.info(f"tiktoken 编码不可用，改用字符数估算 token: {e}")
+    return _encoding
+
+
+async def preload_encoding() -> None:
+    """在工作线程中预加载编码，避免首次估算 token 时阻塞事件循环"""
+    await anyio.to_thread.run_sync(load_encoding)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数
+
+    优先使用 tiktoken（cl100k_base）；未安装或编码文件无法获取时，
+    按约 4 个字符 / 1 个 token 粗略估算（中文按 1 个字符 / 1 个 token）。
+    服务进程在启动时调用 preload_encoding，这里不会再触发加载。
+    """
+    encoding = load_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """解析 "20ms" / "1.5s" / "6m0s" 形式的时长，或纯数字秒数"""
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Retry-After 可以是秒数或 HTTP 日期"""
+    seconds = parse_duration(value)
+    if seconds is not None:
+        return seconds
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def headers_from_error(error: BaseException) -> Optional[Mapping[str, str]]:
+    """从 openai / httpx 异常中取出响应头"""
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None)
+
+
+def retry_after_from_error(error: BaseException) -> Optional[float]:
+    headers = headers_from_error(error)
+    if not headers:
+        return None
+    return retry_after_from_headers(headers)
+
+
+def retry_after_from_headers(headers: Mapping[str, str]) -> Optional[float]:
+    """读取 retry-after-ms / retry-after，取值无法解析时返回 None"""
+    for name in ("retry-after-ms", "retry-after"):
+        value = headers.get(name)
+        if value is None:
+            continue
+        if name == "retry-after-ms":
+            try:
+                return max(0.0, float(value) / 1000)
+            except ValueError:
+                continue
+        return parse_retry_after(value)
+    return None
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟额度，按 额度 / 60 每秒匀速补充"""
+
+    def __init__(self, per_minute: float, clock: Callable[[], float]) -> None:
+        if per_minute <= 0:
+            raise ValueError("每分钟额度必须为正数")
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._clock = clock
+        self._level = self.capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self._level -= min(amount, self.capacity)
+
+    def clamp(self, remaining: float) -> None:
+        """服务端报告的剩余额度更少时，以服务端为准"""
+        self._refill()
+        self._level = min(self._level, remaining)
+
+    @property
+    def level(self) -> float:
+        self._refill()
+        return self._level
+
+
+class _Waiter:
+    def __init__(self, tokens: int) -> None:
+        self.tokens = tokens
+        self.turn = anyio.Event()
+
+
+class RateLimiter:
+    """
+    单个服务商 / 模型的限流器
+
+    - requests_per_min / tokens_per_min：两个令牌桶，任一不足都需等待；
+    - 排队按 key（通常为会话 ID）轮转：每个 key 内部先到先得，
+      不同 key 之间轮流放行，批量任务不会饿死交互式会话；
+    - 服务端返回 429 / Retry-After 或 x-ratelimit-* 头时，
+      暂停所有调用方直至恢复，并按服务端报告的剩余额度收紧令牌桶。
+    """
+
+    def __init__(
+        self,
+        *,
+        requests_per_min: Optional[float] = None,
+        tokens_per_min: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._clock = clock
+        self.requests = (
+            TokenBucket(requests_per_min, clock) if requests_per_min else None
+        )
+        self.tokens = TokenBucket(tokens_per_min, clock) if tokens_per_min else None
+        self._blocked_until = 0.0
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._active: Optional[_Waiter] = None
+        self._counters: Dict[str, int] = {"acquired": 0, "throttled": 0}
+
+    def _delay(self, tokens: int) -> float:
+        delay = self._blocked_until - self._clock()
+        if self.requests is not None:
+            delay = max(delay, self.requests.wait_time(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.wait_time(tokens))
+        return delay
+
+    def _schedule_next(self) -> None:
+        # 取队首 key 的第一个等待者；key 在其等待者放行后才移到末尾
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            if not queue:
+                del self._queues[key]
+                continue
+            self._active = queue[0]
+            self._active.turn.set()
+            return
+        self._active = None
+
+    def _remove(self, key: str, waiter: _Waiter) -> None:
+        queue = self._queues.get(key)
+        if queue is not None:
+            try:
+                queue.remove(waiter)
+            except ValueError:
+                pass
+            if not queue:
+                del self._queues[key]
+            else:
+                # 轮转：同一 key 的后续请求排到其他 key 之后
+                self._queues.move_to_end(key)
+
+    async def acquire(self, tokens: int = 0, *, key: str = "default") -> None:
+        """等待直到可以发出一次请求（预计消耗 tokens 个 token）"""
+        waiter = _Waiter(tokens)
+        self._queues.setdefault(key, deque()).append(waiter)
+        if self._active is None:
+            self._schedule_next()
+        try:
+            await waiter.turn.wait()
+            throttled = False
+            while True:
+                delay = self._delay(tokens)
+                if delay <= 0:
+                    break
+                throttled = True
+                await anyio.sleep(delay)
+            if self.requests is not None:
+                self.requests.consume(1)
+            if self.tokens is not None:
+                self.tokens.consume(tokens)
+            self._counters["acquired"] += 1
+            self._counters["throttled"] += int(throttled)
+        finally:
+            self._remove(key, waiter)
+            if self._active is waiter:
+                self._schedule_next()
+
+    def update_from_headers(self, headers: Optional[Mapping[str, str]]) -> None:
+        """根据响应头调整限流状态（429 响应或普通响应均可）"""
+        if not headers:
+            return
+        now = self._clock()
+        pause = 0.0
+        for resource, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            remaining = headers.get(f"x-ratelimit-remaining-{resource}")
+            if remaining is None:
+                continue
+            try:
+                remaining_value = float(remaining)
+            except ValueError:
+                continue
+            if bucket is not None:
+                bucket.clamp(remaining_value)
+            if remaining_value <= 0:
+                reset = parse_duration(
+                    headers.get(f"x-ratelimit-reset-{resource}", "") or ""
+                )
+                pause = max(pause, reset or 0.0)
+        pause = max(pause, retry_after_from_headers(headers) or 0.0)
+        if pause > 0:
+            self._blocked_until = max(self._blocked_until, now + pause)
+
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "waiting": self.waiting(),
+            "blocked_for_s": max(0.0, self._blocked_until - self._clock()),
+            **self._counters,
+        }
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(
+    provider: str, model: Optional[str] = None
+) -> Optional[RateLimiter]:
+    """
+    获取服务商 / 模型对应的限流器
+
+    配置来自 settings.LLM_RATE_LIMITS，先匹配 "provider/model"，再匹配 "provider"；
+    同一配置项下的模型共享一个限流器。未配置时返回 None。
+    """
+    from src.config import settings
+
+    limits = settings.LLM_RATE_LIMITS
+    for key in (f"{provider}/{model}" if model else None, provider):
+        if key and key in limits:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                config = limits[key]
+                limiter = RateLimiter(
+                    requests_per_min=config.get("requests_per_min"),
+                    tokens_per_min=config.get("tokens_per_min"),
+                )
+                _limiters[key] = limiter
+            return limiter
+    return None
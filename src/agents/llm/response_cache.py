@@ -0,0 +1,312 @@
+"""模型响应缓存 - 对确定性的重复调用（相同模型、参数与提示词）直接返回缓存结果"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+
+import anyio
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+if TYPE_CHECKING:
+    from .base import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+def hash_text(text: str) -> str:
+    """提示词摘要：优先使用 xxhash，未安装时回退到 blake2b"""
+    data = text.encode("utf-8")
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def request_fingerprint(
+    model: "BaseModel", kind: str, prompt: str, kwargs: Dict[str, Any]
+) -> str:
+    """
+    模型调用的指纹：(模型信息, API Key 摘要, 调用参数, 提示词) 完全相同的调用得到相同结果
+
+    API Key 摘要使不同租户的调用互不共享缓存与合并结果（计费与限流错误各自承担）。
+    """
+    params = json.dumps(
+        {
+            "model": model.get_model_info(),
+            "api_key": model.api_key_hash,
+            "kind": kind,
+            "kwargs": kwargs,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return f"{hash_text(params)}:{hash_text(prompt)}"
+
+
+def is_deterministic(model: "BaseModel", kwargs: Dict[str, Any]) -> bool:
+    """调用是否为确定性输出（temperature 为 0），只有这类调用的结果可被复用"""
+    temperature = kwargs.get(
+        "temperature", model.get_model_info().get("temperature", 0)
+    )
+    return not temperature
+
+
+class CacheBackend(ABC):
+    """缓存后端接口，值为可 JSON 序列化的对象"""
+
+    # 为 True 时调用方应在工作线程中访问，避免阻塞事件循环
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str, now: float) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, expires_at: Optional[float]) -> int:
+        """写入缓存，返回因容量上限被淘汰的条目数"""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+
+class LRUCacheBackend(CacheBackend):
+    """进程内 LRU 缓存"""
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries 必须为正整数")
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, now: float) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, expires_at: Optional[float]) -> int:
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteCacheBackend(CacheBackend):
+    """
+    SQLite 磁盘缓存
+
+    进程重启后仍然有效，多个 worker 进程可共享同一文件（WAL 模式）。
+    超出 max_entries 时淘汰最久未访问的条目。
+    """
+
+    blocking = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+      key TEXT PRIMARY KEY,
+      value TEXT NOT NULL,
+      expires_at REAL,
+      accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at);
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 100_000) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries 必须为正整数")
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def get(self, key: str, now: float) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any, expires_at: Optional[float]) -> int:
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache"
+                    " (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, payload, expires_at, time.time()),
+                )
+                (count,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM llm_cache"
+                ).fetchone()
+                excess = count - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM llm_cache WHERE key IN (SELECT key FROM"
+                        " llm_cache ORDER BY accessed_at LIMIT ?)",
+                        (excess,),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return max(0, excess)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    精确匹配的模型响应缓存
+
+    - 缓存键：(模型信息, API Key 摘要, 调用参数, 提示词 / 消息的哈希)，
+      其中模型信息包含 provider、model、temperature 等配置；
+    - 默认只缓存确定性调用（temperature 为 0），采样输出不应被复用；
+    - ttl_s 为 None 时条目不过期，容量上限由后端负责。
+    """
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        *,
+        ttl_s: Optional[float] = None,
+        only_deterministic: bool = True,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if ttl_s is not None and ttl_s <= 0:
+            raise ValueError("ttl_s 必须为正数")
+        self.backend = backend if backend is not None else LRUCacheBackend()
+        self.ttl_s = ttl_s
+        self.only_deterministic = only_deterministic
+        self._clock = clock
+        self._counters: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+        }
+
+    def make_key(
+        self, model: "BaseModel", kind: str, prompt: str, kwargs: Dict[str, Any]
+    ) -> Optional[str]:
+        """生成缓存键；调用不可缓存（非确定性）时返回 None"""
+        if self.only_deterministic and not is_deterministic(model, kwargs):
+            return None
+        return request_fingerprint(model, kind, prompt, kwargs)
+
+    async def get(self, key: str) -> Optional[Any]:
+        now = self._clock()
+        if self.backend.blocking:
+            value = await anyio.to_thread.run_sync(self.backend.get, key, now)
+        else:
+            value = self.backend.get(key, now)
+        self._counters["hits" if value is not None else "misses"] += 1
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        expires_at = None if self.ttl_s is None else self._clock() + self.ttl_s
+        try:
+            if self.backend.blocking:
+                evicted = await anyio.to_thread.run_sync(
+                    self.backend.set, key, value, expires_at
+                )
+            else:
+                evicted = self.backend.set(key, value, expires_at)
+        except Exception as e:
+            # 缓存写入失败不影响本次调用结果
+            logger.warning(f"写入模型响应缓存失败: {e}")
+            return
+        self._counters["sets"] += 1
+        self._counters["evictions"] += evicted
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.backend), **self._counters}
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取按配置创建的全局响应缓存；LLM_RESPONSE_CACHE=none 时返回 None"""
+    global _default_cache
+    if _default_cache is None:
+        from src.config import settings
+
+        if settings.LLM_RESPONSE_CACHE == "none":
+            return None
+        if settings.LLM_RESPONSE_CACHE == "sqlite":
+            db_dir = os.path.dirname(settings.LLM_RESPONSE_CACHE_SQLITE_PATH)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            backend: CacheBackend = SqliteCacheBackend(
+                settings.LLM_RESPONSE_CACHE_SQLITE_PATH,
+                max_entries=settings.LLM_RESPONSE_CACHE_MAX_ENTRIES,
+            )
+        else:
+            backend = LRUCacheBackend(
+                max_entries=settings.LLM_RESPONSE_CACHE_MAX_ENTRIES
+            )
+        _default_cache = ResponseCache(backend, ttl_s=settings.LLM_RESPONSE_CACHE_TTL_S)
+    return _default_cache
@@ -0,0 +1,229 @@
+"""模型路由 - 记录各模型的延迟分位数与错误率，在模型组内选择最快的健康模型"""
+
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+import anyio
+
+from .base import BaseModel
+from .registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyStats:
+    """单个模型最近 window 次调用的延迟与成败记录"""
+
+    def __init__(self, window: int = 200) -> None:
+        if window <= 0:
+            raise ValueError("window 必须为正整数")
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        # 被取消（截尾）的调用数：只知道延迟的下限，不计入分位数
+        self.censored = 0
+
+    def record(self, latency_s: float, ok: bool) -> None:
+        self._latencies.append(latency_s)
+        self._outcomes.append(ok)
+
+    def record_censored(self) -> None:
+        """记录一次被取消的调用（如对冲中落败的请求），其耗时不是完整样本"""
+        self.censored += 1
+
+    @property
+    def samples(self) -> int:
+        return len(self._outcomes)
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """最近延迟的 q 分位数（0 < q <= 1），无样本时返回 None"""
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "error_rate": self.error_rate,
+            "p50_s": self.percentile(0.5),
+            "p95_s": self.percentile(0.95),
+            "censored": self.censored,
+        }
+
+
+class ModelRouter:
+    """
+    基于延迟的模型路由
+
+    - 模型组是一组可互相替代的模型名称（需已注册到 ModelRegistry）；
+    - 样本不足 min_samples 的模型优先被选中以积累数据，其余按 p50 从快到慢排序，
+      错误率超过 max_error_rate 或熔断器打开的模型排在最后；
+    - hedge=True 时，首选模型在 p95 延迟内未返回，则向次选模型再发一次请求，
+      采用先成功的结果并取消另一个；首选模型失败时立即启动次选模型。
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        *,
+        window: int = 200,
+        min_samples: int = 5,
+        max_error_rate: float = 0.5,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_delay_s: float = 2.0,
+        min_hedge_delay_s: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if not 0 < hedge_quantile <= 1:
+            raise ValueError("hedge_quantile 必须在 (0, 1] 之间")
+        if hedge_delay_s < 0 or min_hedge_delay_s < 0:
+            raise ValueError("对冲延迟不能为负数")
+        self._registry = registry
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_delay_s = hedge_delay_s
+        self.min_hedge_delay_s = min_hedge_delay_s
+        self._clock = clock
+        self._groups: Dict[str, List[str]] = {}
+        self._stats: Dict[str, LatencyStats] = {}
+        self._counters: Dict[str, int] = {"hedged": 0, "hedge_wins": 0}
+
+    def set_group(self, group: str, model_names: Sequence[str]) -> None:
+        if not model_names:
+            raise ValueError(f"模型组 '{group}' 不能为空")
+        for name in model_names:
+            if self._registry.get_model(name) is None:
+                raise ValueError(f"Model '{name}' not found")
+        self._groups[group] = list(model_names)
+
+    def list_groups(self) -> List[str]:
+        return list(self._groups.keys())
+
+    def stats_for(self, model_name: str) -> LatencyStats:
+        stats = self._stats.get(model_name)
+        if stats is None:
+            stats = self._stats[model_name] = LatencyStats(self.window)
+        return stats
+
+    def healthy(self, model_name: str) -> bool:
+        model = self._registry.get_model(model_name)
+        breaker = model.circuit_breaker if model is not None else None
+        if breaker is not None and breaker.state == "open":
+            return False
+        stats = self.stats_for(model_name)
+        return (
+            stats.samples < self.min_samples or stats.error_rate <= self.max_error_rate
+        )
+
+    def rank(self, group: str) -> List[BaseModel]:
+        """按路由优先级返回组内模型"""
+        names = self._groups.get(group)
+        if names is None:
+            raise ValueError(f"Model group '{group}' not found")
+
+        def _key(name: str) -> tuple:
+            stats = self.stats_for(name)
+            warm = stats.samples >= self.min_samples
+            p50 = stats.percentile(0.5) if warm else 0.0
+            return (not self.healthy(name), warm, p50)
+
+        ordered = sorted(names, key=_key)
+        models = [self._registry.get_model(name) for name in ordered]
+        return [model for model in models if model is not None]
+
+    def hedge_delay(self, model_name: str) -> float:
+        stats = self.stats_for(model_name)
+        if stats.samples < self.min_samples:
+            return self.hedge_delay_s
+        delay = stats.percentile(self.hedge_quantile) or self.hedge_delay_s
+        return max(self.min_hedge_delay_s, delay)
+
+    async def _timed(
+        self, model: BaseModel, prompt: str, kwargs: Dict[str, Any]
+    ) -> str:
+        stats = self.stats_for(model.name)
+        start = self._clock()
+        try:
+            result = await model.generate_with_retry(prompt, **kwargs)
+        except anyio.get_cancelled_exc_class():
+            # 被取消时的耗时只是真实延迟的下限，计入分位数会低估慢模型
+            stats.record_censored()
+            raise
+        except Exception:
+            stats.record(self._clock() - start, ok=False)
+            raise
+        stats.record(self._clock() - start, ok=True)
+        return result
+
+    async def generate(
+        self, group: str, prompt: str, *, hedge: Optional[bool] = None, **kwargs: Any
+    ) -> str:
+        """在模型组内路由一次生成请求，kwargs 透传给 generate_with_retry"""
+        candidates = self.rank(group)
+        if not candidates:
+            raise ValueError(f"模型组 '{group}' 中没有可用模型")
+        primary = candidates[0]
+        hedge = self.hedge if hedge is None else hedge
+        if not hedge or len(candidates) < 2:
+            return await self._timed(primary, prompt, kwargs)
+        return await self._hedged(primary, candidates[1], prompt, kwargs)
+
+    async def _hedged(
+        self,
+        primary: BaseModel,
+        backup: BaseModel,
+        prompt: str,
+        kwargs: Dict[str, Any],
+    ) -> str:
+        delay = self.hedge_delay(primary.name)
+        primary_failed = anyio.Event()
+        results: List[str] = []
+        errors: List[Exception] = []
+
+        async with anyio.create_task_group() as tg:
+
+            async def _attempt(model: BaseModel, wait_s: float) -> None:
+                if wait_s > 0:
+                    with anyio.move_on_after(wait_s):
+                        await primary_failed.wait()
+                    self._counters["hedged"] += 1
+                    logger.debug(f"对冲请求: {primary.name} -> {model.name}")
+                try:
+                    output = await self._timed(model, prompt, kwargs)
+                except Exception as e:
+                    errors.append(e)
+                    if model is primary:
+                        primary_failed.set()
+                    return
+                if not results:
+                    results.append(output)
+                    if model is backup:
+                        self._counters["hedge_wins"] += 1
+                    tg.cancel_scope.cancel()
+
+            tg.start_soon(_attempt, primary, 0.0)
+            tg.start_soon(_attempt, backup, delay)
+
+        if results:
+            return results[0]
+        raise errors[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "models": {name: s.to_dict() for name, s in self._stats.items()},
+            **self._counters,
+        }
@@ -0,0 +1,81 @@
+"""请求合并 - 相同的并发模型调用只向服务商发出一次请求"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import anyio
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = anyio.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.cancelled = False
+
+
+class SingleFlight:
+    """
+    single-flight 去重
+
+    同一 key 的并发调用中，第一个调用方（leader）实际执行请求，
+    其余调用方等待并共享其结果或异常。
+    leader 被取消时不会把取消传递给其他等待者：它们会重新选出一个 leader 再次执行；
+    等待者自身被取消只影响它自己。
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, _Flight] = {}
+        self._counters: Dict[str, int] = {"leaders": 0, "shared": 0}
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                return await self._lead(key, call)
+
+            self._counters["shared"] += 1
+            await flight.done.wait()
+            if flight.cancelled:
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+    async def _lead(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight = _Flight()
+        self._flights[key] = flight
+        self._counters["leaders"] += 1
+        try:
+            flight.result = await call()
+            return flight.result
+        except anyio.get_cancelled_exc_class():
+            flight.cancelled = True
+            raise
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.done.set()
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._flights), **self._counters}
+
+
+_default_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """获取全局请求合并器；LLM_COALESCE_REQUESTS=False 时返回 None"""
+    global _default_single_flight
+    from src.config import settings
+
+    if not settings.LLM_COALESCE_REQUESTS:
+        return None
+    if _default_single_flight is None:
+        _default_single_flight = SingleFlight()
+    return _default_single_flight
@@ -1,6 +1,7 @@
 from .context_desensitization import ContextDesensitization
 from .context_management import ContextManagement
 from .long_term_memory import LongTermMemory
+from .scratchpad_budget import CompactedScratchpad, ScratchpadBudget
 from .short_term_memory import ShortTermMemory
 
 __all__ = [
@@ -8,4 +9,6 @@ __all__ = [
     "LongTermMemory",
     "ContextManagement",
     "ContextDesensitization",
+    "ScratchpadBudget",
+    "CompactedScratchpad",
 ]
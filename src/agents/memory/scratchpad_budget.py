@@ -0,0 +1,139 @@
+"""
+Scratchpad 预算 - 按 token 上限压缩 ReAct 记录中较早的观察结果
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+from ..llm.rate_limiter import estimate_tokens
+
+# 按 ReAct 关键字切分记录，每段以一个关键字开头
+_SEGMENT_SPLIT = re.compile(
+    r"(?m)^(?=(?:Thought:|Action:|Action Input:|Observation:|Final Answer:))"
+)
+_OBSERVATION = "Observation: "
+_ELIDED_PREFIX = "Observation: [已省略"
+_DROPPED_MARKER = re.compile(r"^\[已省略早期 (\d+) 段记录\]\n")
+
+
+@dataclass
+class CompactedScratchpad:
+    text: str
+    tokens: int
+    # 被省略的观察结果序号（从 1 开始，按出现顺序）
+    elided_observations: List[int] = field(default_factory=list)
+    # 预算仍不足时整体丢弃的早期记录段数
+    dropped_segments: int = 0
+
+    @property
+    def compacted(self) -> bool:
+        return bool(self.elided_observations or self.dropped_segments)
+
+
+class ScratchpadBudget:
+    """
+    Scratchpad token 预算
+
+    超出 max_tokens 时，从最早的观察结果开始替换为省略标记
+    （保留原长度与开头预览），最近 keep_last 个观察结果保持原样；
+    仍然超出时再丢弃最早的记录段。省略标记写回 scratchpad，
+    后续迭代不会重复压缩，已发送的前缀也保持稳定。
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        *,
+        keep_last: int = 2,
+        preview_chars: int = 120,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+    ) -> None:
+        if max_tokens <= 0:
+            raise ValueError("max_tokens 必须为正整数")
+        if keep_last < 0 or preview_chars < 0:
+            raise ValueError("keep_last / preview_chars 不能为负数")
+        self.max_tokens = max_tokens
+        self.keep_last = keep_last
+        self.preview_chars = preview_chars
+        self.count_tokens = count_tokens
+
+    def _elide(self, number: int, segment: str, tokens: int) -> str:
+        body = segment[len(_OBSERVATION) :].strip()
+        preview = " ".join(body[: self.preview_chars].split())
+        suffix = "…" if len(body) > self.preview_chars else ""
+        return (
+            f"{_ELIDED_PREFIX}第 {number} 个观察结果，约 {tokens} tokens；"
+            f"开头：{preview}{suffix}]\n"
+        )
+
+    def compact(
+        self, scratchpad: str, *, reserved_tokens: int = 0
+    ) -> CompactedScratchpad:
+        """
+        压缩 scratchpad，使其 token 数不超过 max_tokens - reserved_tokens
+
+        reserved_tokens 为同一提示词中其余部分（系统提示、工具列表、用户问题）
+        已占用的 token 数。
+        """
+        budget = max(0, self.max_tokens - reserved_tokens)
+        segments = [s for s in _SEGMENT_SPLIT.split(scratchpad) if s]
+        costs = [self.count_tokens(s) for s in segments]
+        total = sum(costs)
+        if total <= budget:
+            return CompactedScratchpad(text=scratchpad, tokens=total)
+
+        observations = [i for i, s in enumerate(segments) if s.startswith(_OBSERVATION)]
+        protected = set(observations[-self.keep_last :]) if self.keep_last else set()
+        elided: List[int] = []
+        for number, index in enumerate(observations, start=1):
+            if total <= budget:
+                break
+            segment = segments[index]
+            if index in protected or segment.startswith(_ELIDED_PREFIX):
+                continue
+            replacement = self._elide(number, segment, costs[index])
+            cost = self.count_tokens(replacement)
+            if cost >= costs[index]:
+                continue
+            segments[index] = replacement
+            total += cost - costs[index]
+            costs[index] = cost
+            elided.append(number)
+
+        # 仍然超出时按整组（Thought / Action / Action Input / Observation）丢弃，
+        # 避免留下缺少工具名的 Action Input 或孤立的 Observation；
+        # 最近的观察结果所在的组及其之后的记录始终保留
+        starts = [
+            i
+            for i in range(1, len(segments))
+            if segments[i - 1].startswith("Observation:")
+            or _DROPPED_MARKER.match(segments[i - 1])
+        ]
+        limit = len(segments) - 1
+        if protected:
+            first_protected = min(protected)
+            limit = max([0] + [i for i in starts if i <= first_protected])
+        dropped = 0
+        for start in starts:
+            if total <= budget or start > limit:
+                break
+            total -= sum(costs[dropped:start])
+            dropped = start
+        if dropped:
+            # 之前压缩留下的段落计数累加到新的标记中
+            previous = 0
+            for segment in segments[:dropped]:
+                match = _DROPPED_MARKER.match(segment)
+                if match:
+                    previous += int(match.group(1)) - 1
+            marker = f"[已省略早期 {dropped + previous} 段记录]\n"
+            segments = [marker, *segments[dropped:]]
+            total += self.count_tokens(marker)
+
+        return CompactedScratchpad(
+            text="".join(segments),
+            tokens=total,
+            elided_observations=elided,
+            dropped_segments=dropped,
+        )
@@ -3,7 +3,12 @@ from .file_organizer import FILE_ORGANIZER_PROMPT
 from .file_renamer import FILE_RENAMER_PROMPT
 from .plan_and_execute import EXECUTOR_PROMPT
 from .plan_and_execute_skills import PLANNER_SKILLS_PROMPT
-from .react import REACT_PROMPT
+from .react import (
+    REACT_PROMPT,
+    REACT_SYSTEM_PROMPT,
+    REACT_TASK_PROMPT,
+    to_native_tools_prompt,
+)
 from .react_skills import REACT_SKILLS_PROMPT
 
 __all__ = [
@@ -13,5 +18,8 @@ __all__ = [
     "EXECUTOR_PROMPT",
     "PLANNER_SKILLS_PROMPT",
     "REACT_PROMPT",
+    "REACT_SYSTEM_PROMPT",
+    "REACT_TASK_PROMPT",
     "REACT_SKILLS_PROMPT",
+    "to_native_tools_prompt",
 ]
@@ -1,9 +1,12 @@
-REACT_PROMPT = """你是一个智能助手，通过"思考-行动-观察"循环解决问题。
+import re
+
+REACT_SYSTEM_PROMPT = """你是一个智能助手，通过"思考-行动-观察"循环解决问题。
 
 ## 核心原则
 1. **精准行动**：仅使用提供工具，参数必须符合 JSON 格式。
 2. **逻辑严密**：每次行动前明确目的，根据 Observation 调整策略。
 3. **如实反馈**：无法解决时明确说明，最终答案需完整准确。
+4. **并行行动**：互不依赖的多个操作可在同一步中连续给出多组 Action / Action Input，它们会并发执行，Observation 按给出顺序依次返回。
 
 ## 可用工具
 {tools}
@@ -15,8 +18,35 @@ Action Input: {{"参数名": "参数值"}}
 Observation: 工具返回结果。
 ... (重复循环)
 Thought: 任务完成或无法继续。
-Final Answer: 最终回复。
+Final Answer: 最终回复。"""
 
-## 开始
+# 随回合变化的部分：作为追加内容放在静态前缀之后，便于命中服务端的前缀缓存
+REACT_TASK_PROMPT = """## 开始
 用户问题: {input}
 {agent_scratchpad}"""
+
+REACT_PROMPT = f"{REACT_SYSTEM_PROMPT}\n\n{REACT_TASK_PROMPT}"
+
+
+# 原生函数调用时工具列表与调用格式由请求中的 tools 描述，
+# 提示词里的文本格式说明会与之冲突，转换时去掉这些小节
+_TEXT_TOOL_SECTIONS = ("## 可用工具", "## 流程格式")
+
+NATIVE_TOOLS_NOTE = """## 工具调用
+需要工具时直接发起工具调用，互不依赖的多个调用可以同时发起；任务完成后不再调用工具，直接给出最终回复。
+"""
+
+
+def to_native_tools_prompt(prompt: str) -> str:
+    """将文本 ReAct 提示词转换为原生函数调用版本：去掉工具列表与流程格式小节"""
+    sections = re.split(r"\n(?=## )", prompt)
+    kept = []
+    noted = False
+    for section in sections:
+        if section.startswith(_TEXT_TOOL_SECTIONS):
+            if not noted:
+                kept.append(NATIVE_TOOLS_NOTE)
+                noted = True
+            continue
+        kept.append(section)
+    return "\n".join(kept)
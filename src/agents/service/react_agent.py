@@ -1,16 +1,36 @@
 import json
 import logging
 import re
-from typing import Any, Dict, Optional, Set
+from functools import partial
+from typing import Any, Dict, List, Optional, Set
 
-from ..llm.base import BaseModel
+from ..llm.base import BaseModel, ToolCallResponse
+from ..memory.scratchpad_budget import ScratchpadBudget
 from ..memory.short_term_memory import ShortTermMemory
-from ..prompt.react import REACT_PROMPT
+from ..prompt.react import REACT_PROMPT, to_native_tools_prompt
+from ..tools.parallel import gather_limited
 from ..tools.registry import ToolRegistry
 from .base_agent import BaseAgent
 
 logger = logging.getLogger(__name__)
 
+_ACTION_LINE = re.compile(r"^[ \t]*Action:", re.MULTILINE)
+
+
+def split_react_actions(decision: str) -> List[str]:
+    """
+    将一次模型输出按 Action 拆分为多段，每段包含一组 Action / Action Input
+
+    第一段保留 Action 之前的 Thought；包含 Final Answer 或只有一组 Action 时原样返回。
+    """
+    if "Final Answer:" in decision:
+        return [decision]
+    starts = [m.start() for m in _ACTION_LINE.finditer(decision)]
+    if len(starts) <= 1:
+        return [decision]
+    bounds = [0] + starts[1:] + [len(decision)]
+    return [decision[a:b] for a, b in zip(bounds, bounds[1:])]
+
 
 class ReActAgent(BaseAgent):
     """
@@ -24,6 +44,8 @@ class ReActAgent(BaseAgent):
         memory: Optional[ShortTermMemory] = None,
         max_iterations: int = 10,
         allowed_tools: Optional[Set[str]] = None,
+        max_parallel_tools: int = 4,
+        scratchpad_budget: Optional[ScratchpadBudget] = None,
     ):
         super().__init__()
         self.model = model
@@ -31,6 +53,10 @@ class ReActAgent(BaseAgent):
         self.memory = memory or ShortTermMemory()
         self.max_iterations = max_iterations
         self.allowed_tools = allowed_tools
+        # 同一步中多个工具调用的最大并发数
+        self.max_parallel_tools = max_parallel_tools
+        # 提示词 token 预算，超出时压缩较早的观察结果
+        self.scratchpad_budget = scratchpad_budget
 
     @property
     def agent_card(self) -> Dict[str, Any]:
@@ -50,25 +76,43 @@ class ReActAgent(BaseAgent):
     def sys_prompt(self) -> str:
         return REACT_PROMPT
 
+    @property
+    def prompt_template(self) -> str:
+        """当前模式使用的提示词：原生函数调用时去掉工具列表与文本格式说明"""
+        if self.model.function_calling:
+            return to_native_tools_prompt(self.sys_prompt)
+        return self.sys_prompt
+
     def _format_tools(self) -> tuple[str, str]:
-        tool_list = self.tools.list_tools()
-        if self.allowed_tools is not None:
-            tool_list = [t for t in tool_list if t.name in self.allowed_tools]
-        tools_desc = []
-        tool_names = []
-
-        for tool in tool_list:
-            # 尝试获取 JSON Schema 格式的参数描述
-            params = tool.parameters
-            # 简化显示，或者直接显示 JSON
-            desc = (
-                f"{tool.name}: {tool.description}\n"
-                f"   Parameters: {json.dumps(params, ensure_ascii=False)}"
+        # 渲染结果由注册表按版本缓存，多轮迭代之间不会重复序列化参数
+        rendered = self.tools.render(self.allowed_tools)
+        return rendered.description, rendered.names
+
+    def _compact_scratchpad(self, input_data: str, scratchpad: str) -> str:
+        """按 token 预算压缩 scratchpad，系统提示与工具列表占用的部分预先扣除"""
+        budget = self.scratchpad_budget
+        if budget is None:
+            return scratchpad
+        tools_desc_str, tool_names_str = self._format_tools()
+        reserved = budget.count_tokens(
+            self.format_prompt(
+                self.prompt_template,
+                {
+                    "tools": tools_desc_str,
+                    "tool_names": tool_names_str,
+                    "input": input_data,
+                    "agent_scratchpad": "",
+                },
             )
-            tools_desc.append(desc)
-            tool_names.append(tool.name)
-
-        return "\n".join(tools_desc), ", ".join(tool_names)
+        )
+        compacted = budget.compact(scratchpad, reserved_tokens=reserved)
+        if compacted.compacted:
+            logger.info(
+                f"Scratchpad compacted: elided observations "
+                f"{compacted.elided_observations}, dropped "
+                f"{compacted.dropped_segments} segments, ~{compacted.tokens} tokens"
+            )
+        return compacted.text
 
     async def think(self, input_data: str, scratchpad: str) -> str:
         """
@@ -89,6 +133,27 @@ class ReActAgent(BaseAgent):
         response = await self.model.generate_with_retry(prompt)
         return response
 
+    async def think_with_tools(
+        self, input_data: str, scratchpad: str
+    ) -> ToolCallResponse:
+        """
+        原生函数调用模式：随请求发送工具列表，返回结构化的工具调用
+        """
+        tools_desc_str, tool_names_str = self._format_tools()
+
+        prompt = self.format_prompt(
+            self.prompt_template,
+            {
+                "tools": tools_desc_str,
+                "tool_names": tool_names_str,
+                "input": input_data,
+                "agent_scratchpad": scratchpad,
+            },
+        )
+
+        openai_tools = self.tools.render(self.allowed_tools).openai_tools
+        return await self.model.generate_tool_calls_with_retry(prompt, openai_tools)
+
     async def act(self, decision: str) -> tuple[str, str, bool]:
         """
         执行决策
@@ -110,9 +175,6 @@ class ReActAgent(BaseAgent):
             tool_name = action_match.group(1).strip()
             input_str = action_input_match.group(1).strip()
 
-            if self.allowed_tools is not None and tool_name not in self.allowed_tools:
-                return tool_name, f"Error: Tool '{tool_name}' is not allowed.", False
-
             # 清理可能的 Markdown 代码块标记
             input_str = input_str.strip("`")
             if input_str.startswith("json"):
@@ -139,16 +201,7 @@ class ReActAgent(BaseAgent):
                 return tool_name, f"Error: Invalid JSON in Action Input: {e}", False
 
             # 3. 执行工具
-            tool = self.tools.get_tool(tool_name)
-            if not tool:
-                return tool_name, f"Error: Tool '{tool_name}' not found.", False
-
-            try:
-                logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
-                observation = await tool.run(**tool_args)
-                return tool_name, str(observation), False
-            except Exception as e:
-                return tool_name, f"Error executing tool: {e}", False
+            return tool_name, await self._run_tool(tool_name, tool_args), False
 
         # 如果没有匹配到 Action，可能模型还在思考或者格式错误
         return (
@@ -157,6 +210,63 @@ class ReActAgent(BaseAgent):
             False,
         )
 
+    async def act_all(self, decision: str) -> List[tuple[str, str, bool]]:
+        """
+        执行一次输出中的全部 Action，互不依赖的调用并发执行，结果按出现顺序返回
+        """
+        segments = split_react_actions(decision)
+        return await gather_limited(
+            [partial(self.act, segment) for segment in segments],
+            limit=self.max_parallel_tools,
+        )
+
+    async def _run_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> str:
+        """执行单个工具调用，返回 Observation 文本"""
+        if self.allowed_tools is not None and tool_name not in self.allowed_tools:
+            return f"Error: Tool '{tool_name}' is not allowed."
+
+        tool = self.tools.get_tool(tool_name)
+        if not tool:
+            return f"Error: Tool '{tool_name}' not found."
+
+        try:
+            logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
+            observation = await tool.run(**tool_args)
+            return self.tools.format_observation(tool, observation)
+        except Exception as e:
+            return f"Error executing tool: {e}"
+
+    async def _step_with_tools(
+        self, user_input: str, scratchpad: str
+    ) -> tuple[str, Optional[str]]:
+        """
+        原生函数调用模式下的一步：返回 (新的 scratchpad, 最终答案或 None)
+        """
+        response = await self.think_with_tools(user_input, scratchpad)
+        logger.info(f"LLM Tool Calls: {response.tool_calls}")
+        scratchpad += response.to_react_text() + "\n"
+        if not response.tool_calls:
+            return scratchpad, response.final_answer
+
+        async def _invalid(error: str) -> str:
+            return f"Error: Invalid JSON in Action Input: {error}"
+
+        results = await gather_limited(
+            [
+                (
+                    partial(_invalid, call.error)
+                    if call.error
+                    else partial(self._run_tool, call.name, call.arguments)
+                )
+                for call in response.tool_calls
+            ],
+            limit=self.max_parallel_tools,
+        )
+        for result in results:
+            logger.info(f"Observation: {result}")
+            scratchpad += f"Observation: {result}\n"
+        return scratchpad, None
+
     async def run(self, user_input: str) -> str:
         """
         运行 Agent 循环
@@ -172,6 +282,14 @@ class ReActAgent(BaseAgent):
 
         for i in range(self.max_iterations):
             logger.info(f"Iteration {i + 1}/{self.max_iterations}")
+            scratchpad = self._compact_scratchpad(user_input, scratchpad)
+
+            if self.model.function_calling:
+                scratchpad, answer = await self._step_with_tools(user_input, scratchpad)
+                if answer is not None:
+                    final_response = answer
+                    break
+                continue
 
             # 1. Think
             response = await self.think(user_input, scratchpad)
@@ -181,20 +299,22 @@ class ReActAgent(BaseAgent):
             # 简单的处理：直接追加 LLM 的回复
             scratchpad += response + "\n"
 
-            # 2. Act
-            action_type, result, is_done = await self.act(response)
+            # 2. Act（一次输出中可能包含多组 Action，并发执行）
+            results = await self.act_all(response)
 
+            action_type, result, is_done = results[0]
             if is_done:
                 final_response = result
                 scratchpad += f"Final Answer: {result}\n"
                 break
 
-            # 3. Observation
-            observation = f"Observation: {result}"
-            logger.info(observation)
+            # 3. Observation（按 Action 出现顺序记录）
+            for action_type, result, _ in results:
+                observation = f"Observation: {result}"
+                logger.info(observation)
 
-            # 记录到 scratchpad
-            scratchpad += observation + "\n"
+                # 记录到 scratchpad
+                scratchpad += observation + "\n"
 
         if not final_response:
             final_response = (
@@ -1,15 +1,26 @@
-from .base_tool import BaseTool
+from .base_tool import BaseTool, ToolStreamItem
+from .executor import SkillExecutor, SkillExecutorBusyError
 from .mcp_client import MCPClient
 from .mcp_config import MCPConfig, TransportType
 from .mcp_tool import MCPBaseTool
-from .registry import ToolRegistry, default_registry
+from .parallel import gather_limited
+from .registry import RenderedTools, ToolRegistry, default_registry
+from .result_shaping import ResultLimits, ToolResultStore, shape_result
 
 __all__ = [
     "BaseTool",
+    "ToolStreamItem",
     "ToolRegistry",
+    "RenderedTools",
     "MCPConfig",
     "TransportType",
     "MCPBaseTool",
     "MCPClient",
+    "SkillExecutor",
+    "SkillExecutorBusyError",
     "default_registry",
+    "gather_limited",
+    "ResultLimits",
+    "ToolResultStore",
+    "shape_result",
 ]
@@ -1,10 +1,24 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+from .result_shaping import ResultLimits
+
+
+@dataclass(frozen=True)
+class ToolStreamItem:
+    """流式执行产出的一项：final=False 为中间结果，最后一项 final=True 为完整结果"""
+
+    data: Any
+    final: bool = False
 
 
 class BaseTool(ABC):
     """工具基类"""
 
+    # 结果写入 Observation 时的上限；为 None 时使用注册表的默认上限
+    result_limits: Optional[ResultLimits] = None
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -28,6 +42,10 @@ class BaseTool(ABC):
         """执行工具"""
         pass
 
+    async def stream(self, **kwargs) -> AsyncIterator[ToolStreamItem]:
+        """流式执行工具，默认不产出中间结果，只产出 run 的结果"""
+        yield ToolStreamItem(await self.run(**kwargs), final=True)
+
     def to_openai_tool(self) -> Dict[str, Any]:
         """转换为 OpenAI 工具格式"""
         return {
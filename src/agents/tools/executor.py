@@ -0,0 +1,348 @@
+"""技能脚本执行器 - 将同步脚本调度到线程池 / 进程池，避免阻塞事件循环"""
+
+import importlib.util
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from multiprocessing.managers import SyncManager
+from pathlib import Path
+from types import ModuleType
+from typing import Any, AsyncIterator, Callable, Dict, Literal, Optional, Tuple
+
+import anyio
+import anyio.lowlevel
+
+from src.utils.tool_utils import run_search_inline
+
+PoolKind = Literal["thread", "process"]
+
+
+class SkillExecutorBusyError(RuntimeError):
+    """执行池排队已满，调用方应稍后重试"""
+
+    def __init__(self, pool: str, max_queue_depth: int):
+        super().__init__(
+            f"技能执行池 {pool} 已满（最大排队数 {max_queue_depth}），请稍后重试"
+        )
+        self.pool = pool
+        self.max_queue_depth = max_queue_depth
+
+
+def _compile_skill_module(script_path: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location("skill_script", script_path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"无法加载脚本模块: {script_path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class SkillModuleCache:
+    """
+    技能模块缓存
+
+    以脚本路径为键缓存已执行的模块，并记录脚本的 (mtime, size)。
+    文件变化后下一次加载会重新编译；为减少 stat 调用，
+    同一脚本在 check_interval_s 内只校验一次，hot_reload=True 时每次都校验。
+    """
+
+    def __init__(self, check_interval_s: float = 2.0) -> None:
+        if check_interval_s < 0:
+            raise ValueError("check_interval_s 不能为负数")
+        self.check_interval_s = check_interval_s
+        # path -> (module, mtime_ns, size, checked_at)
+        self._entries: Dict[str, Tuple[ModuleType, int, int, float]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, script_path: str, *, hot_reload: bool = False) -> ModuleType:
+        key = os.path.abspath(script_path)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            module, mtime_ns, size, checked_at = entry
+            if not hot_reload and now - checked_at < self.check_interval_s:
+                return module
+            stat = os.stat(key)
+            if stat.st_mtime_ns == mtime_ns and stat.st_size == size:
+                with self._lock:
+                    self._entries[key] = (module, mtime_ns, size, now)
+                return module
+
+        stat = os.stat(key)
+        module = _compile_skill_module(key)
+        with self._lock:
+            self._entries[key] = (module, stat.st_mtime_ns, stat.st_size, now)
+        return module
+
+    def invalidate(self, script_path: Optional[str] = None) -> None:
+        """移除指定脚本（或全部脚本）的缓存"""
+        with self._lock:
+            if script_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(script_path), None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# 每个进程一份：主进程与各工作进程分别缓存自己加载过的模块
+module_cache = SkillModuleCache()
+
+
+def load_skill_module(script_path: str, *, hot_reload: bool = False) -> ModuleType:
+    """从脚本路径加载技能模块（带缓存）"""
+    return module_cache.load(script_path, hot_reload=hot_reload)
+
+
+def run_skill_script(
+    script_path: str, kwargs: Dict[str, Any], hot_reload: bool = False
+) -> Any:
+    """在工作线程 / 子进程中加载脚本并调用其 run 函数"""
+    module = load_skill_module(script_path, hot_reload=hot_reload)
+    if not hasattr(module, "run"):
+        raise AttributeError(f"脚本 {script_path} 中未定义 run 函数")
+    return module.run(**kwargs)
+
+
+def run_skill_stream(
+    script_path: str,
+    kwargs: Dict[str, Any],
+    channel: Any,
+    stop: Any,
+    hot_reload: bool = False,
+) -> Any:
+    """
+    在工作线程 / 子进程中推进脚本的 stream 生成器
+
+    中间结果逐项写入 channel，生成器的返回值作为任务结果；
+    stop 被置位后不再推进生成器并将其关闭。
+    """
+    module = load_skill_module(script_path, hot_reload=hot_reload)
+    if not callable(getattr(module, "stream", None)):
+        raise AttributeError(f"脚本 {script_path} 中未定义 stream 函数")
+    generator = module.stream(**kwargs)
+    try:
+        while not stop.is_set():
+            try:
+                item = next(generator)
+            except StopIteration as stop_iteration:
+                return stop_iteration.value
+            channel.put(item)
+    finally:
+        generator.close()
+    return None
+
+
+def _next_stream_item(
+    channel: Any, future: "Future[Any]", poll_interval_s: float = 0.05
+) -> Tuple[bool, Any]:
+    """阻塞等待下一项中间结果；任务已结束且没有剩余结果时返回 (True, None)"""
+    while True:
+        # 先判断任务是否结束再取结果：结束前写入的中间结果一定能被取到
+        finished = future.done()
+        try:
+            if finished:
+                return False, channel.get_nowait()
+            return False, channel.get(timeout=poll_interval_s)
+        except queue.Empty:
+            if finished:
+                return True, None
+
+
+async def wait_future(future: "Future[Any]") -> Any:
+    """
+    等待 concurrent.futures.Future 完成并返回结果
+
+    完成回调把唤醒操作投递回事件循环，不像 to_thread.run_sync(future.result)
+    那样为每个排队中的任务占用一个 anyio 工作线程名额。
+    取消等待时直接返回，底层任务继续执行到结束。
+    """
+    if not future.done():
+        event = anyio.Event()
+        native = anyio.lowlevel.current_token().native_token
+        # asyncio 事件循环与 trio 令牌都提供非阻塞的跨线程投递接口
+        schedule = getattr(native, "call_soon_threadsafe", None) or native.run_sync_soon
+
+        def _wake(_: Future) -> None:
+            try:
+                schedule(event.set)
+            except Exception:
+                # 等待方所在的事件循环已经结束，无需唤醒
+                pass
+
+        future.add_done_callback(_wake)
+        await event.wait()
+    return future.result()
+
+
+class SkillExecutor:
+    """
+    技能执行器
+
+    - thread 池：适合 I/O 密集型脚本（复制、移动、删除等）
+    - process 池：适合 CPU 密集型脚本（正则搜索等），绕开 GIL
+    每个池的在途任务数（执行中 + 排队中）不超过 max_queue_depth，
+    超出时立即抛出 SkillExecutorBusyError，而不是无限排队。
+    """
+
+    def __init__(
+        self,
+        *,
+        thread_workers: int = 8,
+        process_workers: int = 2,
+        max_queue_depth: int = 32,
+    ) -> None:
+        if thread_workers <= 0 or process_workers <= 0:
+            raise ValueError("线程数 / 进程数必须为正整数")
+        if max_queue_depth <= 0:
+            raise ValueError("max_queue_depth 必须为正整数")
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.max_queue_depth = max_queue_depth
+
+        self._pools: Dict[str, Executor] = {}
+        # 进程池流式执行时用于跨进程传递中间结果的管理进程，首次使用时启动
+        self._manager: Optional[SyncManager] = None
+        self._in_flight: Dict[str, int] = {"thread": 0, "process": 0}
+        self._counter_lock = threading.Lock()
+
+    def _get_pool(self, pool: PoolKind) -> Executor:
+        executor = self._pools.get(pool)
+        if executor is None:
+            if pool == "process":
+                executor = ProcessPoolExecutor(
+                    max_workers=self.process_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    # 工作进程中的内容搜索就地匹配，不再嵌套创建进程池
+                    initializer=run_search_inline,
+                )
+            else:
+                executor = ThreadPoolExecutor(
+                    max_workers=self.thread_workers,
+                    thread_name_prefix="skill",
+                )
+            self._pools[pool] = executor
+        return executor
+
+    def _get_manager(self) -> SyncManager:
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager
+
+    def in_flight(self, pool: PoolKind) -> int:
+        """当前池中执行中与排队中的任务数"""
+        return self._in_flight[pool]
+
+    def _submit(
+        self, pool: PoolKind, fn: Callable[..., Any], *args: Any
+    ) -> "Future[Any]":
+        """占用一个池名额并提交任务，名额在任务结束时释放"""
+        if pool not in self._in_flight:
+            raise ValueError(f"不支持的执行池类型: {pool}")
+        with self._counter_lock:
+            if self._in_flight[pool] >= self.max_queue_depth:
+                raise SkillExecutorBusyError(pool, self.max_queue_depth)
+            self._in_flight[pool] += 1
+
+        def _release(_: Future) -> None:
+            # 以底层任务真正结束为准释放名额，调用方取消等待不会提前释放
+            with self._counter_lock:
+                self._in_flight[pool] -= 1
+
+        try:
+            future = self._get_pool(pool).submit(fn, *args)
+        except Exception:
+            _release(Future())
+            raise
+        future.add_done_callback(_release)
+        return future
+
+    async def submit(
+        self,
+        pool: PoolKind,
+        script_path: Path,
+        kwargs: Dict[str, Any],
+        *,
+        hot_reload: bool = False,
+    ) -> Any:
+        """在指定池中执行脚本的 run 函数"""
+        future = self._submit(
+            pool, run_skill_script, str(script_path), kwargs, hot_reload
+        )
+        # 取消等待时直接放弃，不阻塞调用方；脚本本身会继续执行到结束
+        return await wait_future(future)
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        pool: PoolKind,
+        script_path: Path,
+        kwargs: Dict[str, Any],
+        *,
+        hot_reload: bool = False,
+    ) -> AsyncIterator[AsyncIterator[Tuple[bool, Any]]]:
+        """
+        在指定池中执行脚本的 stream 生成器
+
+        产出的异步迭代器依次给出 (False, 中间结果)，最后给出 (True, 返回值)。
+        与 submit 共用排队上限；退出上下文时通知工作端停止推进生成器。
+        """
+        if pool == "process":
+            manager = self._get_manager()
+            channel: Any = manager.Queue()
+            stop: Any = manager.Event()
+        else:
+            channel = queue.Queue()
+            stop = threading.Event()
+        future = self._submit(
+            pool, run_skill_stream, str(script_path), kwargs, channel, stop, hot_reload
+        )
+
+        async def _items() -> AsyncIterator[Tuple[bool, Any]]:
+            while True:
+                done, value = await anyio.to_thread.run_sync(
+                    partial(_next_stream_item, channel, future),
+                    abandon_on_cancel=True,
+                )
+                if done:
+                    yield True, await wait_future(future)
+                    return
+                yield False, value
+
+        try:
+            yield _items()
+        finally:
+            stop.set()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭所有执行池"""
+        for executor in self._pools.values():
+            executor.shutdown(wait=wait)
+        self._pools.clear()
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+_default_executor: Optional[SkillExecutor] = None
+
+
+def get_skill_executor() -> SkillExecutor:
+    """获取按配置创建的全局技能执行器"""
+    global _default_executor
+    if _default_executor is None:
+        from src.config import settings
+
+        _default_executor = SkillExecutor(
+            thread_workers=settings.SKILL_THREAD_WORKERS,
+            process_workers=settings.SKILL_PROCESS_WORKERS,
+            max_queue_depth=settings.SKILL_MAX_QUEUE_DEPTH,
+        )
+    return _default_executor
@@ -0,0 +1,40 @@
+"""工具并发执行 - 同一步中的多个工具调用并发运行，结果按调用顺序返回"""
+
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+import anyio
+
+
+async def gather_limited(
+    calls: Sequence[Callable[[], Awaitable[Any]]], *, limit: int
+) -> List[Any]:
+    """
+    以最多 limit 的并发度执行 calls，按输入顺序返回结果
+
+    某个调用抛出异常时不会取消其余调用（工具可能正在修改文件），
+    全部结束后再抛出按顺序排在最前的异常。
+    """
+    if limit <= 0:
+        raise ValueError("limit 必须为正整数")
+    if len(calls) == 1:
+        return [await calls[0]()]
+
+    results: List[Any] = [None] * len(calls)
+    errors: List[Optional[Exception]] = [None] * len(calls)
+    limiter = anyio.CapacityLimiter(limit)
+
+    async def _run(index: int, call: Callable[[], Awaitable[Any]]) -> None:
+        async with limiter:
+            try:
+                results[index] = await call()
+            except Exception as e:
+                errors[index] = e
+
+    async with anyio.create_task_group() as tg:
+        for index, call in enumerate(calls):
+            tg.start_soon(_run, index, call)
+
+    for error in errors:
+        if error is not None:
+            raise error
+    return results
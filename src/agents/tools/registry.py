@@ -1,14 +1,38 @@
 import asyncio
-import importlib.util
+import json
 import logging
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-
+from types import ModuleType
+from typing import (
+    AbstractSet,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    Optional,
+    Tuple,
+)
+
+import anyio
 import yaml  # type: ignore[import]
 
-from .base_tool import BaseTool
+from src.config import settings
+
+from .base_tool import BaseTool, ToolStreamItem
+from .executor import (
+    PoolKind,
+    SkillExecutor,
+    SkillExecutorBusyError,
+    get_skill_executor,
+    load_skill_module,
+)
 from .mcp_client import MCPClient
 from .mcp_config import MCPConfig
+from .result_shaping import ResultLimits, ToolResultStore, shape_result
 
 logger = logging.getLogger(__name__)
 
@@ -16,13 +40,30 @@ logger = logging.getLogger(__name__)
 class SkillTool(BaseTool):
     """基于 SKILL.md 定义的本地技能工具"""
 
-    def __init__(self, skill_dir: Path, script_path: Optional[Path] = None):
+    def __init__(
+        self,
+        skill_dir: Path,
+        script_path: Optional[Path] = None,
+        executor: Optional[SkillExecutor] = None,
+        hot_reload: Optional[bool] = None,
+    ):
         self.skill_dir = skill_dir
         self.skill_md_path = skill_dir / "SKILL.md"
         self._name = ""
         self._description = ""
         self._parameters = {"type": "object", "properties": {}, "required": []}
+        # 同步脚本的执行池：thread（I/O 密集，默认）或 process（CPU 密集）
+        self.pool: PoolKind = "thread"
         self.script_path = script_path
+        self._executor = executor
+        self.hot_reload = (
+            settings.SKILL_HOT_RELOAD if hot_reload is None else hot_reload
+        )
+        self._skill_md_mtime_ns = 0
+        # 脚本的 run 是否为协程函数，首次执行时判定后缓存（热重载时每次重新判定）
+        self._run_is_async: Optional[bool] = None
+        # SKILL.md 每次重新解析后递增，注册表据此失效渲染缓存
+        self.revision = 0
 
         self._load_skill_md()
 
@@ -30,6 +71,7 @@ class SkillTool(BaseTool):
         """解析 SKILL.md 中的 YAML 元数据和参数"""
         if not self.skill_md_path.exists():
             return
+        self._skill_md_mtime_ns = self.skill_md_path.stat().st_mtime_ns
 
         with open(self.skill_md_path, "r", encoding="utf-8") as f:
             content = f.read()
@@ -41,6 +83,12 @@ class SkillTool(BaseTool):
                 metadata = yaml.safe_load(front_matter)
                 self._name = metadata.get("name", self.skill_dir.name)
                 self._description = metadata.get("description", "")
+                if metadata.get("executor") in ("thread", "process"):
+                    self.pool = metadata["executor"]
+                if isinstance(metadata.get("result_limits"), dict):
+                    self.result_limits = ResultLimits.from_dict(
+                        metadata["result_limits"]
+                    )
 
                 # 从正文中解析参数
                 if "parameters" in metadata:
@@ -50,6 +98,17 @@ class SkillTool(BaseTool):
             except Exception as e:
                 logger.error(f"解析 {self.skill_md_path} 失败: {e}")
 
+    def _reload_skill_md_if_changed(self) -> None:
+        """热重载模式下，SKILL.md 变化后重新解析描述与参数"""
+        try:
+            mtime_ns = self.skill_md_path.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime_ns != self._skill_md_mtime_ns:
+            logger.info(f"检测到 {self.skill_md_path} 变化，重新加载")
+            self._load_skill_md()
+            self.revision += 1
+
     @property
     def name(self) -> str:
         return self._name
@@ -67,27 +126,89 @@ class SkillTool(BaseTool):
         if not self.script_path or not self.script_path.exists():
             raise FileNotFoundError(f"找不到执行脚本: {self.script_path}")
 
-        # 动态加载并运行脚本中的 run 函数
+        if self.hot_reload:
+            self._reload_skill_md_if_changed()
+
+        # 同步 run 函数交给执行池，由工作线程 / 子进程加载脚本，避免阻塞事件循环
         try:
-            spec = importlib.util.spec_from_file_location(
-                "skill_script", self.script_path
+            if self._run_is_async is None or self.hot_reload:
+                module = await self._load_module()
+                if not hasattr(module, "run"):
+                    raise AttributeError(f"脚本 {self.script_path} 中未定义 run 函数")
+                self._run_is_async = asyncio.iscoroutinefunction(module.run)
+            if self._run_is_async:
+                module = await self._load_module()
+                return await module.run(**kwargs)
+            executor = self._executor or get_skill_executor()
+            return await executor.submit(
+                self.pool,
+                self.script_path,
+                kwargs,
+                hot_reload=self.hot_reload,
             )
-            if spec is None or spec.loader is None:
-                raise ImportError(f"无法加载脚本模块: {self.script_path}")
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-
-            if hasattr(module, "run"):
-                if asyncio.iscoroutinefunction(module.run):
-                    return await module.run(**kwargs)
-                else:
-                    return module.run(**kwargs)
-            else:
-                raise AttributeError(f"脚本 {self.script_path} 中未定义 run 函数")
+        except SkillExecutorBusyError:
+            raise
         except Exception as e:
             logger.error(f"执行技能 {self.name} 失败: {e}")
             return {"error": str(e)}
 
+    async def _load_module(self) -> ModuleType:
+        """在工作线程中加载（缓存的）脚本模块"""
+        return await anyio.to_thread.run_sync(
+            partial(
+                load_skill_module, str(self.script_path), hot_reload=self.hot_reload
+            )
+        )
+
+    async def stream(self, **kwargs) -> AsyncIterator[ToolStreamItem]:
+        """
+        流式运行技能
+
+        脚本定义了同步生成器函数 stream 时，交给执行池逐项推进并产出中间结果，
+        生成器的返回值作为最终结果；未定义时退化为 run。
+        """
+        if not self.script_path or not self.script_path.exists():
+            raise FileNotFoundError(f"找不到执行脚本: {self.script_path}")
+
+        if self.hot_reload:
+            self._reload_skill_md_if_changed()
+
+        try:
+            module = await self._load_module()
+        except Exception:
+            # 加载失败由 run 统一转换为错误结果
+            module = None
+        if not callable(getattr(module, "stream", None)):
+            yield ToolStreamItem(await self.run(**kwargs), final=True)
+            return
+
+        # 与 run 一样经过执行器：遵守执行池类型、排队上限与进程隔离
+        executor = self._executor or get_skill_executor()
+        value: Any = None
+        try:
+            async with executor.stream(
+                self.pool, self.script_path, kwargs, hot_reload=self.hot_reload
+            ) as items:
+                async for done, value in items:
+                    if done:
+                        break
+                    yield ToolStreamItem(value)
+        except SkillExecutorBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"执行技能 {self.name} 失败: {e}")
+            value = {"error": str(e)}
+        yield ToolStreamItem(value, final=True)
+
+
+@dataclass(frozen=True)
+class RenderedTools:
+    """工具元数据的渲染结果（只读，调用方不应修改 openai_tools）"""
+
+    description: str
+    names: str
+    openai_tools: List[Dict[str, Any]]
+
 
 class ToolRegistry:
     """工具注册表 - 负责自动发现和管理所有工具"""
@@ -96,6 +217,8 @@ class ToolRegistry:
         self,
         skills_dir: Optional[str] = None,
         scripts_dir: Optional[str] = None,
+        result_limits: Optional[ResultLimits] = None,
+        result_store: Optional[ToolResultStore] = None,
     ) -> None:
         # 默认路径
         root_dir = Path(__file__).parent.parent.parent.parent
@@ -110,6 +233,31 @@ class ToolRegistry:
 
         self._tools: Dict[str, BaseTool] = {}
         self._mcp_clients: Dict[str, MCPClient] = {}
+        # 工具集合每次变化时递增
+        self._version = 0
+        self._render_key: Tuple[int, int] = (-1, 0)
+        self._render_cache: Dict[Optional[FrozenSet[str]], RenderedTools] = {}
+        # 工具结果整形：默认上限与被截断结果的暂存区
+        if result_limits is None:
+            result_limits = ResultLimits(
+                max_items=settings.TOOL_RESULT_MAX_ITEMS,
+                max_bytes=settings.TOOL_RESULT_MAX_BYTES,
+            )
+        if result_store is None:
+            result_store = ToolResultStore(
+                max_entries=settings.TOOL_RESULT_STORE_MAX_ENTRIES,
+                ttl_s=settings.TOOL_RESULT_STORE_TTL_S,
+            )
+        self.result_limits = result_limits
+        self.result_store = result_store
+
+    @property
+    def version(self) -> int:
+        """注册表版本号，注册 / 注销工具时单调递增"""
+        return self._version
+
+    def _bump_version(self) -> None:
+        self._version += 1
 
     def scan_skills(self) -> None:
         """扫描 skills 目录并自动注册工具"""
@@ -145,6 +293,14 @@ class ToolRegistry:
     def register(self, tool: BaseTool):
         """手动注册工具"""
         self._tools[tool.name] = tool
+        self._bump_version()
+
+    def unregister(self, name: str) -> Optional[BaseTool]:
+        """注销指定名称的工具"""
+        tool = self._tools.pop(name, None)
+        if tool is not None:
+            self._bump_version()
+        return tool
 
     def get_tool(self, name: str) -> Optional[BaseTool]:
         """获取指定名称的工具"""
@@ -154,9 +310,68 @@ class ToolRegistry:
         """列出所有已注册工具"""
         return list(self._tools.values())
 
-    def get_openai_tools(self) -> List[Dict[str, Any]]:
-        """获取所有工具的 OpenAI 格式描述"""
-        return [tool.to_openai_tool() for tool in self._tools.values()]
+    def format_observation(
+        self,
+        tool: BaseTool,
+        result: Any,
+        *,
+        save: Optional[Callable[[], str]] = None,
+    ) -> str:
+        """
+        将工具结果整形为 Observation 文本
+
+        超出工具（或注册表默认）上限的结果只保留摘要，完整结果由 save 保存
+        并返回句柄（默认暂存在进程内的 result_store 中），
+        可凭 Observation 中的 _result_handle 取回。
+        """
+        if save is None:
+            save = partial(self.result_store.put, tool.name, result)
+        shaped = shape_result(
+            result, tool.result_limits or self.result_limits, save=save
+        )
+        if shaped.truncated:
+            logger.info(f"工具 {tool.name} 的结果已截断: {shaped.omitted}")
+        return shaped.text
+
+    def get_openai_tools(
+        self, allowed_tools: Optional[AbstractSet[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """获取工具的 OpenAI 格式描述"""
+        return list(self.render(allowed_tools).openai_tools)
+
+    def render(self, allowed_tools: Optional[AbstractSet[str]] = None) -> RenderedTools:
+        """
+        渲染工具描述、名称列表与 OpenAI 工具列表
+
+        结果按 (注册表版本, allowed_tools) 缓存，
+        ReAct 每轮迭代复用同一份渲染结果，而不是重复序列化 JSON Schema。
+        """
+        # 热重载的技能会在注册表之外修改自身元数据，一并计入缓存键
+        revisions = sum(getattr(tool, "revision", 0) for tool in self._tools.values())
+        key = (self._version, revisions)
+        if key != self._render_key:
+            self._render_cache.clear()
+            self._render_key = key
+
+        allowed = None if allowed_tools is None else frozenset(allowed_tools)
+        rendered = self._render_cache.get(allowed)
+        if rendered is None:
+            tool_list = [
+                tool
+                for tool in self._tools.values()
+                if allowed is None or tool.name in allowed
+            ]
+            rendered = RenderedTools(
+                description="\n".join(
+                    f"{tool.name}: {tool.description}\n"
+                    f"   Parameters: {json.dumps(tool.parameters, ensure_ascii=False)}"
+                    for tool in tool_list
+                ),
+                names=", ".join(tool.name for tool in tool_list),
+                openai_tools=[tool.to_openai_tool() for tool in tool_list],
+            )
+            self._render_cache[allowed] = rendered
+        return rendered
 
     # --- MCP 服务器管理 ---
 
@@ -172,6 +387,7 @@ class ToolRegistry:
             tools = await client.list_tools(prefix=server_id)
             for tool in tools:
                 self._tools[tool.name] = tool
+            self._bump_version()
 
             self._mcp_clients[server_id] = client
             logger.info(f"已成功注册 MCP 服务器 {server_id}，新增 {len(tools)} 个工具")
@@ -190,6 +406,7 @@ class ToolRegistry:
             keys_to_remove = [k for k in self._tools if k.startswith(prefix)]
             for k in keys_to_remove:
                 self._tools.pop(k)
+            self._bump_version()
             logger.info(f"已注销 MCP 服务器 {server_id}")
 
 
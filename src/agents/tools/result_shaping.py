@@ -0,0 +1,156 @@
+"""工具结果整形 - 限制写入 Observation 的条目数与字节数，完整结果按句柄暂存"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ResultLimits:
+    """单个工具结果写入提示词时的上限"""
+
+    # 每个列表最多保留的条目数
+    max_items: int = 50
+    # 整个 Observation 的最大字节数（UTF-8）
+    max_bytes: int = 8192
+    # 单个字符串字段的最大字符数
+    max_string_chars: int = 2000
+
+    def __post_init__(self) -> None:
+        if self.max_items <= 0 or self.max_bytes <= 0 or self.max_string_chars <= 0:
+            raise ValueError("结果上限必须为正整数")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ResultLimits":
+        fields = ("max_items", "max_bytes", "max_string_chars")
+        return cls(**{k: int(v) for k, v in data.items() if k in fields})
+
+
+@dataclass(frozen=True)
+class ShapedResult:
+    text: str
+    truncated: bool
+    # 被截断字段的原始条目数 / 字符数，键为字段路径（根节点为 "$"）
+    omitted: Dict[str, int]
+
+
+def _shrink(value: Any, limits: ResultLimits, path: str, omitted: Dict[str, int]):
+    if isinstance(value, dict):
+        return {
+            k: _shrink(v, limits, f"{path}.{k}" if path else str(k), omitted)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        items = list(value)
+        if len(items) > limits.max_items:
+            omitted[path or "$"] = len(items)
+            items = items[: limits.max_items]
+        return [
+            _shrink(v, limits, f"{path}[{i}]", omitted) for i, v in enumerate(items)
+        ]
+    if isinstance(value, str) and len(value) > limits.max_string_chars:
+        omitted[path or "$"] = len(value)
+        return value[: limits.max_string_chars] + "…"
+    return value
+
+
+def _cut_bytes(text: str, max_bytes: int) -> str:
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text
+    return data[:max_bytes].decode("utf-8", errors="ignore")
+
+
+def shape_result(
+    result: Any,
+    limits: ResultLimits,
+    *,
+    save: Optional[Callable[[], str]] = None,
+) -> ShapedResult:
+    """
+    按上限整形工具结果
+
+    未超出上限时保持原有的 str(result) 形式；超出时改为 JSON：
+    过长的列表只保留前 max_items 项、过长的字符串截断，原始长度记录在
+    _truncated 中。结果被截断且提供了 save 时，调用 save 暂存完整结果，
+    返回的句柄写入 _result_handle。
+    """
+    omitted: Dict[str, int] = {}
+    shrunk = _shrink(result, limits, "", omitted)
+    if not omitted:
+        text = str(result)
+        if len(text.encode("utf-8")) <= limits.max_bytes:
+            return ShapedResult(text=text, truncated=False, omitted={})
+
+    if isinstance(shrunk, dict):
+        payload: Dict[str, Any] = dict(shrunk)
+    elif isinstance(shrunk, list):
+        payload = {"items": shrunk}
+    else:
+        payload = {"text": shrunk if isinstance(shrunk, str) else str(shrunk)}
+    if omitted:
+        payload["_truncated"] = {"max_items": limits.max_items, "totals": omitted}
+    handle = save() if save is not None else None
+    if handle is not None:
+        payload["_result_handle"] = handle
+
+    shaped = json.dumps(payload, ensure_ascii=False, default=str)
+    if len(shaped.encode("utf-8")) > limits.max_bytes:
+        note = "… [结果过长已截断"
+        note += f"，完整结果句柄: {handle}]" if handle else "]"
+        budget = max(0, limits.max_bytes - len(note.encode("utf-8")))
+        shaped = _cut_bytes(shaped, budget) + note
+    return ShapedResult(text=shaped, truncated=True, omitted=omitted)
+
+
+class ToolResultStore:
+    """
+    完整工具结果的暂存区
+
+    整形时被截断的结果按句柄保存在进程内，超过 ttl_s 或超出 max_entries
+    （淘汰最早写入的条目）后不可再取回。
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 256,
+        ttl_s: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries 必须为正整数")
+        if ttl_s <= 0:
+            raise ValueError("ttl_s 必须为正数")
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._clock = clock
+        # handle -> (tool_name, result, stored_at)
+        self._entries: "OrderedDict[str, Tuple[str, Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, tool_name: str, result: Any) -> str:
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._entries[handle] = (tool_name, result, self._clock())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return handle
+
+    def get(self, handle: str) -> Optional[Tuple[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                return None
+            tool_name, result, stored_at = entry
+            if self._clock() - stored_at > self.ttl_s:
+                del self._entries[handle]
+                return None
+            return tool_name, result
+
+    def __len__(self) -> int:
+        return len(self._entries)
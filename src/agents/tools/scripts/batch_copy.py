@@ -5,6 +5,7 @@ from src.utils.tool_utils import (
     add_failed_file,
     ensure_dir,
     init_batch_result,
+    iter_files,
     validate_path,
 )
 
@@ -34,62 +35,54 @@ def batch_copy_files(
         else []
     )
 
-    def walk_root(path: str):
-        return [(path, [], os.listdir(path))]
-
-    walk_func = os.walk if copy_subfolders else walk_root
-    for root, _, files in walk_func(source_path):
-        if not copy_subfolders and root != source_path:
-            continue
-
-        for filename in files:
-            file_lower = filename.lower()
-            if filter_parts:
-                match = False
-                for f in filter_parts:
-                    if f.startswith("."):
-                        if file_lower.endswith(f):
-                            match = True
-                            break
-                    else:
-                        if f in file_lower:
-                            match = True
-                            break
-                if not match:
+    for root, filename in iter_files(source_path, recursive=copy_subfolders):
+        file_lower = filename.lower()
+        if filter_parts:
+            match = False
+            for f in filter_parts:
+                if f.startswith("."):
+                    if file_lower.endswith(f):
+                        match = True
+                        break
+                else:
+                    if f in file_lower:
+                        match = True
+                        break
+            if not match:
+                continue
+
+        source_file = os.path.join(root, filename)
+        rel_path = os.path.relpath(source_file, source_path)
+        target_file = os.path.join(target_path, rel_path)
+
+        try:
+            target_dir = os.path.dirname(target_file)
+            if not os.path.exists(target_dir):
+                os.makedirs(target_dir, exist_ok=True)
+
+            if os.path.exists(target_file):
+                if duplicate_strategy == "skip":
+                    result["skipped_count"] += 1
                     continue
-
-            source_file = os.path.join(root, filename)
-            rel_path = os.path.relpath(source_file, source_path)
-            target_file = os.path.join(target_path, rel_path)
-
-            try:
-                target_dir = os.path.dirname(target_file)
-                if not os.path.exists(target_dir):
-                    os.makedirs(target_dir, exist_ok=True)
-
-                if os.path.exists(target_file):
-                    if duplicate_strategy == "skip":
-                        result["skipped_count"] += 1
-                        continue
-                    if duplicate_strategy == "overwrite":
-                        os.remove(target_file)
-                        result["overwritten_count"] += 1
-                    elif duplicate_strategy == "rename":
-                        base_dir = os.path.dirname(target_file)
-                        name, ext = os.path.splitext(os.path.basename(target_file))
-                        counter = 1
-                        while os.path.exists(target_file):
-                            target_file = os.path.join(
-                                base_dir, f"{name}-副本{counter}{ext}"
-                            )
-                            counter += 1
-
-                shutil.copy2(source_file, target_file)
-                result["success_count"] += 1
-                result["copied_files"].append(f"{source_file} → {target_file}")
-
-            except Exception as e:
-                add_failed_file(result, filename, str(e))
+                if duplicate_strategy == "overwrite":
+                    os.remove(target_file)
+                    result["overwritten_count"] += 1
+                elif duplicate_strategy == "rename":
+                    base_dir = os.path.dirname(target_file)
+                    name, ext = os.path.splitext(os.path.basename(target_file))
+                    counter = 1
+                    while os.path.exists(target_file):
+                        target_file = os.path.join(
+                            base_dir, f"{name}-副本{counter}{ext}"
+                        )
+                        counter += 1
+
+            shutil.copy2(source_file, target_file)
+            result["success_count"] += 1
+            result["copied_files"].append(f"{source_file} → {target_file}")
+
+        except Exception as e:
+            add_failed_file(result, filename, str(e))
 
     return result
 
@@ -1,6 +1,11 @@
 import os
 
-from src.utils.tool_utils import add_failed_file, init_batch_result, validate_path
+from src.utils.tool_utils import (
+    add_failed_file,
+    init_batch_result,
+    iter_files,
+    validate_path,
+)
 
 
 def batch_delete_files(
@@ -34,33 +39,25 @@ def batch_delete_files(
         else []
     )
 
-    def walk_root(path: str):
-        return [(path, [], os.listdir(path))]
-
-    walk_func = os.walk if delete_subfolders else walk_root
     delete_candidates = []
 
-    for root, _, files in walk_func(target_path):
-        if not delete_subfolders and root != target_path:
-            continue
-
-        for filename in files:
-            file_lower = filename.lower()
-            if filter_parts:
-                match = False
-                for f in filter_parts:
-                    if f.startswith("."):
-                        if file_lower.endswith(f):
-                            match = True
-                            break
-                    else:
-                        if f in file_lower:
-                            match = True
-                            break
-                if not match:
-                    continue
-
-            delete_candidates.append(os.path.join(root, filename))
+    for root, filename in iter_files(target_path, recursive=delete_subfolders):
+        file_lower = filename.lower()
+        if filter_parts:
+            match = False
+            for f in filter_parts:
+                if f.startswith("."):
+                    if file_lower.endswith(f):
+                        match = True
+                        break
+                else:
+                    if f in file_lower:
+                        match = True
+                        break
+            if not match:
+                continue
+
+        delete_candidates.append(os.path.join(root, filename))
 
     if len(delete_candidates) > max_delete:
         delete_candidates = delete_candidates[:max_delete]
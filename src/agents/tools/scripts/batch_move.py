@@ -5,6 +5,7 @@ from src.utils.tool_utils import (
     add_failed_file,
     ensure_dir,
     init_batch_result,
+    iter_files,
     validate_path,
 )
 
@@ -37,64 +38,56 @@ def batch_move_files(
         else []
     )
 
-    def walk_root(path: str):
-        return [(path, [], os.listdir(path))]
-
-    walk_func = os.walk if move_subfolders else walk_root
-    for root, dirs, files in walk_func(source_path):
-        if not move_subfolders and root != source_path:
-            continue
-
-        for filename in files:
-            file_lower = filename.lower()
-            if filter_parts:
-                match = False
-                for f in filter_parts:
-                    if f.startswith("."):
-                        if file_lower.endswith(f):
-                            match = True
-                            break
-                    else:
-                        if f in file_lower:
-                            match = True
-                            break
-                if not match:
-                    continue
-
-            source_file = os.path.join(root, filename)
-            target_file = os.path.join(target_path, filename)
-
-            try:
-                if os.path.exists(target_file):
-                    if duplicate_strategy == "skip":
-                        result["skipped_count"] += 1
-                        continue
-                    elif duplicate_strategy == "overwrite":
-                        os.remove(target_file)
-                        result["overwritten_count"] += 1
-                    elif duplicate_strategy == "rename":
-                        name, ext = os.path.splitext(filename)
-                        counter = 1
-                        while os.path.exists(target_file):
-                            target_file = os.path.join(
-                                target_path, f"{name}-副本{counter}{ext}"
-                            )
-                            counter += 1
-
-                if (
-                    os.path.splitdrive(source_file)[0]
-                    != os.path.splitdrive(target_file)[0]
-                ):
-                    shutil.copy2(source_file, target_file)
-                    os.remove(source_file)
+    for root, filename in iter_files(source_path, recursive=move_subfolders):
+        file_lower = filename.lower()
+        if filter_parts:
+            match = False
+            for f in filter_parts:
+                if f.startswith("."):
+                    if file_lower.endswith(f):
+                        match = True
+                        break
                 else:
-                    shutil.move(source_file, target_file)
-
-                result["success_count"] += 1
-                result["moved_files"].append(f"{source_file} → {target_file}")
-
-            except Exception as e:
-                add_failed_file(result, filename, str(e))
+                    if f in file_lower:
+                        match = True
+                        break
+            if not match:
+                continue
+
+        source_file = os.path.join(root, filename)
+        target_file = os.path.join(target_path, filename)
+
+        try:
+            if os.path.exists(target_file):
+                if duplicate_strategy == "skip":
+                    result["skipped_count"] += 1
+                    continue
+                elif duplicate_strategy == "overwrite":
+                    os.remove(target_file)
+                    result["overwritten_count"] += 1
+                elif duplicate_strategy == "rename":
+                    name, ext = os.path.splitext(filename)
+                    counter = 1
+                    while os.path.exists(target_file):
+                        target_file = os.path.join(
+                            target_path, f"{name}-副本{counter}{ext}"
+                        )
+                        counter += 1
+
+            if (
+                os.path.splitdrive(source_file)[0]
+                != os.path.splitdrive(target_file)[0]
+            ):
+                shutil.copy2(source_file, target_file)
+                os.remove(source_file)
+            else:
+                shutil.move(source_file, target_file)
+
+            result["success_count"] += 1
+            result["moved_files"].append(f"{source_file} → {target_file}")
+
+        except Exception as e:
+            add_failed_file(result, filename, str(e))
 
     return result
 
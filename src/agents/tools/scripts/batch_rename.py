@@ -1,6 +1,11 @@
 import os
 
-from src.utils.tool_utils import add_failed_file, get_allowed_exts, validate_path
+from src.utils.tool_utils import (
+    add_failed_file,
+    get_allowed_exts,
+    iter_files,
+    validate_path,
+)
 
 
 def batch_rename_files(source_path, rename_rule, rule_params, file_filter=""):
@@ -22,11 +27,8 @@ def batch_rename_files(source_path, rename_rule, rule_params, file_filter=""):
 
     allowed_extensions = get_allowed_exts(file_filter)
 
-    file_list = [
-        f
-        for f in os.listdir(source_path)
-        if os.path.isfile(os.path.join(source_path, f))
-    ]
+    # 先取出完整列表再重命名，避免改名后的文件被再次处理
+    file_list = [f for _, f in iter_files(source_path, recursive=False)]
     sequence = rule_params if rename_rule == "add_sequence" else 1
 
     for filename in file_list:
@@ -1,3 +1,4 @@
+from src.utils.text_stream import BinaryFileError, replace_in_file
 from src.utils.tool_utils import (
     add_failed_file,
     compile_regex,
@@ -14,46 +15,23 @@ def batch_replace_text(search_path, old_text, new_text, file_filter="", is_regex
     if result.get("error_msg"):
         return result
 
-    pattern = None
+    if not old_text:
+        result["error_msg"] = "old_text 不能为空"
+        return result
+
     if is_regex:
-        pattern = compile_regex(old_text, True, result)
+        compile_regex(old_text, True, result)
         if result["error_msg"]:
             return result
 
     def replace_callback(file_path, filename):
         result["processed_count"] += 1
         try:
-            # 这里需要知道原始编码以写回，read_file_safe 不够用，我们需要带编码的读取
-            content = None
-            encoding = "utf-8"
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-            except UnicodeDecodeError:
-                encoding = "latin-1"
-                with open(file_path, "r", encoding="latin-1") as f:
-                    content = f.read()
-
-            if content is None:
-                return
-
-            new_content = content
-            modified = False
-
-            if is_regex:
-                if pattern.search(content):
-                    new_content = pattern.sub(new_text, content)
-                    modified = new_content != content
-            else:
-                if old_text in content:
-                    new_content = content.replace(old_text, new_text)
-                    modified = True
-
-            if modified:
-                with open(file_path, "w", encoding=encoding) as f:
-                    f.write(new_content)
+            # 按块读取并写入临时文件，完成后原子替换；没有匹配的文件不会被写入
+            if replace_in_file(file_path, old_text, new_text, is_regex=is_regex):
                 result["modified_count"] += 1
-
+        except BinaryFileError:
+            return
         except Exception as e:
             add_failed_file(result, filename, str(e))
 
@@ -1,58 +1,81 @@
+from contextlib import closing
+
 from src.utils.tool_utils import (
     compile_regex,
     init_search_replace_result,
-    read_file_safe,
-    walk_files,
+    parallel_search,
+    search_candidates,
 )
 
+MAX_MATCHED_FILES = 100
 
-def batch_search_files(
-    search_path, keyword, is_regex=False, file_filter="", case_sensitive=False
+
+def iter_search_files(
+    search_path,
+    keyword,
+    is_regex=False,
+    file_filter="",
+    case_sensitive=False,
+    max_results=MAX_MATCHED_FILES,
 ):
     """
-    批量搜索文件内容核心函数
+    批量搜索文件内容的生成器：找到一个匹配文件就产出一项，结束时返回完整结果
+
+    遍历、候选过滤与匹配都是按需进行的，达到 max_results 后立即停止，
+    此时若还有未检查的文件，结果中的 has_more 为 True。
     """
     result, allowed_exts = init_search_replace_result(search_path, file_filter)
+    result["has_more"] = False
     if result.get("error_msg"):
         return result
 
-    pattern = None
     if is_regex:
-        pattern = compile_regex(keyword, case_sensitive, result)
+        compile_regex(keyword, case_sensitive, result)
         if result["error_msg"]:
             return result
 
-    def search_callback(file_path, filename):
-        content = read_file_safe(file_path)
-        if content is None:
-            return
-
-        matches = []
-        if is_regex:
-            matches = pattern.findall(content)
-        else:
-            if not case_sensitive:
-                if keyword.lower() in content.lower():
-                    matches = [keyword]
-            else:
-                if keyword in content:
-                    matches = [keyword]
-
-        if matches:
-            result["matched_count"] += 1
-            result["matched_files"].append(
-                {"path": file_path, "match_preview": f"Found {len(matches)} matches"}
-            )
-
-    walk_files(search_path, allowed_exts, search_callback)
-
-    # 限制返回数量
-    if len(result["matched_files"]) > 100:
-        result["matched_files"] = result["matched_files"][:100]
+    candidates = search_candidates(
+        search_path, allowed_exts, keyword, is_regex, case_sensitive
+    )
+    matches = parallel_search(candidates, keyword, is_regex, case_sensitive)
+    with closing(matches):
+        for file_path, count in matches:
+            if result["matched_count"] >= max_results:
+                # 只确认是否还有未检查的文件，不再继续匹配
+                result["has_more"] = True
+                break
+            if count is None:
+                continue
+            result["processed_count"] += 1
+            if count:
+                result["matched_count"] += 1
+                item = {"path": file_path, "match_preview": f"Found {count} matches"}
+                result["matched_files"].append(item)
+                yield item
 
     return result
 
 
+def batch_search_files(
+    search_path, keyword, is_regex=False, file_filter="", case_sensitive=False
+):
+    """
+    批量搜索文件内容核心函数
+    """
+    search = iter_search_files(
+        search_path,
+        keyword,
+        is_regex=is_regex,
+        file_filter=file_filter,
+        case_sensitive=case_sensitive,
+    )
+    while True:
+        try:
+            next(search)
+        except StopIteration as stop:
+            return stop.value
+
+
 def run(
     search_path: str,
     keyword: str,
@@ -69,6 +92,23 @@ def run(
     )
 
 
+def stream(
+    search_path: str,
+    keyword: str,
+    is_regex: bool = False,
+    file_filter: str = "",
+    case_sensitive: bool = False,
+):
+    """流式执行：逐个产出匹配的文件，生成器的返回值为与 run 相同的完整结果"""
+    return iter_search_files(
+        search_path,
+        keyword,
+        is_regex=is_regex,
+        file_filter=file_filter,
+        case_sensitive=case_sensitive,
+    )
+
+
 if __name__ == "__main__":
     # Test
     print(batch_search_files(".", "TODO", file_filter=".py"))
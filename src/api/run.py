@@ -1,7 +1,16 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import anyio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
+from src.agents.llm.client_pool import get_client_pool
+from src.agents.llm.rate_limiter import preload_encoding
+from src.agents.tools.executor import SkillExecutorBusyError
+from src.api.v1.routes.chat import get_store
 from src.api.v1.routes.main import api_router
 from src.config import settings
 
@@ -18,8 +27,27 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if sentry_sdk and settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # 后台定期淘汰空闲会话与模型客户端，防止长时间运行的进程内存与连接无限增长
+    client_pool = get_client_pool()
+    # tiktoken 编码首次加载会读取磁盘 / 下载文件，放在线程中提前完成
+    await preload_encoding()
+    try:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(get_store().run_sweeper, settings.CHAT_SWEEP_INTERVAL_S)
+            tg.start_soon(client_pool.run_sweeper, client_pool.idle_ttl_s / 2)
+            yield
+            tg.cancel_scope.cancel()
+    finally:
+        with anyio.CancelScope(shield=True):
+            await client_pool.aclose()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
@@ -34,4 +62,16 @@ if settings.all_cors_origins:
         allow_headers=["*"],
     )
 
+
+@app.exception_handler(SkillExecutorBusyError)
+async def skill_executor_busy_handler(
+    request: Request, exc: SkillExecutorBusyError
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -1,13 +1,27 @@
 import json
+import logging
 import re
-from dataclasses import dataclass
-from typing import Any, Dict, Literal, Optional
+from dataclasses import dataclass, field, replace
+from functools import lru_cache, partial
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
+from uuid import uuid4
 
 from src.agents.llm import model_factory
-from src.agents.llm.base import BaseModel
-from src.agents.prompt.react import REACT_PROMPT
+from src.agents.llm.base import BaseModel, ToolCall, ToolCallResponse
+from src.agents.memory.scratchpad_budget import ScratchpadBudget
+from src.agents.prompt.react import (
+    REACT_SYSTEM_PROMPT,
+    REACT_TASK_PROMPT,
+    to_native_tools_prompt,
+)
 from src.agents.service.base_agent import BaseAgent
+from src.agents.service.react_agent import split_react_actions
+from src.agents.tools.base_tool import BaseTool
+from src.agents.tools.parallel import gather_limited
 from src.agents.tools.registry import ToolRegistry
+from src.api.v1.chat_store import BaseChatStore
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass(frozen=True)
@@ -19,10 +33,30 @@ class ParsedDecision:
     error: str = ""
 
 
+TurnEventType = Literal[
+    "token",
+    "tool_call",
+    "tool_progress",
+    "observation",
+    "final",
+    "approval_required",
+    "invalid",
+]
+
+
+@dataclass(frozen=True)
+class TurnEvent:
+    """ReAct 回合中产生的事件，final / approval_required / invalid 为终止事件"""
+
+    type: TurnEventType
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
 class FakeReActModel(BaseModel):
     def __init__(self, config: Dict[str, Any]):
         self._name = config.get("name", "fake-react")
         self._provider = config.get("provider", "fake-react")
+        self._function_calling = bool(config.get("function_calling", False))
 
     @property
     def name(self) -> str:
@@ -34,39 +68,83 @@ class FakeReActModel(BaseModel):
 
     @property
     def function_calling(self) -> bool:
-        return False
+        return self._function_calling
 
-    async def generate(self, prompt: str, **kwargs) -> str:
+    @staticmethod
+    def _plan(prompt: str) -> Optional[Dict[str, Any]]:
+        """返回下一步的检索参数；已有 Observation 时返回 None 表示结束"""
         start = prompt.rfind("## 开始")
         scratch_region = prompt[start:] if start != -1 else prompt
 
         if "Observation:" in scratch_region:
-            return "Final Answer: ok"
+            return None
 
         workspace_dir = "."
         m = re.search(r"WORKSPACE_DIR\s*=\s*(.+)", prompt)
         if m:
             workspace_dir = m.group(1).strip().splitlines()[0].strip()
 
-        tool_args = {
+        return {
             "search_path": workspace_dir,
             "keyword": "TODO",
             "is_regex": False,
             "file_filter": ".txt",
             "case_sensitive": False,
         }
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        tool_args = self._plan(prompt)
+        if tool_args is None:
+            return "Final Answer: ok"
         return (
             "Thought: 我需要先检索关键信息。\n"
             "Action: batch-file-search\n"
             f"Action Input: {json.dumps(tool_args, ensure_ascii=False)}\n"
         )
 
+    async def generate_tool_calls(
+        self, prompt: str, tools: List[Dict[str, Any]], **kwargs
+    ) -> ToolCallResponse:
+        tool_args = self._plan(prompt)
+        if tool_args is None:
+            return ToolCallResponse(content="ok")
+        return ToolCallResponse(
+            content="我需要先检索关键信息。",
+            tool_calls=[
+                ToolCall(id="call_0", name="batch-file-search", arguments=tool_args)
+            ],
+        )
+
 
 def create_model_from_config(model_config: Dict[str, Any]) -> BaseModel:
     provider = str(model_config.get("provider", "")).lower()
     if provider in {"fake-react", "fake"}:
         return FakeReActModel(model_config)
-    return model_factory.create_model(model_config)
+    return model_factory.get_or_create_model(model_config)
+
+
+@lru_cache(maxsize=32)
+def render_react_prefix(tools_desc: str, tool_names: str, native: bool = False) -> str:
+    """渲染静态前缀（系统提示 + 工具列表）
+
+    工具描述由注册表按版本缓存，同一版本得到同一对字符串，
+    因此这里按内容缓存即相当于按注册表版本缓存。
+    native=True 时工具随请求的 tools 参数发送，前缀中不再包含工具列表与文本格式说明。
+    """
+    template = (
+        to_native_tools_prompt(REACT_SYSTEM_PROMPT) if native else REACT_SYSTEM_PROMPT
+    )
+    return BaseAgent.format_prompt(
+        template,
+        {"tools": tools_desc, "tool_names": tool_names},
+    )
+
+
+def format_react_task(*, user_input: str, scratchpad: str) -> str:
+    return BaseAgent.format_prompt(
+        REACT_TASK_PROMPT,
+        {"input": user_input, "agent_scratchpad": scratchpad},
+    )
 
 
 def format_react_prompt(
@@ -75,16 +153,37 @@ def format_react_prompt(
     scratchpad: str,
     tools_desc: str,
     tool_names: str,
+    native: bool = False,
 ) -> str:
-    return BaseAgent.format_prompt(
-        REACT_PROMPT,
+    prefix = render_react_prefix(tools_desc, tool_names, native)
+    task = format_react_task(user_input=user_input, scratchpad=scratchpad)
+    return f"{prefix}\n\n{task}"
+
+
+def build_react_messages(
+    *,
+    user_input: str,
+    scratchpad: str,
+    tools_desc: str,
+    tool_names: str,
+    native: bool = False,
+) -> List[Dict[str, str]]:
+    """构造 ReAct 迭代的消息列表
+
+    静态前缀作为不变的 system 消息，用户问题与只增不减的 scratchpad
+    放在其后的 user 消息中。每轮迭代只在末尾追加内容，
+    前缀保持逐字节一致，可以命中模型服务端的提示词前缀缓存。
+    """
+    return [
         {
-            "tools": tools_desc,
-            "tool_names": tool_names,
-            "input": user_input,
-            "agent_scratchpad": scratchpad,
+            "role": "system",
+            "content": render_react_prefix(tools_desc, tool_names, native),
         },
-    )
+        {
+            "role": "user",
+            "content": format_react_task(user_input=user_input, scratchpad=scratchpad),
+        },
+    ]
 
 
 def parse_react_decision(decision: str) -> ParsedDecision:
@@ -123,14 +222,250 @@ def parse_react_decision(decision: str) -> ParsedDecision:
         return ParsedDecision(kind="invalid", error=f"Action Input JSON 解析失败: {e}")
 
 
+def parse_react_decisions(
+    decision: str, *, first_only: bool = False
+) -> tuple[str, List[ParsedDecision]]:
+    """解析可能包含多组 Action 的模型输出
+
+    first_only=True 时只保留第一组 Action，并相应截断返回的文本记录。
+    """
+    segments = split_react_actions(decision)
+    if first_only and len(segments) > 1:
+        segments = segments[:1]
+        decision = segments[0].rstrip("\n")
+    return decision, [parse_react_decision(segment) for segment in segments]
+
+
+async def format_session_observation(
+    store: BaseChatStore,
+    session_id: str,
+    tools: ToolRegistry,
+    tool: BaseTool,
+    result: Any,
+) -> str:
+    """整形工具结果；被截断的完整结果按句柄保存到会话存储，只能在本会话中取回"""
+    handles: List[str] = []
+
+    def _save() -> str:
+        handles.append(uuid4().hex)
+        return handles[-1]
+
+    observation = tools.format_observation(tool, result, save=_save)
+    for handle in handles:
+        await store.save_tool_result(
+            session_id, handle=handle, tool_name=tool.name, result=result
+        )
+    return observation
+
+
 def build_tools_metadata(tools: ToolRegistry) -> tuple[str, str]:
-    tool_list = tools.list_tools()
-    tools_desc_lines = []
-    tool_names = []
-    for tool in tool_list:
-        tools_desc_lines.append(
-            f"{tool.name}: {tool.description}\n"
-            f"   Parameters: {json.dumps(tool.parameters, ensure_ascii=False)}"
+    rendered = tools.render()
+    return rendered.description, rendered.names
+
+
+def decisions_from_tool_calls(
+    response: ToolCallResponse,
+) -> tuple[str, List[ParsedDecision]]:
+    """将原生函数调用结果转换为 ReAct 文本记录与决策列表
+
+    scratchpad 仍保存 ReAct 文本格式，审批恢复与会话存储无需区分两种模式。
+    """
+    if not response.tool_calls:
+        final = response.final_answer
+        return response.to_react_text(), [ParsedDecision(kind="final", final=final)]
+
+    decisions = []
+    for call in response.tool_calls:
+        if call.error:
+            decisions.append(
+                ParsedDecision(kind="invalid", tool_name=call.name, error=call.error)
+            )
+        else:
+            decisions.append(
+                ParsedDecision(
+                    kind="tool", tool_name=call.name, tool_args=call.arguments
+                )
+            )
+    return response.to_react_text(), decisions
+
+
+async def run_react_turn(
+    *,
+    store: BaseChatStore,
+    session_id: str,
+    model: BaseModel,
+    tools: ToolRegistry,
+    user_input: str,
+    scratchpad: str,
+    require_tool_approval: bool,
+    stream: bool = False,
+    max_iterations: int = 10,
+    max_parallel_tools: int = 4,
+    scratchpad_budget: Optional[ScratchpadBudget] = None,
+) -> AsyncIterator[TurnEvent]:
+    """驱动一次 ReAct 回合，按发生顺序产出事件
+
+    stream=True 时通过 stream_generate 逐段产出模型输出（token 事件），
+    否则使用 generate_with_retry 一次性获取决策。
+    模型开启 function_calling 时走原生函数调用，
+    参数错误或工具不存在会作为 Observation 反馈给模型，而不是结束回合。
+    一步中的多个工具调用以最多 max_parallel_tools 的并发度执行，
+    Observation 按调用顺序写回；审批模式下每步只挂起第一个调用。
+    stream=True 且一步只有一个工具调用时，工具的中间结果以 tool_progress 事件推送。
+    提供 scratchpad_budget 时，每次调用模型前按提示词 token 上限压缩较早的观察结果。
+    """
+    rendered = tools.render()
+    native = model.function_calling
+    last_error = ""
+    reserved_tokens = 0
+    if scratchpad_budget is not None:
+        reserved_tokens = scratchpad_budget.count_tokens(
+            format_react_prompt(
+                user_input=user_input,
+                scratchpad="",
+                tools_desc=rendered.description,
+                tool_names=rendered.names,
+                native=native,
+            )
         )
-        tool_names.append(tool.name)
-    return "\n".join(tools_desc_lines), ", ".join(tool_names)
+
+    for _ in range(max_iterations):
+        if scratchpad_budget is not None:
+            compacted = scratchpad_budget.compact(
+                scratchpad, reserved_tokens=reserved_tokens
+            )
+            if compacted.compacted:
+                logger.info(
+                    f"会话 {session_id} 的 scratchpad 已压缩: 省略观察结果"
+                    f" {compacted.elided_observations}，丢弃早期记录"
+                    f" {compacted.dropped_segments} 段，剩余约 {compacted.tokens} tokens"
+                )
+            scratchpad = compacted.text
+        messages = build_react_messages(
+            user_input=user_input,
+            scratchpad=scratchpad,
+            tools_desc=rendered.description,
+            tool_names=rendered.names,
+            native=native,
+        )
+        # 支持 messages 的适配器使用分段消息；其余模型仍读取拼接后的完整提示词
+        prompt = f"{messages[0]['content']}\n\n{messages[1]['content']}"
+        if native:
+            response = await model.generate_tool_calls_with_retry(
+                prompt,
+                rendered.openai_tools,
+                messages=messages,
+                rate_limit_key=session_id,
+            )
+            if require_tool_approval and len(response.tool_calls) > 1:
+                # 审批模式一次只挂起一个调用，其余调用由模型在拿到结果后重新发起
+                response = replace(response, tool_calls=response.tool_calls[:1])
+            decision, decisions = decisions_from_tool_calls(response)
+            if stream:
+                yield TurnEvent("token", {"text": decision})
+        elif stream:
+            chunks = []
+            async for chunk in model.stream_with_breaker(
+                prompt, messages=messages, rate_limit_key=session_id
+            ):
+                chunks.append(chunk)
+                yield TurnEvent("token", {"text": chunk})
+            decision, decisions = parse_react_decisions(
+                "".join(chunks), first_only=require_tool_approval
+            )
+        else:
+            decision, decisions = parse_react_decisions(
+                await model.generate_with_retry(
+                    prompt, messages=messages, rate_limit_key=session_id
+                ),
+                first_only=require_tool_approval,
+            )
+        scratchpad = f"{scratchpad}{decision}\n"
+
+        parsed = decisions[0]
+        if parsed.kind == "final":
+            await store.update_scratchpad(session_id, scratchpad)
+            await store.add_message(session_id, role="assistant", content=parsed.final)
+            yield TurnEvent("final", {"assistant": parsed.final})
+            return
+
+        if not native:
+            if parsed.kind == "invalid" or not parsed.tool_args:
+                last_error = parsed.error
+                break
+            if tools.get_tool(parsed.tool_name) is None:
+                last_error = f"tool not found: {parsed.tool_name}"
+                break
+
+        observations = [""] * len(decisions)
+        runnable = []
+        for index, parsed in enumerate(decisions):
+            if parsed.kind == "invalid":
+                observations[index] = f"Error: {parsed.error}"
+                continue
+            tool = tools.get_tool(parsed.tool_name)
+            if tool is None:
+                observations[index] = f"Error: tool not found: {parsed.tool_name}"
+                continue
+
+            if require_tool_approval:
+                approval = await store.create_approval(
+                    session_id=session_id,
+                    tool_name=parsed.tool_name,
+                    tool_args=parsed.tool_args or {},
+                )
+                await store.update_scratchpad(session_id, scratchpad)
+                yield TurnEvent(
+                    "approval_required",
+                    {
+                        "approval_id": approval.id,
+                        "tool_name": tool.name,
+                        "tool_description": tool.description,
+                        "tool_parameters": tool.parameters,
+                        "tool_args": parsed.tool_args,
+                    },
+                )
+                return
+
+            runnable.append((index, tool, parsed.tool_args or {}))
+
+        for _, tool, tool_args in runnable:
+            yield TurnEvent(
+                "tool_call", {"tool_name": tool.name, "tool_args": tool_args}
+            )
+        if stream and len(runnable) == 1:
+            # 单个工具调用时边执行边推送中间结果（如逐个找到的匹配文件）
+            _, tool, tool_args = runnable[0]
+            results: List[Any] = [None]
+            async for item in tool.stream(**tool_args):
+                if item.final:
+                    results[0] = item.data
+                else:
+                    yield TurnEvent(
+                        "tool_progress", {"tool_name": tool.name, "item": item.data}
+                    )
+        else:
+            results = await gather_limited(
+                [partial(tool.run, **tool_args) for _, tool, tool_args in runnable],
+                limit=max_parallel_tools,
+            )
+        for (index, tool, _), tool_result in zip(runnable, results):
+            observation = await format_session_observation(
+                store, session_id, tools, tool, tool_result
+            )
+            yield TurnEvent(
+                "observation", {"tool_name": tool.name, "content": observation}
+            )
+            observations[index] = observation
+
+        for observation in observations:
+            scratchpad = f"{scratchpad}Observation: {observation}\n"
+
+    await store.update_scratchpad(session_id, scratchpad)
+    yield TurnEvent("invalid", {"error": last_error or "agent exceeded max iterations"})
+
+
+def format_sse(event: TurnEvent) -> str:
+    """将回合事件编码为 Server-Sent Events 帧"""
+    data = json.dumps(event.data, ensure_ascii=False, default=str)
+    return f"event: {event.type}\ndata: {data}\n\n"
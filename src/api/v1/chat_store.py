@@ -1,9 +1,19 @@
 import asyncio
+import bisect
+import logging
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Callable, Dict, List, Literal, Optional, Protocol, Tuple
 from uuid import uuid4
 
+import anyio
+
+logger = logging.getLogger(__name__)
+
 Role = Literal["system", "user", "assistant"]
 
 
@@ -42,6 +52,30 @@ class ToolApproval:
     decision_reason: str = ""
 
 
+@dataclass(frozen=True)
+class ApprovalPage:
+    """审批分页结果，按创建时间倒序；next_cursor 为 None 表示没有更多"""
+
+    items: List[ToolApproval]
+    next_cursor: Optional[str] = None
+
+
+def _byte_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[int]:
+    if cursor is None or cursor == "":
+        return None
+    try:
+        value = int(cursor)
+    except ValueError:
+        raise ValueError(f"无效的分页游标: {cursor}") from None
+    if value <= 0:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return value
+
+
 @dataclass
 class ChatSession:
     id: str
@@ -54,11 +88,345 @@ class ChatSession:
     pending_tool_call: Optional[PendingToolCall] = None
 
 
-class InMemoryChatStore:
+class SessionLock(Protocol):
+    """会话级锁：以 async with 持有，locked() 表示当前是否被持有"""
+
+    def locked(self) -> bool:
+        pass
+
+    async def __aenter__(self) -> Any:
+        pass
+
+    async def __aexit__(self, *exc_info: Any) -> Optional[bool]:
+        pass
+
+
+class SessionLockManager:
+    """
+    按会话分片的锁
+
+    每个会话一把锁，用于串行化同一会话上的 ReAct 回合；不同会话互不阻塞。
+    锁对象以弱引用保存，没有协程持有或等待时自动回收。
+    """
+
+    def __init__(self) -> None:
+        self._locks: "weakref.WeakValueDictionary[str, anyio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    def get(self, session_id: str) -> anyio.Lock:
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = anyio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+    def is_locked(self, session_id: str) -> bool:
+        lock = self._locks.get(session_id)
+        return lock is not None and lock.locked()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class BaseChatStore(ABC):
+    """会话存储抽象接口"""
+
     def __init__(self) -> None:
-        self._lock = asyncio.Lock()
-        self._sessions: Dict[str, ChatSession] = {}
+        self._session_locks = SessionLockManager()
+
+    def session_lock(self, session_id: str) -> SessionLock:
+        """
+        获取会话级锁，调用方应在整个 ReAct 回合期间持有
+
+        默认实现只在当前进程内生效；跨进程共享的存储需要覆盖此方法。
+        """
+        return self._session_locks.get(session_id)
+
+    @abstractmethod
+    async def create_session(
+        self,
+        *,
+        model_config: Dict[str, Any],
+        workflow: str,
+        require_tool_approval: bool,
+    ) -> ChatSession:
+        pass
+
+    @abstractmethod
+    async def get_session(self, session_id: str) -> Optional[ChatSession]:
+        pass
+
+    @abstractmethod
+    async def delete_session(self, session_id: str) -> bool:
+        """删除会话及其消息、审批与工具结果，会话不存在时返回 False"""
+        pass
+
+    @abstractmethod
+    async def add_message(
+        self,
+        session_id: str,
+        *,
+        role: Role,
+        content: str,
+    ) -> ChatMessage:
+        pass
+
+    @abstractmethod
+    async def update_scratchpad(self, session_id: str, scratchpad: str) -> None:
+        pass
+
+    @abstractmethod
+    async def create_approval(
+        self,
+        *,
+        session_id: str,
+        tool_name: str,
+        tool_args: Dict[str, Any],
+    ) -> ToolApproval:
+        pass
+
+    @abstractmethod
+    async def resolve_approval(
+        self,
+        approval_id: str,
+        *,
+        decision: Literal["approve", "deny"],
+        reason: str,
+    ) -> ToolApproval:
+        pass
+
+    @abstractmethod
+    async def get_approval(self, approval_id: str) -> Optional[ToolApproval]:
+        pass
+
+    @abstractmethod
+    async def page_approvals(
+        self,
+        *,
+        session_id: str,
+        status: Optional[ApprovalStatus] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> ApprovalPage:
+        """按创建时间倒序分页列出审批，cursor 为上一页返回的 next_cursor"""
+        pass
+
+    @abstractmethod
+    async def save_tool_result(
+        self,
+        session_id: str,
+        *,
+        handle: str,
+        tool_name: str,
+        result: Any,
+    ) -> None:
+        """保存被截断的完整工具结果，句柄归属于该会话"""
+        pass
+
+    @abstractmethod
+    async def get_tool_result(
+        self, session_id: str, handle: str
+    ) -> Optional[Tuple[str, Any]]:
+        """按句柄取回 (tool_name, result)；句柄不属于该会话或已过期时返回 None"""
+        pass
+
+    async def sweep(self) -> int:
+        """淘汰过期会话，返回淘汰数量；默认不做任何事"""
+        return 0
+
+    def stats(self) -> Dict[str, int]:
+        """存储占用与淘汰计数，默认为空"""
+        return {}
+
+    async def run_sweeper(self, interval_s: float) -> None:
+        """后台定期清理，直到所在任务被取消"""
+        while True:
+            await anyio.sleep(interval_s)
+            try:
+                evicted = await self.sweep()
+            except Exception:
+                logger.exception("会话清理失败")
+                continue
+            if evicted:
+                logger.info("已淘汰 %d 个空闲会话", evicted)
+
+    async def list_approvals(
+        self,
+        *,
+        session_id: str,
+        status: Optional[ApprovalStatus] = None,
+    ) -> List[ToolApproval]:
+        page = await self.page_approvals(session_id=session_id, status=status)
+        return page.items
+
+
+class InMemoryChatStore(BaseChatStore):
+    """
+    内存会话存储
+
+    各方法内部没有 await，在事件循环上天然原子，无需加锁；
+    全局锁只用于会话创建，同一会话的并发回合由 session_lock 串行化。
+
+    内存上限：
+    - idle_ttl_s：会话空闲超过该时长后被淘汰（访问时惰性检查，或由 sweep 清理）；
+    - max_sessions：会话数达到上限时按 LRU 淘汰最久未访问的会话；
+    - max_session_bytes：单个会话消息与 scratchpad 的字节预算，
+      超出时先丢弃最早的消息，再从头部截断 scratchpad；
+    - max_tool_results / tool_result_ttl_s：每个会话暂存的完整工具结果条数
+      （超出时淘汰最早的）与保留时长，会话被淘汰时一并清除。
+    正在进行回合（持有 session_lock）的会话不会被淘汰。
+    """
+
+    def __init__(
+        self,
+        *,
+        idle_ttl_s: Optional[float] = None,
+        max_sessions: Optional[int] = None,
+        max_session_bytes: Optional[int] = None,
+        max_tool_results: Optional[int] = None,
+        tool_result_ttl_s: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__()
+        if idle_ttl_s is not None and idle_ttl_s <= 0:
+            raise ValueError("idle_ttl_s 必须为正数")
+        if max_sessions is not None and max_sessions <= 0:
+            raise ValueError("max_sessions 必须为正整数")
+        if max_session_bytes is not None and max_session_bytes <= 0:
+            raise ValueError("max_session_bytes 必须为正整数")
+        if max_tool_results is not None and max_tool_results <= 0:
+            raise ValueError("max_tool_results 必须为正整数")
+        if tool_result_ttl_s is not None and tool_result_ttl_s <= 0:
+            raise ValueError("tool_result_ttl_s 必须为正数")
+        self.idle_ttl_s = idle_ttl_s
+        self.max_sessions = max_sessions
+        self.max_session_bytes = max_session_bytes
+        self.max_tool_results = max_tool_results
+        self.tool_result_ttl_s = tool_result_ttl_s
+        self._clock = clock
+
+        self._create_lock = asyncio.Lock()
+        # 按最近访问顺序排列，队首为最久未访问的会话
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._session_bytes: Dict[str, int] = {}
+        self._counters: Dict[str, int] = {
+            "evicted_ttl": 0,
+            "evicted_lru": 0,
+            "trimmed_messages": 0,
+            "trimmed_scratchpad_bytes": 0,
+        }
         self._approvals: Dict[str, ToolApproval] = {}
+        # 二级索引：审批按创建顺序编号，列表查询只触及结果集本身
+        self._approval_seq_counter = 0
+        self._approval_seq: Dict[str, int] = {}
+        self._approval_by_seq: Dict[int, str] = {}
+        # session_id -> 该会话全部审批的 seq（升序）
+        self._session_approvals: Dict[str, List[int]] = {}
+        # session_id -> status -> 该状态审批的 seq（升序）
+        self._status_index: Dict[str, Dict[str, List[int]]] = {}
+        # session_id -> handle -> (tool_name, result, stored_at)，按写入顺序排列
+        self._tool_results: Dict[str, "OrderedDict[str, Tuple[str, Any, float]]"] = {}
+
+    def _busy(self, session_id: str) -> bool:
+        return self._session_locks.is_locked(session_id)
+
+    def _expired(self, session_id: str, now: float) -> bool:
+        if self.idle_ttl_s is None:
+            return False
+        return now - self._last_access[session_id] > self.idle_ttl_s
+
+    def _live_session(self, session_id: str) -> Optional[ChatSession]:
+        """获取会话并刷新访问时间；已过期的会话在此处惰性淘汰"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = self._clock()
+        if self._expired(session_id, now) and not self._busy(session_id):
+            self._evict(session_id, "evicted_ttl")
+            return None
+        self._last_access[session_id] = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        self._drop(session_id)
+        self._counters[reason] += 1
+
+    def _drop(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+        self._last_access.pop(session_id, None)
+        self._session_bytes.pop(session_id, None)
+        self._status_index.pop(session_id, None)
+        self._tool_results.pop(session_id, None)
+        for seq in self._session_approvals.pop(session_id, []):
+            approval_id = self._approval_by_seq.pop(seq)
+            self._approval_seq.pop(approval_id, None)
+            self._approvals.pop(approval_id, None)
+
+    def _evict_lru(self) -> None:
+        # 调用方需持有 self._create_lock
+        if self.max_sessions is None:
+            return
+        excess = len(self._sessions) - self.max_sessions + 1
+        if excess <= 0:
+            return
+        victims = []
+        for session_id in self._sessions:
+            if len(victims) >= excess:
+                break
+            if not self._busy(session_id):
+                victims.append(session_id)
+        for session_id in victims:
+            self._evict(session_id, "evicted_lru")
+
+    def _enforce_budget(self, session: ChatSession) -> None:
+        budget = self.max_session_bytes
+        used = self._session_bytes[session.id]
+        if budget is None or used <= budget:
+            return
+        # 保留最新一条消息：恢复审批后的回合以它作为用户输入
+        while used > budget and len(session.messages) > 1:
+            dropped = session.messages.pop(0)
+            used -= _byte_len(dropped.content)
+            self._counters["trimmed_messages"] += 1
+        if used > budget and session.scratchpad:
+            scratchpad_bytes = session.scratchpad.encode("utf-8")
+            keep = max(0, len(scratchpad_bytes) - (used - budget))
+            tail = scratchpad_bytes[len(scratchpad_bytes) - keep :].decode(
+                "utf-8", errors="ignore"
+            )
+            # 从完整行开始，避免留下半截 Thought / Observation
+            newline = tail.find("\n")
+            tail = tail[newline + 1 :] if newline >= 0 else ""
+            trimmed = len(scratchpad_bytes) - _byte_len(tail)
+            session.scratchpad = tail
+            used -= trimmed
+            self._counters["trimmed_scratchpad_bytes"] += trimmed
+        self._session_bytes[session.id] = used
+
+    async def sweep(self) -> int:
+        if self.idle_ttl_s is None:
+            return 0
+        now = self._clock()
+        expired = [
+            session_id
+            for session_id in self._sessions
+            if self._expired(session_id, now) and not self._busy(session_id)
+        ]
+        for session_id in expired:
+            self._evict(session_id, "evicted_ttl")
+        return len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "approvals": len(self._approvals),
+            "tool_results": sum(len(r) for r in self._tool_results.values()),
+            "bytes": sum(self._session_bytes.values()),
+            **self._counters,
+        }
 
     async def create_session(
         self,
@@ -67,7 +435,8 @@ class InMemoryChatStore:
         workflow: str,
         require_tool_approval: bool,
     ) -> ChatSession:
-        async with self._lock:
+        async with self._create_lock:
+            self._evict_lru()
             session_id = str(uuid4())
             session = ChatSession(
                 id=session_id,
@@ -77,11 +446,18 @@ class InMemoryChatStore:
                 require_tool_approval=require_tool_approval,
             )
             self._sessions[session_id] = session
+            self._last_access[session_id] = self._clock()
+            self._session_bytes[session_id] = 0
             return session
 
     async def get_session(self, session_id: str) -> Optional[ChatSession]:
-        async with self._lock:
-            return self._sessions.get(session_id)
+        return self._live_session(session_id)
+
+    async def delete_session(self, session_id: str) -> bool:
+        if session_id not in self._sessions:
+            return False
+        self._drop(session_id)
+        return True
 
     async def add_message(
         self,
@@ -90,25 +466,29 @@ class InMemoryChatStore:
         role: Role,
         content: str,
     ) -> ChatMessage:
-        async with self._lock:
-            session = self._sessions.get(session_id)
-            if session is None:
-                raise KeyError(session_id)
-            message = ChatMessage(
-                id=str(uuid4()),
-                role=role,
-                content=content,
-                created_at=utc_now_iso(),
-            )
-            session.messages.append(message)
-            return message
+        session = self._live_session(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        message = ChatMessage(
+            id=str(uuid4()),
+            role=role,
+            content=content,
+            created_at=utc_now_iso(),
+        )
+        session.messages.append(message)
+        self._session_bytes[session_id] += _byte_len(content)
+        self._enforce_budget(session)
+        return message
 
     async def update_scratchpad(self, session_id: str, scratchpad: str) -> None:
-        async with self._lock:
-            session = self._sessions.get(session_id)
-            if session is None:
-                raise KeyError(session_id)
-            session.scratchpad = scratchpad
+        session = self._live_session(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        self._session_bytes[session_id] += _byte_len(scratchpad) - _byte_len(
+            session.scratchpad
+        )
+        session.scratchpad = scratchpad
+        self._enforce_budget(session)
 
     async def create_approval(
         self,
@@ -117,28 +497,36 @@ class InMemoryChatStore:
         tool_name: str,
         tool_args: Dict[str, Any],
     ) -> ToolApproval:
-        async with self._lock:
-            approval_id = str(uuid4())
-            approval = ToolApproval(
-                id=approval_id,
-                session_id=session_id,
-                tool_name=tool_name,
-                tool_args=tool_args,
-                status="pending",
-                created_at=utc_now_iso(),
-            )
-            self._approvals[approval_id] = approval
-
-            session = self._sessions.get(session_id)
-            if session is None:
-                raise KeyError(session_id)
-            session.pending_tool_call = PendingToolCall(
-                approval_id=approval_id,
-                tool_name=tool_name,
-                tool_args=tool_args,
-                created_at=approval.created_at,
-            )
-            return approval
+        approval_id = str(uuid4())
+        approval = ToolApproval(
+            id=approval_id,
+            session_id=session_id,
+            tool_name=tool_name,
+            tool_args=tool_args,
+            status="pending",
+            created_at=utc_now_iso(),
+        )
+        session = self._live_session(session_id)
+        if session is None:
+            raise KeyError(session_id)
+
+        self._approvals[approval_id] = approval
+        self._approval_seq_counter += 1
+        seq = self._approval_seq_counter
+        self._approval_seq[approval_id] = seq
+        self._approval_by_seq[seq] = approval_id
+        self._session_approvals.setdefault(session_id, []).append(seq)
+        self._status_index.setdefault(session_id, {}).setdefault("pending", []).append(
+            seq
+        )
+
+        session.pending_tool_call = PendingToolCall(
+            approval_id=approval_id,
+            tool_name=tool_name,
+            tool_args=tool_args,
+            created_at=approval.created_at,
+        )
+        return approval
 
     async def resolve_approval(
         self,
@@ -147,38 +535,88 @@ class InMemoryChatStore:
         decision: Literal["approve", "deny"],
         reason: str,
     ) -> ToolApproval:
-        async with self._lock:
-            approval = self._approvals.get(approval_id)
-            if approval is None:
-                raise KeyError(approval_id)
-            if approval.status != "pending":
-                return approval
-
-            approval.status = "approved" if decision == "approve" else "denied"
-            approval.resolved_at = utc_now_iso()
-            approval.decision_reason = reason
-
-            session = self._sessions.get(approval.session_id)
-            if session and session.pending_tool_call:
-                if session.pending_tool_call.approval_id == approval_id:
-                    session.pending_tool_call = None
+        approval = self._approvals.get(approval_id)
+        if approval is None:
+            raise KeyError(approval_id)
+        if approval.status != "pending":
             return approval
 
+        approval.status = "approved" if decision == "approve" else "denied"
+        approval.resolved_at = utc_now_iso()
+        approval.decision_reason = reason
+        self._move_status(approval, "pending")
+
+        session = self._sessions.get(approval.session_id)
+        if session and session.pending_tool_call:
+            if session.pending_tool_call.approval_id == approval_id:
+                session.pending_tool_call = None
+        return approval
+
     async def get_approval(self, approval_id: str) -> Optional[ToolApproval]:
-        async with self._lock:
-            return self._approvals.get(approval_id)
+        return self._approvals.get(approval_id)
 
-    async def list_approvals(
+    def _move_status(self, approval: ToolApproval, old_status: str) -> None:
+        seq = self._approval_seq[approval.id]
+        buckets = self._status_index.setdefault(approval.session_id, {})
+        old = buckets.get(old_status, [])
+        pos = bisect.bisect_left(old, seq)
+        if pos < len(old) and old[pos] == seq:
+            old.pop(pos)
+        bisect.insort(buckets.setdefault(approval.status, []), seq)
+
+    async def page_approvals(
         self,
         *,
         session_id: str,
         status: Optional[ApprovalStatus] = None,
-    ) -> List[ToolApproval]:
-        async with self._lock:
-            approvals = [
-                a for a in self._approvals.values() if a.session_id == session_id
-            ]
-            if status:
-                approvals = [a for a in approvals if a.status == status]
-            approvals.sort(key=lambda a: a.created_at, reverse=True)
-            return approvals
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> ApprovalPage:
+        before = parse_cursor(cursor)
+        if limit is not None and limit <= 0:
+            raise ValueError("limit 必须为正整数")
+        if status:
+            seqs = self._status_index.get(session_id, {}).get(status, [])
+        else:
+            seqs = self._session_approvals.get(session_id, [])
+
+        end = bisect.bisect_left(seqs, before) if before else len(seqs)
+        start = 0 if limit is None else max(0, end - limit)
+        page_seqs = seqs[start:end]
+        items = [
+            self._approvals[self._approval_by_seq[seq]] for seq in reversed(page_seqs)
+        ]
+        next_cursor = str(page_seqs[0]) if start > 0 else None
+        return ApprovalPage(items=items, next_cursor=next_cursor)
+
+    async def save_tool_result(
+        self,
+        session_id: str,
+        *,
+        handle: str,
+        tool_name: str,
+        result: Any,
+    ) -> None:
+        if self._live_session(session_id) is None:
+            raise KeyError(session_id)
+        results = self._tool_results.setdefault(session_id, OrderedDict())
+        results[handle] = (tool_name, result, self._clock())
+        if self.max_tool_results is not None:
+            while len(results) > self.max_tool_results:
+                results.popitem(last=False)
+
+    async def get_tool_result(
+        self, session_id: str, handle: str
+    ) -> Optional[Tuple[str, Any]]:
+        if self._live_session(session_id) is None:
+            return None
+        results = self._tool_results.get(session_id, {})
+        entry = results.get(handle)
+        if entry is None:
+            return None
+        tool_name, result, stored_at = entry
+        ttl_s = self.tool_result_ttl_s
+        if ttl_s is not None and self._clock() - stored_at > ttl_s:
+            del results[handle]
+            return None
+        return tool_name, result
@@ -1,33 +1,58 @@
+import logging
+import os
 from functools import lru_cache
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
+from src.agents.llm.base import BaseModel as LLMModel
+from src.agents.memory.scratchpad_budget import ScratchpadBudget
+from src.agents.tools.executor import SkillExecutorBusyError
 from src.agents.tools.registry import ToolRegistry
 from src.api.v1.chat_engine import (
-    build_tools_metadata,
+    TurnEvent,
     create_model_from_config,
-    format_react_prompt,
-    parse_react_decision,
+    format_session_observation,
+    format_sse,
+    run_react_turn,
 )
-from src.api.v1.chat_store import InMemoryChatStore
+from src.api.v1.chat_store import BaseChatStore, ChatSession, InMemoryChatStore
+from src.api.v1.sqlite_chat_store import (
+    RuntimeSecretsUnsupportedError,
+    SqliteChatStore,
+)
+from src.config import settings
+
+logger = logging.getLogger(__name__)
 
 chat_router = APIRouter(prefix="/chat", tags=["chat"])
 
 
 class ChatModelConfig(BaseModel):
-    provider: str = Field(..., description="模型适配器类型，如 openai-compatible / deepseek")
+    provider: str = Field(
+        ..., description="模型适配器类型，如 openai-compatible / deepseek"
+    )
     name: str = Field("", description="模型注册名或自定义名称")
     api_key: str = Field("", description="可选：运行时传入，不在服务端持久化")
     base_url: str = Field("", description="可选：OpenAI Compatible base_url")
     model: str = Field("", description="可选：具体模型名，如 gpt-4o-mini")
     max_tokens: int = 0
-    temperature: float = 0.0
+    temperature: float = Field(
+        0.0, description="可选：显式传入（含 0）时生效，未传入时使用模型默认值"
+    )
+    function_calling: bool = Field(
+        False, description="可选：使用原生函数调用（tools / tool_calls）代替文本解析"
+    )
 
     def as_dict(self) -> Dict[str, Any]:
         raw = self.model_dump()
-        return {k: v for k, v in raw.items() if v not in ("", 0, 0.0, None)}
+        config = {k: v for k, v in raw.items() if v not in ("", 0, 0.0, None)}
+        # temperature=0 是有效取值（确定性输出，可命中响应缓存），显式传入时保留
+        if "temperature" in self.model_fields_set:
+            config["temperature"] = self.temperature
+        return config
 
 
 class CreateSessionRequest(BaseModel):
@@ -93,8 +118,37 @@ class ApprovalInfo(BaseModel):
 
 
 @lru_cache
-def get_store() -> InMemoryChatStore:
-    return InMemoryChatStore()
+def get_store() -> BaseChatStore:
+    if settings.CHAT_STORE_BACKEND == "sqlite":
+        db_dir = os.path.dirname(settings.CHAT_STORE_SQLITE_PATH)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # 运行时 api_key 只保存在进程内存中，多 worker 时无法共享
+        return SqliteChatStore(
+            settings.CHAT_STORE_SQLITE_PATH,
+            runtime_secrets=settings.SERVER_WORKERS <= 1,
+            secret_idle_ttl_s=settings.CHAT_SESSION_IDLE_TTL_S,
+            max_tool_results=settings.TOOL_RESULT_STORE_MAX_ENTRIES,
+            tool_result_ttl_s=settings.TOOL_RESULT_STORE_TTL_S,
+            lease_ttl_s=settings.CHAT_SESSION_LEASE_TTL_S,
+        )
+    return InMemoryChatStore(
+        idle_ttl_s=settings.CHAT_SESSION_IDLE_TTL_S,
+        max_sessions=settings.CHAT_MAX_SESSIONS,
+        max_session_bytes=settings.CHAT_SESSION_MAX_BYTES,
+        max_tool_results=settings.TOOL_RESULT_STORE_MAX_ENTRIES,
+        tool_result_ttl_s=settings.TOOL_RESULT_STORE_TTL_S,
+    )
+
+
+@lru_cache
+def get_scratchpad_budget() -> Optional[ScratchpadBudget]:
+    if not settings.CHAT_MAX_PROMPT_TOKENS:
+        return None
+    return ScratchpadBudget(
+        settings.CHAT_MAX_PROMPT_TOKENS,
+        keep_last=settings.CHAT_KEEP_RECENT_OBSERVATIONS,
+    )
 
 
 @lru_cache
@@ -113,17 +167,65 @@ async def list_tools() -> List[ToolInfo]:
     ]
 
 
+@chat_router.get("/sessions/{session_id}/tool-results/{handle}")
+async def get_tool_result(
+    session_id: str,
+    handle: str,
+    field: Optional[str] = Query(None, description="可选：分页读取的列表字段名"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+) -> Dict[str, Any]:
+    """取回 Observation 中被截断的完整工具结果（凭 _result_handle，仅限所属会话）"""
+    entry = await get_store().get_tool_result(session_id, handle)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="tool result not found or expired")
+    tool_name, result = entry
+    if field is None:
+        return {"handle": handle, "tool_name": tool_name, "result": result}
+
+    items = result.get(field) if isinstance(result, dict) else None
+    if not isinstance(items, (list, tuple)):
+        raise HTTPException(status_code=400, detail=f"field is not a list: {field}")
+    return {
+        "handle": handle,
+        "tool_name": tool_name,
+        "field": field,
+        "total": len(items),
+        "offset": offset,
+        "items": list(items[offset : offset + limit]),
+    }
+
+
+@chat_router.get("/store/stats")
+async def store_stats() -> Dict[str, int]:
+    """会话存储占用与淘汰计数，用于容量规划"""
+    return get_store().stats()
+
+
 @chat_router.post("/sessions", response_model=CreateSessionResponse)
 async def create_session(payload: CreateSessionRequest) -> CreateSessionResponse:
     store = get_store()
-    session = await store.create_session(
-        model_config=payload.model.as_dict(),
-        workflow=payload.workflow,
-        require_tool_approval=payload.require_tool_approval,
-    )
+    try:
+        session = await store.create_session(
+            model_config=payload.model.as_dict(),
+            workflow=payload.workflow,
+            require_tool_approval=payload.require_tool_approval,
+        )
+    except RuntimeSecretsUnsupportedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return CreateSessionResponse(session_id=session.id, created_at=session.created_at)
 
 
+@chat_router.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str) -> Response:
+    store = get_store()
+    async with store.session_lock(session_id):
+        deleted = await store.delete_session(session_id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="session not found")
+    return Response(status_code=204)
+
+
 @chat_router.get("/sessions/{session_id}")
 async def get_session(session_id: str) -> Dict[str, Any]:
     store = get_store()
@@ -145,13 +247,24 @@ async def get_session(session_id: str) -> Dict[str, Any]:
 @chat_router.get("/sessions/{session_id}/approvals", response_model=List[ApprovalInfo])
 async def list_approvals(
     session_id: str,
+    response: Response,
     status: Optional[Literal["pending", "approved", "denied"]] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
 ) -> List[ApprovalInfo]:
+    """按创建时间倒序列出审批；还有更多时通过 X-Next-Cursor 响应头返回游标"""
     store = get_store()
     session = await store.get_session(session_id)
     if session is None:
         raise HTTPException(status_code=404, detail="session not found")
-    approvals = await store.list_approvals(session_id=session_id, status=status)
+    try:
+        page = await store.page_approvals(
+            session_id=session_id, status=status, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    if page.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = page.next_cursor
     return [
         ApprovalInfo(
             id=a.id,
@@ -163,20 +276,40 @@ async def list_approvals(
             resolved_at=a.resolved_at,
             decision_reason=a.decision_reason,
         )
-        for a in approvals
+        for a in page.items
     ]
 
 
-@chat_router.post("/sessions/{session_id}/messages", response_model=SendMessageResponse)
-async def send_message(
-    session_id: str, payload: SendMessageRequest
-) -> SendMessageResponse:
-    store = get_store()
-    session = await store.get_session(session_id)
+async def _collect_turn(events: AsyncIterator[TurnEvent]) -> Dict[str, Any]:
+    """消费回合事件，返回终止事件对应的响应字段"""
+    async for event in events:
+        if event.type == "final":
+            return {"status": "completed", "assistant": event.data["assistant"]}
+        if event.type == "approval_required":
+            return {
+                "status": "tool_approval_required",
+                "tool_call": ToolCallRequest(**event.data),
+            }
+        if event.type == "invalid":
+            return {"status": "invalid_decision", "error": event.data["error"]}
+    return {"status": "invalid_decision", "error": "agent exceeded max iterations"}
+
+
+async def _check_session(session_id: str) -> ChatSession:
+    session = await get_store().get_session(session_id)
     if session is None:
         raise HTTPException(status_code=404, detail="session not found")
     if session.pending_tool_call is not None:
         raise HTTPException(status_code=409, detail="session has pending tool approval")
+    return session
+
+
+async def _prepare_turn(
+    session_id: str, payload: SendMessageRequest
+) -> tuple[ChatSession, LLMModel, bool]:
+    """开始一个回合前的校验与准备，调用方需持有会话锁"""
+    store = get_store()
+    session = await _check_session(session_id)
 
     require_tool_approval = (
         payload.require_tool_approval
@@ -189,74 +322,84 @@ async def send_message(
     if session.workflow != "react":
         raise HTTPException(status_code=400, detail="unsupported workflow")
 
-    tools = get_tools()
-    tools_desc, tool_names = build_tools_metadata(tools)
-
     try:
         model = create_model_from_config(session.model_config)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"model init failed: {e}") from e
 
-    scratchpad = session.scratchpad
-    max_iterations = 10
-    last_error = ""
+    return session, model, require_tool_approval
+
 
-    for _ in range(max_iterations):
-        prompt = format_react_prompt(
+@chat_router.post("/sessions/{session_id}/messages", response_model=SendMessageResponse)
+async def send_message(
+    session_id: str, payload: SendMessageRequest
+) -> SendMessageResponse:
+    store = get_store()
+    # 同一会话的回合串行执行，避免并发请求交错写入 scratchpad
+    async with store.session_lock(session_id):
+        session, model, require_tool_approval = await _prepare_turn(session_id, payload)
+        events = run_react_turn(
+            store=store,
+            session_id=session_id,
+            model=model,
+            tools=get_tools(),
             user_input=payload.content,
-            scratchpad=scratchpad,
-            tools_desc=tools_desc,
-            tool_names=tool_names,
+            scratchpad=session.scratchpad,
+            require_tool_approval=require_tool_approval,
+            max_parallel_tools=settings.CHAT_MAX_PARALLEL_TOOLS,
+            scratchpad_budget=get_scratchpad_budget(),
         )
-        decision = await model.generate_with_retry(prompt)
-        scratchpad = f"{scratchpad}{decision}\n"
-
-        parsed = parse_react_decision(decision)
-        if parsed.kind == "final":
-            await store.update_scratchpad(session_id, scratchpad)
-            await store.add_message(session_id, role="assistant", content=parsed.final)
-            return SendMessageResponse(
-                session_id=session_id,
-                status="completed",
-                assistant=parsed.final,
-            )
+        result = await _collect_turn(events)
+    return SendMessageResponse(session_id=session_id, **result)
 
-        if parsed.kind == "invalid" or not parsed.tool_args:
-            last_error = parsed.error
-            break
 
-        tool = tools.get_tool(parsed.tool_name)
-        if tool is None:
-            last_error = f"tool not found: {parsed.tool_name}"
-            break
-
-        if require_tool_approval:
-            approval = await store.create_approval(
-                session_id=session_id,
-                tool_name=parsed.tool_name,
-                tool_args=parsed.tool_args,
-            )
-            await store.update_scratchpad(session_id, scratchpad)
-            return SendMessageResponse(
+@chat_router.post("/sessions/{session_id}/messages:stream")
+async def stream_message(
+    session_id: str, payload: SendMessageRequest
+) -> StreamingResponse:
+    """以 Server-Sent Events 形式推送 ReAct 回合的中间过程"""
+    store = get_store()
+    # 预检以便尽早返回 HTTP 错误；持锁后会再次校验
+    await _check_session(session_id)
+
+    async def event_stream() -> AsyncIterator[str]:
+        # 先发送注释帧，让客户端在模型返回前即可收到首字节
+        yield ": stream-open\n\n"
+        async with store.session_lock(session_id):
+            try:
+                session, model, require_tool_approval = await _prepare_turn(
+                    session_id, payload
+                )
+            except HTTPException as e:
+                yield format_sse(TurnEvent("invalid", {"error": str(e.detail)}))
+                return
+
+            events = run_react_turn(
+                store=store,
                 session_id=session_id,
-                status="tool_approval_required",
-                tool_call=ToolCallRequest(
-                    approval_id=approval.id,
-                    tool_name=tool.name,
-                    tool_description=tool.description,
-                    tool_parameters=tool.parameters,
-                    tool_args=parsed.tool_args,
-                ),
+                model=model,
+                tools=get_tools(),
+                user_input=payload.content,
+                scratchpad=session.scratchpad,
+                require_tool_approval=require_tool_approval,
+                stream=True,
+                max_parallel_tools=settings.CHAT_MAX_PARALLEL_TOOLS,
+                scratchpad_budget=get_scratchpad_budget(),
             )
-
-        tool_result = await tool.run(**parsed.tool_args)
-        scratchpad = f"{scratchpad}Observation: {tool_result}\n"
-
-    await store.update_scratchpad(session_id, scratchpad)
-    return SendMessageResponse(
-        session_id=session_id,
-        status="invalid_decision",
-        error=last_error or "agent exceeded max iterations",
+            try:
+                async for event in events:
+                    yield format_sse(event)
+            except SkillExecutorBusyError as e:
+                yield format_sse(TurnEvent("invalid", {"error": str(e)}))
+            except Exception as e:
+                # 响应头与部分事件已经发出，改为推送终止事件，让客户端知道回合已失败
+                logger.exception(f"会话 {session_id} 的流式回合失败")
+                yield format_sse(TurnEvent("invalid", {"error": str(e)}))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -269,6 +412,18 @@ async def resolve_approval(
     approval_id: str,
     payload: ResolveApprovalRequest,
 ) -> ResolveApprovalResponse:
+    store = get_store()
+    async with store.session_lock(session_id):
+        result = await _resume_after_approval(session_id, approval_id, payload)
+    return ResolveApprovalResponse(session_id=session_id, **result)
+
+
+async def _resume_after_approval(
+    session_id: str,
+    approval_id: str,
+    payload: ResolveApprovalRequest,
+) -> Dict[str, Any]:
+    """处理审批结果并继续 ReAct 回合，调用方需持有会话锁"""
     store = get_store()
     session = await store.get_session(session_id)
     if session is None:
@@ -291,7 +446,6 @@ async def resolve_approval(
         raise HTTPException(status_code=400, detail="unsupported workflow")
 
     tools = get_tools()
-    tools_desc, tool_names = build_tools_metadata(tools)
 
     try:
         model = create_model_from_config(session.model_config)
@@ -301,75 +455,29 @@ async def resolve_approval(
     scratchpad = session.scratchpad
     tool = tools.get_tool(approval.tool_name)
     if tool is None:
-        return ResolveApprovalResponse(
-            session_id=session_id,
-            status="invalid_decision",
-            error=f"tool not found: {approval.tool_name}",
-        )
+        return {
+            "status": "invalid_decision",
+            "error": f"tool not found: {approval.tool_name}",
+        }
 
     if payload.decision == "approve":
         tool_result = await tool.run(**approval.tool_args)
-        scratchpad = f"{scratchpad}Observation: {tool_result}\n"
+        observation = await format_session_observation(
+            store, session_id, tools, tool, tool_result
+        )
+        scratchpad = f"{scratchpad}Observation: {observation}\n"
     else:
         scratchpad = f"{scratchpad}Observation: User denied tool call.\n"
 
-    max_iterations = 10
-    last_error = ""
-
-    for _ in range(max_iterations):
-        prompt = format_react_prompt(
-            user_input=session.messages[-1].content if session.messages else "",
-            scratchpad=scratchpad,
-            tools_desc=tools_desc,
-            tool_names=tool_names,
-        )
-        decision = await model.generate_with_retry(prompt)
-        scratchpad = f"{scratchpad}{decision}\n"
-
-        parsed = parse_react_decision(decision)
-        if parsed.kind == "final":
-            await store.update_scratchpad(session_id, scratchpad)
-            await store.add_message(session_id, role="assistant", content=parsed.final)
-            return ResolveApprovalResponse(
-                session_id=session_id,
-                status="completed",
-                assistant=parsed.final,
-            )
-
-        if parsed.kind == "invalid" or not parsed.tool_args:
-            last_error = parsed.error
-            break
-
-        tool2 = tools.get_tool(parsed.tool_name)
-        if tool2 is None:
-            last_error = f"tool not found: {parsed.tool_name}"
-            break
-
-        if session.require_tool_approval:
-            approval2 = await store.create_approval(
-                session_id=session_id,
-                tool_name=parsed.tool_name,
-                tool_args=parsed.tool_args,
-            )
-            await store.update_scratchpad(session_id, scratchpad)
-            return ResolveApprovalResponse(
-                session_id=session_id,
-                status="tool_approval_required",
-                tool_call=ToolCallRequest(
-                    approval_id=approval2.id,
-                    tool_name=tool2.name,
-                    tool_description=tool2.description,
-                    tool_parameters=tool2.parameters,
-                    tool_args=parsed.tool_args,
-                ),
-            )
-
-        tool_result2 = await tool2.run(**parsed.tool_args)
-        scratchpad = f"{scratchpad}Observation: {tool_result2}\n"
-
-    await store.update_scratchpad(session_id, scratchpad)
-    return ResolveApprovalResponse(
+    events = run_react_turn(
+        store=store,
         session_id=session_id,
-        status="invalid_decision",
-        error=last_error or "agent exceeded max iterations",
+        model=model,
+        tools=tools,
+        user_input=session.messages[-1].content if session.messages else "",
+        scratchpad=scratchpad,
+        require_tool_approval=session.require_tool_approval,
+        max_parallel_tools=settings.CHAT_MAX_PARALLEL_TOOLS,
+        scratchpad_budget=get_scratchpad_budget(),
     )
+    return await _collect_turn(events)
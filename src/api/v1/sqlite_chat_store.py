@@ -0,0 +1,725 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+from uuid import uuid4
+
+import anyio
+
+from src.agents.tools.executor import wait_future
+
+from .chat_store import (
+    ApprovalPage,
+    ApprovalStatus,
+    BaseChatStore,
+    ChatMessage,
+    ChatSession,
+    PendingToolCall,
+    Role,
+    SessionLock,
+    ToolApproval,
+    parse_cursor,
+    utc_now_iso,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+  id TEXT PRIMARY KEY,
+  created_at TEXT NOT NULL,
+  model_config TEXT NOT NULL,
+  workflow TEXT NOT NULL,
+  require_tool_approval INTEGER NOT NULL,
+  scratchpad TEXT NOT NULL DEFAULT '',
+  pending_approval_id TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  id TEXT NOT NULL UNIQUE,
+  session_id TEXT NOT NULL,
+  role TEXT NOT NULL,
+  content TEXT NOT NULL,
+  created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, seq);
+CREATE TABLE IF NOT EXISTS approvals (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  id TEXT NOT NULL UNIQUE,
+  session_id TEXT NOT NULL,
+  tool_name TEXT NOT NULL,
+  tool_args TEXT NOT NULL,
+  status TEXT NOT NULL,
+  created_at TEXT NOT NULL,
+  resolved_at TEXT,
+  decision_reason TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_approvals_session ON approvals (session_id, seq);
+CREATE INDEX IF NOT EXISTS idx_approvals_session_status
+  ON approvals (session_id, status, seq);
+CREATE TABLE IF NOT EXISTS tool_results (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  handle TEXT NOT NULL UNIQUE,
+  session_id TEXT NOT NULL,
+  tool_name TEXT NOT NULL,
+  result TEXT NOT NULL,
+  stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tool_results_session ON tool_results (session_id, seq);
+CREATE TABLE IF NOT EXISTS session_leases (
+  session_id TEXT PRIMARY KEY,
+  owner TEXT NOT NULL,
+  expires_at REAL NOT NULL
+);
+"""
+
+# 运行时传入的 api_key 不落盘，只保存在创建会话的进程内存中
+SECRET_CONFIG_KEYS = ("api_key",)
+
+
+class RuntimeSecretsUnsupportedError(ValueError):
+    """多 worker 部署下无法跨进程共享运行时传入的密钥"""
+
+    def __init__(self) -> None:
+        super().__init__(
+            "多 worker 部署不支持在会话中运行时传入 api_key，"
+            "请在服务端配置模型密钥，或将 SERVER_WORKERS 设为 1"
+        )
+
+
+WriteFn = Callable[[sqlite3.Connection], Any]
+
+
+class _SessionLease:
+    """
+    跨进程的会话锁
+
+    先取得进程内的会话锁，再在 session_leases 表中占用该会话的租约；
+    租约被其他进程占用时每隔 poll_interval_s 重试。
+    持有者异常退出时租约在 lease_ttl_s 后过期，可被其他进程接管。
+    """
+
+    def __init__(
+        self, store: "SqliteChatStore", session_id: str, local: anyio.Lock
+    ) -> None:
+        self._store = store
+        self._session_id = session_id
+        self._local = local
+        self._owner: Optional[str] = None
+
+    def locked(self) -> bool:
+        return self._local.locked()
+
+    async def __aenter__(self) -> "_SessionLease":
+        await self._local.acquire()
+        try:
+            owner = uuid4().hex
+            while not await self._store._take_lease(self._session_id, owner):
+                await anyio.sleep(self._store.lease_poll_s)
+            self._owner = owner
+        except BaseException:
+            self._local.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        owner, self._owner = self._owner, None
+        try:
+            # 回合被取消时也要归还租约，否则其他 worker 需等到租约过期
+            with anyio.CancelScope(shield=True):
+                await self._store._release_lease(self._session_id, owner)
+        except Exception as e:
+            logger.error(f"释放会话 {self._session_id} 的租约失败: {e}")
+        finally:
+            self._local.release()
+
+
+@dataclass
+class _WriteOp:
+    fn: WriteFn
+    future: Future = field(default_factory=Future)
+
+
+class SqliteChatStore(BaseChatStore):
+    """
+    基于 SQLite 的会话存储
+
+    - WAL 模式：读写互不阻塞，多个 uvicorn worker 进程可共享同一数据库文件；
+    - 读操作在线程池中执行，每个线程使用独立连接；
+    - 写操作进入单写者队列，由后台线程按批合并到同一个事务中提交，
+      每个写操作使用独立 SAVEPOINT，单个失败不影响同批其他写入。
+    session_lock 除进程内锁外还在数据库中占用会话租约，多个 worker 之间
+    同样串行化同一会话的回合；租约在 lease_ttl_s 后过期，应大于最长的回合耗时。
+
+    被截断的完整工具结果按会话写入 tool_results 表，任一 worker 都可取回；
+    每个会话最多保留 max_tool_results 条，超过 tool_result_ttl_s 的由 sweep 删除。
+
+    运行时传入的 api_key 只保存在创建会话的进程内存中，其他 worker 读不到。
+    因此 runtime_secrets=False（多 worker 部署）时拒绝创建带 api_key 的会话；
+    单进程时密钥空闲超过 secret_idle_ttl_s 后由 sweep 清除，删除会话时一并清除。
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        batch_size: int = 64,
+        runtime_secrets: bool = True,
+        secret_idle_ttl_s: Optional[float] = None,
+        max_tool_results: Optional[int] = None,
+        tool_result_ttl_s: Optional[float] = None,
+        lease_ttl_s: float = 600.0,
+        lease_poll_s: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time,
+    ) -> None:
+        super().__init__()
+        if batch_size <= 0:
+            raise ValueError("batch_size 必须为正整数")
+        if secret_idle_ttl_s is not None and secret_idle_ttl_s <= 0:
+            raise ValueError("secret_idle_ttl_s 必须为正数")
+        if max_tool_results is not None and max_tool_results <= 0:
+            raise ValueError("max_tool_results 必须为正整数")
+        if tool_result_ttl_s is not None and tool_result_ttl_s <= 0:
+            raise ValueError("tool_result_ttl_s 必须为正数")
+        if lease_ttl_s <= 0 or lease_poll_s <= 0:
+            raise ValueError("lease_ttl_s / lease_poll_s 必须为正数")
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.runtime_secrets = runtime_secrets
+        self.secret_idle_ttl_s = secret_idle_ttl_s
+        self.max_tool_results = max_tool_results
+        self.tool_result_ttl_s = tool_result_ttl_s
+        self.lease_ttl_s = lease_ttl_s
+        self.lease_poll_s = lease_poll_s
+        self._leases: "weakref.WeakValueDictionary[str, _SessionLease]" = (
+            weakref.WeakValueDictionary()
+        )
+        self._clock = clock
+        # 工具结果的写入时间需要跨进程比较，使用墙钟时间
+        self._wall_clock = wall_clock
+        self._local = threading.local()
+        # session_id -> (密钥配置, 最近访问时间)
+        self._secrets: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        # 读线程、写线程与事件循环都会访问 _secrets
+        self._secrets_lock = threading.Lock()
+        self._counters: Dict[str, int] = {
+            "evicted_secrets": 0,
+            "expired_tool_results": 0,
+        }
+        self._queue: "queue.Queue[Optional[_WriteOp]]" = queue.Queue()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._writer = threading.Thread(
+            target=self._writer_loop, name="chat-store-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path, timeout=30.0, isolation_level=None, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    # --- 单写者队列 ---
+
+    def _writer_loop(self) -> None:
+        conn = self._connect()
+        while True:
+            op = self._queue.get()
+            if op is None:
+                break
+            batch = [op]
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._queue.put(None)
+                    break
+                batch.append(nxt)
+            self._write_batch(conn, batch)
+        conn.close()
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch: List[_WriteOp]) -> None:
+        outcomes: List[tuple[bool, Any]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op in batch:
+                conn.execute("SAVEPOINT op")
+                try:
+                    outcomes.append((True, op.fn(conn)))
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    outcomes.append((False, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"会话存储批量写入失败: {e}")
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except Exception as rollback_error:
+                # 回滚失败（如磁盘 / IO 错误）也要通知等待中的调用方，写线程继续运行
+                logger.error(f"会话存储回滚失败: {rollback_error}")
+            finally:
+                for op in batch:
+                    op.future.set_exception(e)
+            return
+
+        # 事务提交后再通知调用方，保证读到的一定是已持久化的数据
+        for op, (ok, value) in zip(batch, outcomes):
+            if ok:
+                op.future.set_result(value)
+            else:
+                op.future.set_exception(value)
+
+    async def _write(self, fn: WriteFn) -> Any:
+        op = _WriteOp(fn)
+        self._queue.put(op)
+        # 排队中的写入不占用 anyio 工作线程；取消等待时写入仍会完成
+        return await wait_future(op.future)
+
+    def _read_snapshot(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        conn = self._reader()
+        # 多条 SELECT 放在同一个读事务中，保证看到一致的快照
+        conn.execute("BEGIN")
+        try:
+            return fn(conn)
+        finally:
+            conn.execute("COMMIT")
+
+    async def _read(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await anyio.to_thread.run_sync(self._read_snapshot, fn)
+
+    # --- 会话租约 ---
+
+    def session_lock(self, session_id: str) -> SessionLock:
+        lease = self._leases.get(session_id)
+        if lease is None:
+            lease = _SessionLease(self, session_id, self._session_locks.get(session_id))
+            self._leases[session_id] = lease
+        return lease
+
+    async def _take_lease(self, session_id: str, owner: str) -> bool:
+        now = self._wall_clock()
+
+        def _take(conn: sqlite3.Connection) -> bool:
+            cur = conn.execute(
+                "INSERT INTO session_leases (session_id, owner, expires_at)"
+                " VALUES (?, ?, ?) ON CONFLICT (session_id) DO UPDATE SET"
+                " owner = excluded.owner, expires_at = excluded.expires_at"
+                " WHERE session_leases.expires_at <= ?",
+                (session_id, owner, now + self.lease_ttl_s, now),
+            )
+            return cur.rowcount > 0
+
+        return await self._write(_take)
+
+    async def _release_lease(self, session_id: str, owner: Optional[str]) -> None:
+        def _release(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "DELETE FROM session_leases WHERE session_id = ? AND owner = ?",
+                (session_id, owner),
+            )
+
+        await self._write(_release)
+
+    def _session_secrets(self, session_id: str) -> Dict[str, Any]:
+        with self._secrets_lock:
+            entry = self._secrets.get(session_id)
+            if entry is None:
+                return {}
+            self._secrets[session_id] = (entry[0], self._clock())
+            return entry[0]
+
+    async def sweep(self) -> int:
+        """
+        清除空闲超时的运行时密钥与过期的工具结果
+
+        会话本身持久化在数据库中，不做淘汰。
+        """
+        if self.tool_result_ttl_s is not None:
+            cutoff = self._wall_clock() - self.tool_result_ttl_s
+
+            def _expire(conn: sqlite3.Connection) -> int:
+                cur = conn.execute(
+                    "DELETE FROM tool_results WHERE stored_at < ?", (cutoff,)
+                )
+                return cur.rowcount
+
+            self._counters["expired_tool_results"] += await self._write(_expire)
+        if self.secret_idle_ttl_s is None:
+            return 0
+        now = self._clock()
+        with self._secrets_lock:
+            expired = [
+                session_id
+                for session_id, (_, used) in self._secrets.items()
+                if now - used > self.secret_idle_ttl_s
+            ]
+            for session_id in expired:
+                del self._secrets[session_id]
+        self._counters["evicted_secrets"] += len(expired)
+        if expired:
+            logger.info("已清除 %d 个空闲会话的运行时密钥", len(expired))
+        return 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._secrets_lock:
+            runtime_secrets = len(self._secrets)
+        return {"runtime_secrets": runtime_secrets, **self._counters}
+
+    def close(self) -> None:
+        """停止写线程（等待队列中的写入完成）"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    # --- 行转换 ---
+
+    def _load_session(
+        self, conn: sqlite3.Connection, session_id: str
+    ) -> Optional[ChatSession]:
+        row = conn.execute(
+            "SELECT * FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        messages = [
+            ChatMessage(
+                id=m["id"],
+                role=m["role"],
+                content=m["content"],
+                created_at=m["created_at"],
+            )
+            for m in conn.execute(
+                "SELECT id, role, content, created_at FROM messages "
+                "WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            )
+        ]
+        pending = None
+        if row["pending_approval_id"]:
+            approval = self._load_approval(conn, row["pending_approval_id"])
+            if approval is not None:
+                pending = PendingToolCall(
+                    approval_id=approval.id,
+                    tool_name=approval.tool_name,
+                    tool_args=approval.tool_args,
+                    created_at=approval.created_at,
+                )
+        model_config = json.loads(row["model_config"])
+        model_config.update(self._session_secrets(session_id))
+        return ChatSession(
+            id=row["id"],
+            created_at=row["created_at"],
+            model_config=model_config,
+            workflow=row["workflow"],
+            require_tool_approval=bool(row["require_tool_approval"]),
+            messages=messages,
+            scratchpad=row["scratchpad"],
+            pending_tool_call=pending,
+        )
+
+    @staticmethod
+    def _row_to_approval(row: sqlite3.Row) -> ToolApproval:
+        return ToolApproval(
+            id=row["id"],
+            session_id=row["session_id"],
+            tool_name=row["tool_name"],
+            tool_args=json.loads(row["tool_args"]),
+            status=row["status"],
+            created_at=row["created_at"],
+            resolved_at=row["resolved_at"],
+            decision_reason=row["decision_reason"],
+        )
+
+    def _load_approval(
+        self, conn: sqlite3.Connection, approval_id: str
+    ) -> Optional[ToolApproval]:
+        row = conn.execute(
+            "SELECT * FROM approvals WHERE id = ?", (approval_id,)
+        ).fetchone()
+        return self._row_to_approval(row) if row else None
+
+    @staticmethod
+    def _require_session(conn: sqlite3.Connection, session_id: str) -> None:
+        row = conn.execute(
+            "SELECT 1 FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(session_id)
+
+    # --- BaseChatStore 接口 ---
+
+    async def create_session(
+        self,
+        *,
+        model_config: Dict[str, Any],
+        workflow: str,
+        require_tool_approval: bool,
+    ) -> ChatSession:
+        session = ChatSession(
+            id=str(uuid4()),
+            created_at=utc_now_iso(),
+            model_config=model_config,
+            workflow=workflow,
+            require_tool_approval=require_tool_approval,
+        )
+        persisted = {
+            k: v for k, v in model_config.items() if k not in SECRET_CONFIG_KEYS
+        }
+        secrets = {k: v for k, v in model_config.items() if k in SECRET_CONFIG_KEYS}
+        if secrets and not self.runtime_secrets:
+            raise RuntimeSecretsUnsupportedError()
+
+        def _insert(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO sessions (id, created_at, model_config, workflow, "
+                "require_tool_approval) VALUES (?, ?, ?, ?, ?)",
+                (
+                    session.id,
+                    session.created_at,
+                    json.dumps(persisted, ensure_ascii=False),
+                    workflow,
+                    int(require_tool_approval),
+                ),
+            )
+
+        if secrets:
+            with self._secrets_lock:
+                self._secrets[session.id] = (secrets, self._clock())
+        await self._write(_insert)
+        return session
+
+    async def get_session(self, session_id: str) -> Optional[ChatSession]:
+        return await self._read(lambda conn: self._load_session(conn, session_id))
+
+    async def delete_session(self, session_id: str) -> bool:
+        def _delete(conn: sqlite3.Connection) -> bool:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM approvals WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM tool_results WHERE session_id = ?", (session_id,))
+            cur = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            return cur.rowcount > 0
+
+        with self._secrets_lock:
+            self._secrets.pop(session_id, None)
+        return await self._write(_delete)
+
+    async def add_message(
+        self,
+        session_id: str,
+        *,
+        role: Role,
+        content: str,
+    ) -> ChatMessage:
+        message = ChatMessage(
+            id=str(uuid4()),
+            role=role,
+            content=content,
+            created_at=utc_now_iso(),
+        )
+
+        def _insert(conn: sqlite3.Connection) -> None:
+            self._require_session(conn, session_id)
+            conn.execute(
+                "INSERT INTO messages (id, session_id, role, content, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (message.id, session_id, role, content, message.created_at),
+            )
+
+        await self._write(_insert)
+        return message
+
+    async def update_scratchpad(self, session_id: str, scratchpad: str) -> None:
+        def _update(conn: sqlite3.Connection) -> None:
+            cur = conn.execute(
+                "UPDATE sessions SET scratchpad = ? WHERE id = ?",
+                (scratchpad, session_id),
+            )
+            if cur.rowcount == 0:
+                raise KeyError(session_id)
+
+        await self._write(_update)
+
+    async def create_approval(
+        self,
+        *,
+        session_id: str,
+        tool_name: str,
+        tool_args: Dict[str, Any],
+    ) -> ToolApproval:
+        approval = ToolApproval(
+            id=str(uuid4()),
+            session_id=session_id,
+            tool_name=tool_name,
+            tool_args=tool_args,
+            status="pending",
+            created_at=utc_now_iso(),
+        )
+
+        def _insert(conn: sqlite3.Connection) -> None:
+            self._require_session(conn, session_id)
+            conn.execute(
+                "INSERT INTO approvals (id, session_id, tool_name, tool_args, "
+                "status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    approval.id,
+                    session_id,
+                    tool_name,
+                    json.dumps(tool_args, ensure_ascii=False),
+                    approval.status,
+                    approval.created_at,
+                ),
+            )
+            conn.execute(
+                "UPDATE sessions SET pending_approval_id = ? WHERE id = ?",
+                (approval.id, session_id),
+            )
+
+        await self._write(_insert)
+        return approval
+
+    async def resolve_approval(
+        self,
+        approval_id: str,
+        *,
+        decision: Literal["approve", "deny"],
+        reason: str,
+    ) -> ToolApproval:
+        def _resolve(conn: sqlite3.Connection) -> ToolApproval:
+            approval = self._load_approval(conn, approval_id)
+            if approval is None:
+                raise KeyError(approval_id)
+            if approval.status != "pending":
+                return approval
+
+            approval.status = "approved" if decision == "approve" else "denied"
+            approval.resolved_at = utc_now_iso()
+            approval.decision_reason = reason
+            conn.execute(
+                "UPDATE approvals SET status = ?, resolved_at = ?, "
+                "decision_reason = ? WHERE id = ?",
+                (approval.status, approval.resolved_at, reason, approval_id),
+            )
+            conn.execute(
+                "UPDATE sessions SET pending_approval_id = NULL "
+                "WHERE id = ? AND pending_approval_id = ?",
+                (approval.session_id, approval_id),
+            )
+            return approval
+
+        return await self._write(_resolve)
+
+    async def get_approval(self, approval_id: str) -> Optional[ToolApproval]:
+        return await self._read(lambda conn: self._load_approval(conn, approval_id))
+
+    async def page_approvals(
+        self,
+        *,
+        session_id: str,
+        status: Optional[ApprovalStatus] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> ApprovalPage:
+        before = parse_cursor(cursor)
+        if limit is not None and limit <= 0:
+            raise ValueError("limit 必须为正整数")
+
+        sql = "SELECT * FROM approvals WHERE session_id = ?"
+        params: List[Any] = [session_id]
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        if before:
+            sql += " AND seq < ?"
+            params.append(before)
+        sql += " ORDER BY seq DESC"
+        if limit is not None:
+            # 多取一条用于判断是否还有下一页
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        def _page(conn: sqlite3.Connection) -> ApprovalPage:
+            rows = conn.execute(sql, params).fetchall()
+            next_cursor = None
+            if limit is not None and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = str(rows[-1]["seq"])
+            return ApprovalPage(
+                items=[self._row_to_approval(row) for row in rows],
+                next_cursor=next_cursor,
+            )
+
+        return await self._read(_page)
+
+    async def save_tool_result(
+        self,
+        session_id: str,
+        *,
+        handle: str,
+        tool_name: str,
+        result: Any,
+    ) -> None:
+        payload = json.dumps(result, ensure_ascii=False, default=str)
+        stored_at = self._wall_clock()
+
+        def _insert(conn: sqlite3.Connection) -> None:
+            self._require_session(conn, session_id)
+            conn.execute(
+                "INSERT INTO tool_results (handle, session_id, tool_name, result, "
+                "stored_at) VALUES (?, ?, ?, ?, ?)",
+                (handle, session_id, tool_name, payload, stored_at),
+            )
+            if self.max_tool_results is not None:
+                conn.execute(
+                    "DELETE FROM tool_results WHERE session_id = ? AND seq NOT IN "
+                    "(SELECT seq FROM tool_results WHERE session_id = ? "
+                    "ORDER BY seq DESC LIMIT ?)",
+                    (session_id, session_id, self.max_tool_results),
+                )
+
+        await self._write(_insert)
+
+    async def get_tool_result(
+        self, session_id: str, handle: str
+    ) -> Optional[Tuple[str, Any]]:
+        def _load(conn: sqlite3.Connection) -> Optional[Tuple[str, Any]]:
+            row = conn.execute(
+                "SELECT tool_name, result, stored_at FROM tool_results "
+                "WHERE handle = ? AND session_id = ?",
+                (handle, session_id),
+            ).fetchone()
+            if row is None:
+                return None
+            ttl_s = self.tool_result_ttl_s
+            if ttl_s is not None and self._wall_clock() - row["stored_at"] > ttl_s:
+                return None
+            return row["tool_name"], json.loads(row["result"])
+
+        return await self._read(_load)
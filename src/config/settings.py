@@ -37,10 +37,29 @@ class Settings(BaseSettings):
     APP_MODE: Literal["api", "desktop", "desktop-tauri", "cli"] = "api"
     SERVER_HOST: str = "0.0.0.0"
     SERVER_PORT: int = 8000
-
-    BACKEND_CORS_ORIGINS: Annotated[
-        list[AnyUrl] | str, BeforeValidator(parse_cors)
-    ] = []
+    SERVER_WORKERS: int = 1
+
+    # 会话存储：memory 仅限单进程；sqlite 可在多个 worker 进程间共享
+    CHAT_STORE_BACKEND: Literal["memory", "sqlite"] = "memory"
+    CHAT_STORE_SQLITE_PATH: str = "data/chat_store.sqlite3"
+    # sqlite 存储跨 worker 串行化同一会话回合的租约时长，应大于最长的回合耗时
+    CHAT_SESSION_LEASE_TTL_S: float = 600.0
+    # 内存会话存储的上限（设为 None 表示不限制）
+    CHAT_SESSION_IDLE_TTL_S: float | None = 3600.0
+    CHAT_MAX_SESSIONS: int | None = 10000
+    # 单个会话的字节预算，超出时丢弃最早的消息并截断 scratchpad；默认不启用
+    CHAT_SESSION_MAX_BYTES: int | None = None
+    CHAT_SWEEP_INTERVAL_S: float = 60.0
+    # 同一步中多个工具调用的最大并发数（按会话计，会话内回合已串行）
+    CHAT_MAX_PARALLEL_TOOLS: int = 4
+    # ReAct 提示词的 token 上限，超出时压缩较早的观察结果；None 表示不限制
+    CHAT_MAX_PROMPT_TOKENS: int | None = 32000
+    # 压缩时保持原样的最近观察结果个数
+    CHAT_KEEP_RECENT_OBSERVATIONS: int = 2
+
+    BACKEND_CORS_ORIGINS: Annotated[list[AnyUrl] | str, BeforeValidator(parse_cors)] = (
+        []
+    )
 
     @computed_field  # type: ignore[misc]
     @property
@@ -91,6 +110,52 @@ class Settings(BaseSettings):
     def emails_enabled(self) -> bool:
         return bool(self.SMTP_HOST and self.EMAILS_FROM_EMAIL)
 
+    # 技能脚本执行池配置
+    SKILL_THREAD_WORKERS: int = 8
+    SKILL_PROCESS_WORKERS: int = 2
+    SKILL_MAX_QUEUE_DEPTH: int = 32
+    # 开发模式：每次调用都校验脚本与 SKILL.md 是否变化并重新加载
+    SKILL_HOT_RELOAD: bool = False
+    # 工具结果写入 Observation 的默认上限，被截断的完整结果按句柄暂存
+    # （对话接口中保存在会话存储里，STORE_* 为每个会话的条数上限与保留时长）
+    TOOL_RESULT_MAX_ITEMS: int = 50
+    TOOL_RESULT_MAX_BYTES: int = 8192
+    TOOL_RESULT_STORE_MAX_ENTRIES: int = 256
+    TOOL_RESULT_STORE_TTL_S: float = 3600.0
+    # 批量文件技能共用的文件目录索引（SQLite），按目录 mtime 增量刷新；
+    # 默认不启用（直接遍历），需要时配置为绝对路径，避免随工作目录变化
+    FILE_CATALOG_PATH: str | None = None
+    # 可选的三元组内容索引，用于缩小 batch-file-search 的候选文件；为空时不启用
+    TRIGRAM_INDEX_PATH: str | None = None
+    TRIGRAM_INDEX_MAX_FILE_BYTES: int = 16 * 1024 * 1024
+    # 内容搜索的匹配进程数，为空时使用 CPU 核数（最多 4 个）；
+    # 运行在技能进程池中的搜索总是就地匹配，不再创建匹配进程
+    SEARCH_PROCESS_WORKERS: int | None = None
+
+    # 模型客户端池配置
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_CLIENT_IDLE_TTL_S: float = 300.0
+
+    # 模型响应缓存：none / memory（进程内 LRU）/ sqlite（磁盘，可跨进程共享）
+    LLM_RESPONSE_CACHE: Literal["none", "memory", "sqlite"] = "none"
+    LLM_RESPONSE_CACHE_SQLITE_PATH: str = "data/llm_cache.sqlite3"
+    LLM_RESPONSE_CACHE_TTL_S: float | None = 24 * 3600.0
+    LLM_RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    # 合并相同的并发模型调用，只向服务商发出一次请求
+    LLM_COALESCE_REQUESTS: bool = True
+    # 客户端限流，键为 "provider" 或 "provider/model"，例如
+    # {"openai": {"requests_per_min": 500, "tokens_per_min": 200000}}
+    LLM_RATE_LIMITS: dict[str, dict[str, float]] = {}
+    # 熔断：同一服务商连续失败达到阈值后快速失败，恢复期后放行探测请求
+    LLM_CIRCUIT_BREAKER: bool = True
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RECOVERY_S: float = 30.0
+    # 降级链，键为主模型 provider，值为依次尝试的备用模型配置，例如
+    # {"deepseek": [{"provider": "openai-compatible",
+    #   "base_url": "http://localhost:8000/v1", "api_key": "local", "model": "qwen"}]}
+    LLM_FALLBACK_CHAIN: dict[str, list[dict[str, Any]]] = {}
+
     EMAIL_TEST_USER: str = "test@example.com"
     FIRST_SUPERUSER: str = "test@example.com"
     FIRST_SUPERUSER_PASSWORD: str = "test-password"
@@ -8,12 +8,20 @@ from src.config import settings
 def start_api():
     """启动 API 服务。"""
     print(f"正在以 {settings.ENVIRONMENT} 模式启动 API 服务...")
+    workers = settings.SERVER_WORKERS
+    if workers > 1 and settings.CHAT_STORE_BACKEND == "memory":
+        # 内存存储无法跨进程共享会话，多 worker 需要使用 sqlite 存储
+        print("警告: CHAT_STORE_BACKEND=memory 不支持多进程，已回退为单 worker")
+        workers = 1
+    elif workers > 1:
+        # 运行时传入的 api_key 只保存在创建会话的 worker 内存中，多 worker 时拒绝
+        print("提示: 多 worker 模式下会话不接受运行时 api_key，请在服务端配置模型密钥")
     uvicorn.run(
         "src.api.run:app",
         host=settings.SERVER_HOST,
         port=settings.SERVER_PORT,
         reload=(settings.ENVIRONMENT == "local"),
-        workers=1,
+        workers=workers,
     )
 
 
@@ -1,23 +1,42 @@
+from .file_catalog import FileCatalog, get_file_catalog
+from .text_stream import BinaryFileError, detect_text_encoding, replace_in_file
 from .tool_utils import (
     add_failed_file,
     compile_regex,
+    count_matches,
     ensure_dir,
     get_allowed_exts,
     init_batch_result,
     init_search_replace_result,
+    iter_files,
+    parallel_search,
     read_file_safe,
+    search_candidates,
     validate_path,
     walk_files,
 )
+from .trigram_index import TrigramIndex, build_query, get_trigram_index
 
 __all__ = [
+    "BinaryFileError",
+    "FileCatalog",
+    "TrigramIndex",
     "add_failed_file",
+    "build_query",
     "compile_regex",
+    "count_matches",
+    "detect_text_encoding",
     "ensure_dir",
     "get_allowed_exts",
+    "get_file_catalog",
+    "get_trigram_index",
     "init_batch_result",
     "init_search_replace_result",
+    "iter_files",
+    "parallel_search",
     "read_file_safe",
+    "replace_in_file",
+    "search_candidates",
     "validate_path",
     "walk_files",
 ]
@@ -0,0 +1,240 @@
+"""
+文件目录索引 - 用 SQLite 持久化文件元数据，按目录 mtime 增量刷新，避免每次遍历整棵目录树
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 目录 mtime 距扫描开始不足该时长时视为"不可信"：同一时间粒度内的后续修改
+# 可能不会改变 mtime，这类目录下次刷新时强制重新扫描
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def _subtree_range(path: str) -> Tuple[str, str]:
+    """path 下所有后代路径的字典序区间 [low, high)，可走索引"""
+    prefix = path if path.endswith(os.sep) else path + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class FileCatalog:
+    """
+    SQLite 文件目录索引
+
+    - dirs 表记录每个目录的 mtime，files 表记录文件的路径、大小、mtime、扩展名与 inode；
+    - refresh 时逐个 stat 目录：mtime 未变的目录直接复用记录，
+      只有新增 / 删除 / 重命名过条目的目录才重新 scandir；
+    - 文件的大小与 mtime 来自所在目录最近一次扫描，仅修改文件内容不会改变目录 mtime，
+      需要精确内容状态的调用方（如内容索引）应自行 stat。
+    多个进程可共享同一数据库文件（WAL 模式）。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS dirs (
+      path TEXT PRIMARY KEY,
+      parent TEXT NOT NULL,
+      mtime_ns INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_dirs_parent ON dirs (parent);
+    CREATE TABLE IF NOT EXISTS files (
+      path TEXT PRIMARY KEY,
+      dir TEXT NOT NULL,
+      name TEXT NOT NULL,
+      ext TEXT NOT NULL,
+      size INTEGER NOT NULL,
+      mtime_ns INTEGER NOT NULL,
+      inode INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_files_dir ON files (dir, name);
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, timeout=30.0, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(self.SCHEMA)
+        self._counters: Dict[str, int] = {"dirs_checked": 0, "dirs_scanned": 0}
+
+    def _refresh_dir(
+        self, directory: str, scan_start_ns: int
+    ) -> Tuple[Optional[List[str]], bool]:
+        """刷新单个目录，返回 (子目录列表, 是否重新扫描)；目录不存在时子目录为 None"""
+        self._counters["dirs_checked"] += 1
+        try:
+            st = os.stat(directory)
+        except OSError:
+            self._forget_tree(directory)
+            return None, False
+        row = self._conn.execute(
+            "SELECT mtime_ns FROM dirs WHERE path = ?", (directory,)
+        ).fetchone()
+        if row is not None and row[0] == st.st_mtime_ns:
+            return self._subdirs(directory), False
+        self._counters["dirs_scanned"] += 1
+        return self._rescan(directory, st.st_mtime_ns, scan_start_ns), True
+
+    def refresh(self, root: str, *, recursive: bool = True) -> int:
+        """增量刷新 root（及其子目录），返回重新扫描的目录数"""
+        scan_start_ns = time.time_ns()
+        scanned = 0
+        stack = [os.path.abspath(root)]
+        with self._lock:
+            while stack:
+                subdirs, rescanned = self._refresh_dir(stack.pop(), scan_start_ns)
+                scanned += rescanned
+                if recursive and subdirs:
+                    stack.extend(subdirs)
+        return scanned
+
+    def _subdirs(self, directory: str) -> List[str]:
+        rows = self._conn.execute(
+            "SELECT path FROM dirs WHERE parent = ?", (directory,)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def _rescan(self, directory: str, mtime_ns: int, scan_start_ns: int) -> List[str]:
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        # 与 os.walk 一致：指向目录的符号链接算作目录但不进入
+                        if entry.is_dir():
+                            if not entry.is_symlink():
+                                subdirs.append(entry.path)
+                            continue
+                        # 跳过管道、套接字等特殊文件，读取它们可能阻塞
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append(
+                        (
+                            entry.path,
+                            directory,
+                            entry.name,
+                            os.path.splitext(entry.name)[1].lower(),
+                            st.st_size,
+                            st.st_mtime_ns,
+                            st.st_ino,
+                        )
+                    )
+        except OSError:
+            self._forget_tree(directory)
+            return []
+
+        if mtime_ns >= scan_start_ns - RACY_WINDOW_NS:
+            mtime_ns = -1
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM files WHERE dir = ?", (directory,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO files"
+                " (path, dir, name, ext, size, mtime_ns, inode)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                files,
+            )
+            current = set(subdirs)
+            for old in self._subdirs(directory):
+                if old not in current:
+                    self._forget_tree(old)
+            conn.execute(
+                "INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                (directory, os.path.dirname(directory), mtime_ns),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return subdirs
+
+    def _forget_tree(self, directory: str) -> None:
+        low, high = _subtree_range(directory)
+        self._conn.execute(
+            "DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)",
+            (directory, low, high),
+        )
+        self._conn.execute(
+            "DELETE FROM files WHERE dir = ? OR (dir >= ? AND dir < ?)",
+            (directory, low, high),
+        )
+
+    def iter_files(
+        self,
+        root: str,
+        *,
+        recursive: bool = True,
+        exts: Optional[Sequence[str]] = None,
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        逐个目录刷新并产出 root 下的文件 (目录, 文件名)，exts 为小写扩展名列表
+
+        目录按深度优先、同级按名称排序处理；调用方提前停止迭代时，
+        其余目录既不会刷新也不会查询。索引内部以绝对路径为键，
+        产出的目录与直接遍历一致，保持调用方传入 root 的形式（相对或绝对）。
+        """
+        scan_start_ns = time.time_ns()
+        sql = "SELECT name FROM files WHERE dir = ?"
+        if exts:
+            sql += f" AND ext IN ({', '.join('?' for _ in exts)})"
+        sql += " ORDER BY name"
+        abs_root = os.path.abspath(root)
+        stack = [abs_root]
+        while stack:
+            directory = stack.pop()
+            with self._lock:
+                subdirs, _ = self._refresh_dir(directory, scan_start_ns)
+                if subdirs is None:
+                    continue
+                rows = self._conn.execute(sql, [directory, *(exts or [])]).fetchall()
+            if directory == abs_root:
+                shown = root
+            else:
+                shown = os.path.join(root, os.path.relpath(directory, abs_root))
+            for (name,) in rows:
+                yield shown, name
+            if recursive:
+                stack.extend(sorted(subdirs, reverse=True))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            dirs = self._conn.execute("SELECT COUNT(*) FROM dirs").fetchone()[0]
+            files = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return {"dirs": dirs, "files": files, **self._counters}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_catalogs: Dict[str, FileCatalog] = {}
+
+
+def get_file_catalog() -> Optional[FileCatalog]:
+    """
+    获取按配置创建的文件目录索引；FILE_CATALOG_PATH 为空时返回 None
+
+    技能脚本可能运行在工作进程中，每个进程各自打开一个连接。
+    """
+    from src.config import settings
+
+    db_path = settings.FILE_CATALOG_PATH
+    if not db_path:
+        return None
+    catalog = _catalogs.get(db_path)
+    if catalog is None:
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        catalog = _catalogs[db_path] = FileCatalog(db_path)
+    return catalog
@@ -0,0 +1,221 @@
+"""
+流式文本读取 - 按块读取大文件并在块之间保留重叠窗口，内存占用与文件大小无关
+"""
+
+import codecs
+import os
+import re
+import shutil
+import tempfile
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# 每次读取的字符数
+CHUNK_CHARS = 1 << 20
+# 跨块匹配的最大长度：长于该窗口的正则匹配可能被截断
+OVERLAP_CHARS = 1 << 16
+# 丢弃已处理文本时保留的前文长度，供后向断言与 \b 使用
+CONTEXT_CHARS = 256
+# 判断编码与二进制文件时读取的字节数
+SNIFF_BYTES = 8192
+
+
+class BinaryFileError(ValueError):
+    """文件包含 NUL 字节，按二进制文件处理"""
+
+
+def detect_text_encoding(path: str, sample_bytes: int = SNIFF_BYTES) -> str:
+    """
+    根据文件开头判断编码：UTF-8 或 latin-1
+
+    开头包含 NUL 字节时抛出 BinaryFileError。开头是合法 UTF-8 但后文不是时，
+    读取过程中会抛出 UnicodeDecodeError，由 with_encoding_fallback 改用 latin-1 重试。
+    """
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    if b"\x00" in sample:
+        raise BinaryFileError(path)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        # 样本末尾可能截断在多字节字符中间，未读完整个文件时不要求结束
+        decoder.decode(sample, final=len(sample) < sample_bytes)
+    except UnicodeDecodeError:
+        return "latin-1"
+    return "utf-8"
+
+
+def with_encoding_fallback(path: str, func: Callable[[str], T]) -> T:
+    """以检测到的编码调用 func(encoding)，UTF-8 解码失败时改用 latin-1 重新调用"""
+    encoding = detect_text_encoding(path)
+    try:
+        return func(encoding)
+    except UnicodeDecodeError:
+        if encoding == "latin-1":
+            raise
+        return func("latin-1")
+
+
+def iter_text_chunks(
+    path: str,
+    encoding: str,
+    *,
+    chunk_chars: int = CHUNK_CHARS,
+    newline: Optional[str] = None,
+) -> Iterator[str]:
+    """按块产出文件文本"""
+    with open(path, "r", encoding=encoding, newline=newline) as f:
+        while True:
+            chunk = f.read(chunk_chars)
+            if not chunk:
+                return
+            yield chunk
+
+
+def contains_text(chunks: Iterable[str], needle: str, *, ignore_case: bool) -> bool:
+    """
+    判断文本是否包含 needle，找到后立即停止读取
+
+    ignore_case 时与 needle.lower() in text.lower() 等价。
+    """
+    if ignore_case:
+        needle = needle.lower()
+    keep = max(len(needle) - 1, 0)
+    tail = ""
+    for chunk in chunks:
+        text = tail + (chunk.lower() if ignore_case else chunk)
+        if needle in text:
+            return True
+        tail = text[len(text) - keep :] if keep else ""
+    return needle == ""
+
+
+def iter_regex_segments(
+    chunks: Iterable[str],
+    pattern: re.Pattern,
+    *,
+    overlap: int = OVERLAP_CHARS,
+    context: int = CONTEXT_CHARS,
+) -> Iterator[Tuple[str, Optional[re.Match]]]:
+    """
+    在分块文本上执行 pattern.finditer，依次产出 (上一个匹配之后的原文, 匹配)
+
+    最后一项的匹配为 None，前面的原文片段与全部匹配拼接起来即为完整文本。
+    距当前块末尾不足 overlap 的匹配推迟到读入下一块后再判定，
+    保留的前文使后向断言、^ 与 \\b 的行为与整体匹配一致。
+    """
+    buf = ""
+    pos = 0  # 下一次搜索的起点
+    emitted = 0  # 已经产出的原文位置
+    skip_empty_at = -1  # 上一个空匹配的位置，避免在下一块中重复计数
+    it = iter(chunks)
+    # 空文件按一个空块处理，使空匹配的行为与整体匹配一致
+    pending: Optional[str] = next(it, "")
+    while pending is not None:
+        following = next(it, None)
+        final = following is None
+        buf += pending
+        pending = following
+        limit = len(buf) if final else len(buf) - overlap
+        cut = limit
+        if final or limit > pos:
+            for match in pattern.finditer(buf, pos):
+                start, end = match.span()
+                if start == end == skip_empty_at:
+                    continue
+                if not final and (end > limit or start >= limit):
+                    cut = min(cut, start)
+                    break
+                yield buf[emitted:start], match
+                emitted = pos = end
+                skip_empty_at = end if start == end else -1
+        if final:
+            break
+        pos = max(pos, cut)
+        if pos > emitted:
+            yield buf[emitted:pos], None
+            emitted = pos
+        drop = max(0, pos - context)
+        if drop:
+            buf = buf[drop:]
+            pos -= drop
+            emitted -= drop
+            if skip_empty_at >= 0:
+                skip_empty_at -= drop
+    yield buf[emitted:], None
+
+
+def count_regex_matches(chunks: Iterable[str], pattern: re.Pattern) -> int:
+    """统计匹配数，与 len(pattern.findall(text)) 一致"""
+    return sum(1 for _, match in iter_regex_segments(chunks, pattern) if match)
+
+
+def _has_match(path: str, encoding: str, pattern: re.Pattern) -> bool:
+    segments = iter_regex_segments(
+        iter_text_chunks(path, encoding, newline=""), pattern
+    )
+    return any(match is not None for _, match in segments)
+
+
+def _rewrite(
+    path: str, encoding: str, pattern: re.Pattern, replace: Callable[[re.Match], str]
+) -> int:
+    # 替换符号链接指向的文件，而不是用普通文件覆盖链接本身
+    path = os.path.realpath(path)
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    changed = 0
+    try:
+        with os.fdopen(fd, "w", encoding=encoding, newline="") as out:
+            segments = iter_regex_segments(
+                iter_text_chunks(path, encoding, newline=""), pattern
+            )
+            for text, match in segments:
+                out.write(text)
+                if match is not None:
+                    replacement = replace(match)
+                    changed += replacement != match.group(0)
+                    out.write(replacement)
+        if changed:
+            if os.stat(path).st_nlink > 1:
+                # 有多个硬链接时 rename 会让其他链接仍指向旧内容，改为原地写回
+                shutil.copyfile(tmp_path, path)
+            else:
+                shutil.copymode(path, tmp_path)
+                os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return changed
+
+
+def replace_in_file(
+    path: str, old_text: str, new_text: str, *, is_regex: bool = False
+) -> int:
+    """
+    流式替换文件内容，返回实际改变的匹配数
+
+    先扫描到第一个匹配为止，没有匹配的文件不会被写入；有匹配时逐块写入同目录下的
+    临时文件，完成后原子替换原文件。换行符与编码保持不变。
+    符号链接替换的是其指向的文件；有多个硬链接的文件原地写回（非原子），
+    保证所有链接看到新内容。
+    is_regex 时 new_text 支持 \\1 等反向引用，与 re.sub 一致。
+    """
+    if is_regex:
+        pattern = re.compile(old_text)
+
+        def replace(match: re.Match) -> str:
+            return match.expand(new_text)
+
+    else:
+        pattern = re.compile(re.escape(old_text))
+
+        def replace(match: re.Match) -> str:
+            return new_text
+
+    def run(encoding: str) -> int:
+        if not _has_match(path, encoding, pattern):
+            return 0
+        return _rewrite(path, encoding, pattern, replace)
+
+    return with_encoding_fallback(path, run)
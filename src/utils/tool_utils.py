@@ -1,6 +1,39 @@
+import atexit
+import functools
+import itertools
+import logging
+import multiprocessing
 import os
 import re
-from typing import Any, Callable, Dict, List, Optional
+import sqlite3
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from .file_catalog import get_file_catalog
+from .text_stream import (
+    contains_text,
+    count_regex_matches,
+    iter_text_chunks,
+    with_encoding_fallback,
+)
+from .trigram_index import build_query, get_trigram_index
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 
 def init_batch_result() -> Dict[str, Any]:
@@ -55,34 +88,276 @@ def compile_regex(
 
 
 def read_file_safe(file_path: str) -> Optional[str]:
-    """安全读取文件，支持多种编码"""
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
+    """安全读取文件，支持 UTF-8 / latin-1，二进制文件返回 None"""
+
+    def read(encoding: str) -> str:
+        with open(file_path, "r", encoding=encoding) as f:
             return f.read()
-    except UnicodeDecodeError:
-        try:
-            with open(file_path, "r", encoding="latin-1") as f:
-                return f.read()
-        except Exception:
-            return None
+
+    try:
+        return with_encoding_fallback(file_path, read)
     except Exception:
         return None
 
 
+def _scan_tree(
+    root: str, recursive: bool, allowed_exts: Optional[List[str]]
+) -> Iterator[Tuple[str, str]]:
+    """用 os.scandir 逐个目录产出文件，目录内按文件名排序"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if recursive and not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if allowed_exts and os.path.splitext(entry.name)[1].lower() not in (
+                allowed_exts
+            ):
+                continue
+            yield directory, entry.name
+        stack.extend(reversed(subdirs))
+
+
+def iter_files(
+    root: str,
+    recursive: bool = True,
+    allowed_exts: Optional[List[str]] = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    惰性列出 root 下的文件，产出 (所在目录, 文件名)
+
+    启用文件目录索引（FILE_CATALOG_PATH）时逐个目录按 mtime 增量刷新索引再查询，
+    未变化的目录不会重新列举；索引不可用时直接用 os.scandir 遍历。
+    """
+    catalog = get_file_catalog()
+    if catalog is not None:
+        yielded = False
+        try:
+            for item in catalog.iter_files(
+                root, recursive=recursive, exts=allowed_exts or None
+            ):
+                yielded = True
+                yield item
+            return
+        except sqlite3.Error as e:
+            # 已经产出部分结果时不能改为直接遍历，否则会重复
+            if yielded:
+                raise
+            logger.warning(f"File catalog unavailable, walking directly: {e}")
+    yield from _scan_tree(root, recursive, allowed_exts)
+
+
 def walk_files(
     search_path: str,
     allowed_exts: List[str],
     callback: Callable[[str, str], None],
 ):
     """遍历文件并应用回调"""
-    for root, _, files in os.walk(search_path):
-        for file in files:
-            ext = os.path.splitext(file)[1].lower()
-            if allowed_exts and ext not in allowed_exts:
-                continue
+    for root, file in iter_files(search_path, allowed_exts=allowed_exts):
+        file_path = os.path.join(root, file)
+        callback(file_path, file)
+
+
+def _batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def search_candidates(
+    search_path: str,
+    allowed_exts: List[str],
+    keyword: str,
+    is_regex: bool = False,
+    case_sensitive: bool = False,
+    *,
+    batch_size: int = 512,
+) -> Iterator[str]:
+    """
+    按 iter_files 的顺序逐个产出可能包含 keyword 的文件路径
+
+    启用内容索引（TRIGRAM_INDEX_PATH）时每 batch_size 个文件查询一次三元组倒排索引，
+    排除不可能匹配的文件；返回的候选仍需调用方逐个读取验证。
+    遍历是惰性的，调用方停止迭代后不再继续列举目录。
+    """
+    paths = (
+        os.path.join(root, file)
+        for root, file in iter_files(search_path, allowed_exts=allowed_exts)
+    )
+    index = get_trigram_index()
+    query = None
+    if index is not None:
+        query = build_query(keyword, is_regex=is_regex, case_sensitive=case_sensitive)
+    if index is None or query is None:
+        yield from paths
+        return
+    for batch in _batched(paths, batch_size):
+        try:
+            batch = index.candidates(batch, query)
+        except sqlite3.Error as e:
+            logger.warning(f"Trigram index unavailable, scanning all files: {e}")
+        yield from batch
+
 
-            file_path = os.path.join(root, file)
-            callback(file_path, file)
+@functools.lru_cache(maxsize=32)
+def _compiled_pattern(keyword: str, case_sensitive: bool) -> re.Pattern:
+    return re.compile(keyword, 0 if case_sensitive else re.IGNORECASE)
+
+
+def count_matches(
+    file_path: str, keyword: str, is_regex: bool, case_sensitive: bool
+) -> Optional[int]:
+    """
+    按块读取单个文件并统计匹配数（普通关键词找到即停止，只判断是否包含），
+    无法读取或为二进制文件时返回 None
+    """
+
+    def count(encoding: str) -> int:
+        chunks = iter_text_chunks(file_path, encoding)
+        if is_regex:
+            return count_regex_matches(
+                chunks, _compiled_pattern(keyword, case_sensitive)
+            )
+        return int(contains_text(chunks, keyword, ignore_case=not case_sensitive))
+
+    try:
+        return with_encoding_fallback(file_path, count)
+    except (OSError, ValueError):
+        return None
+
+
+def _match_chunk(
+    paths: List[str], keyword: str, is_regex: bool, case_sensitive: bool
+) -> List[Optional[int]]:
+    return [count_matches(p, keyword, is_regex, case_sensitive) for p in paths]
+
+
+_search_pool: Optional[ProcessPoolExecutor] = None
+# 为 True 时不创建匹配进程池，所有匹配就地执行
+_inline_search = False
+# 未配置 SEARCH_PROCESS_WORKERS 时匹配进程数的上限
+_MAX_DEFAULT_SEARCH_WORKERS = 4
+
+
+def run_search_inline() -> None:
+    """
+    让当前进程中的内容搜索就地匹配，不再创建匹配进程池
+
+    技能进程池以它作为工作进程的 initializer：在工作进程中再嵌套进程池
+    会使进程数成倍增长，且工作进程退出时要等待这些孙进程结束。
+    """
+    global _inline_search
+    _inline_search = True
+
+
+def _get_search_pool(workers: int) -> ProcessPoolExecutor:
+    global _search_pool
+    if _search_pool is None:
+        _search_pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _search_pool
+
+
+def _reset_search_pool() -> None:
+    global _search_pool
+    if _search_pool is not None:
+        _search_pool.shutdown(wait=False, cancel_futures=True)
+    _search_pool = None
+
+
+@atexit.register
+def _shutdown_search_pool() -> None:
+    """进程退出前关闭匹配进程池，取消排队中的块并等待工作进程退出"""
+    global _search_pool
+    if _search_pool is not None:
+        _search_pool.shutdown(wait=True, cancel_futures=True)
+    _search_pool = None
+
+
+def _search_workers() -> int:
+    if _inline_search:
+        return 1
+    from src.config import settings
+
+    if settings.SEARCH_PROCESS_WORKERS:
+        return settings.SEARCH_PROCESS_WORKERS
+    return min(os.cpu_count() or 1, _MAX_DEFAULT_SEARCH_WORKERS)
+
+
+def parallel_search(
+    paths: Iterable[str],
+    keyword: str,
+    is_regex: bool = False,
+    case_sensitive: bool = False,
+    *,
+    workers: Optional[int] = None,
+    chunk_size: int = 32,
+) -> Iterator[Tuple[str, Optional[int]]]:
+    """
+    并行读取并匹配文件，按 paths 的顺序产出 (路径, 匹配数)
+
+    paths 按需读取并按 chunk_size 分块交给进程池，同时在途的块数不超过 workers 的两倍；
+    结果按提交顺序取回，因此输出顺序稳定。调用方提前停止迭代时，
+    尚未开始的块会被取消，paths 也不再继续读取。
+    文件较少或只有一个工作进程时直接在当前进程中执行。
+    """
+    if workers is None:
+        workers = _search_workers()
+    args = (keyword, is_regex, case_sensitive)
+    chunks = _batched(paths, chunk_size)
+    if workers > 1:
+        head = list(itertools.islice(chunks, 2))
+        pool: Optional[ProcessPoolExecutor] = (
+            _get_search_pool(workers) if len(head) > 1 else None
+        )
+        chunks = itertools.chain(head, chunks)
+    else:
+        pool = None
+
+    in_flight: Deque[Tuple[List[str], Future]] = deque()
+    try:
+        while True:
+            while pool is not None and len(in_flight) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                in_flight.append((chunk, pool.submit(_match_chunk, chunk, *args)))
+            if in_flight:
+                chunk, future = in_flight.popleft()
+                try:
+                    counts = future.result()
+                except BrokenProcessPool as e:
+                    if pool is not None:
+                        logger.warning(f"Search pool broken, matching in process: {e}")
+                        _reset_search_pool()
+                        pool = None
+                    counts = _match_chunk(chunk, *args)
+            else:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                counts = _match_chunk(chunk, *args)
+            yield from zip(chunk, counts)
+    finally:
+        for _, future in in_flight:
+            future.cancel()
 
 
 def add_failed_file(result_dict: Dict[str, Any], filename: str, reason: str):
@@ -0,0 +1,397 @@
+"""
+三元组内容索引 - 为文本文件建立持久化的 trigram 倒排索引，在逐个读取文件验证前缩小候选集
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from .file_catalog import RACY_WINDOW_NS
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python 3.10
+    import sre_parse  # type: ignore[no-redef]
+
+_REPEATS = tuple(
+    op
+    for op in (
+        sre_parse.MAX_REPEAT,
+        sre_parse.MIN_REPEAT,
+        getattr(sre_parse, "POSSESSIVE_REPEAT", None),
+    )
+    if op is not None
+)
+_ATOMIC_GROUP = getattr(sre_parse, "ATOMIC_GROUP", None)
+
+# 索引与查询统一使用 str.lower() 归一化；最终 sigma 的小写形式依赖上下文，
+# 含 σ / ς 的三元组不参与过滤
+_CONTEXT_DEPENDENT = frozenset("σς")
+
+
+@dataclass
+class TrigramQuery:
+    """三元组查询：op 为 "and" / "or"，子节点为三元组字符串或子查询"""
+
+    op: str
+    children: List[Union[str, "TrigramQuery"]] = field(default_factory=list)
+
+
+# None 表示无法给出约束，所有文件都是候选
+Query = Optional[Union[str, TrigramQuery]]
+
+
+def _and(parts: Iterable[Query]) -> Query:
+    children: List[Union[str, TrigramQuery]] = []
+    for part in parts:
+        if part is None:
+            continue
+        if isinstance(part, TrigramQuery) and part.op == "and":
+            children.extend(part.children)
+        elif part not in children:
+            children.append(part)
+    if not children:
+        return None
+    if len(children) == 1:
+        return children[0]
+    return TrigramQuery("and", children)
+
+
+def _or(parts: Iterable[Query]) -> Query:
+    children: List[Union[str, TrigramQuery]] = []
+    for part in parts:
+        if part is None:
+            return None
+        children.append(part)
+    if not children:
+        return None
+    if len(children) == 1:
+        return children[0]
+    return TrigramQuery("or", children)
+
+
+def trigrams_of(text: str) -> Set[str]:
+    """文本（已小写）中全部三元组"""
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _literal_query(literal: str) -> Query:
+    grams = trigrams_of(literal.lower())
+    return _and(sorted(g for g in grams if not _CONTEXT_DEPENDENT & set(g)))
+
+
+def _usable_literal(char: str, ignorecase: bool) -> bool:
+    if not ignorecase:
+        return True
+    # 忽略大小写时 re 还会把 i / s 与 ı / ſ 等视为等价，只保留无大小写之分的
+    # 字符（如汉字、数字）以及其余 ASCII 字符
+    if char.lower() == char.upper():
+        return True
+    return char.isascii() and char.lower() not in "is"
+
+
+def _regex_query(items, ignorecase: bool) -> Query:
+    parts: List[Query] = []
+    run: List[str] = []
+
+    def flush() -> None:
+        if run:
+            parts.append(_literal_query("".join(run)))
+            run.clear()
+
+    for op, av in items:
+        if op is sre_parse.LITERAL and _usable_literal(chr(av), ignorecase):
+            run.append(chr(av))
+            continue
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            sub_ignorecase = (ignorecase or bool(add_flags & re.IGNORECASE)) and not (
+                del_flags & re.IGNORECASE
+            )
+            parts.append(_regex_query(sub, sub_ignorecase))
+        elif op in _REPEATS:
+            min_count, _, sub = av
+            if min_count >= 1:
+                parts.append(_regex_query(sub, ignorecase))
+        elif op is sre_parse.BRANCH:
+            parts.append(_or(_regex_query(alt, ignorecase) for alt in av[1]))
+        elif _ATOMIC_GROUP is not None and op is _ATOMIC_GROUP:
+            parts.append(_regex_query(av, ignorecase))
+    flush()
+    return _and(parts)
+
+
+def build_query(keyword: str, *, is_regex: bool, case_sensitive: bool) -> Query:
+    """
+    将搜索条件转换为三元组查询
+
+    普通关键词要求包含其全部三元组；正则表达式从语法树中提取必须出现的字面量片段，
+    分支取"或"，可选 / 可零次重复的部分不产生约束。
+    """
+    if not is_regex:
+        return _literal_query(keyword)
+    flags = 0 if case_sensitive else re.IGNORECASE
+    try:
+        parsed = sre_parse.parse(keyword, flags)
+    except (re.error, RecursionError):
+        return None
+    return _regex_query(list(parsed), bool(parsed.state.flags & re.IGNORECASE))
+
+
+class TrigramIndex:
+    """
+    SQLite 三元组倒排索引
+
+    按文件大小与 mtime 增量更新：内容未变的文件不会重新读取。超过 max_file_bytes、
+    含 NUL 字节或无法读取的文件不建索引，始终作为候选交给调用方验证，
+    因此过滤结果与不使用索引时一致。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+      id INTEGER PRIMARY KEY,
+      path TEXT NOT NULL UNIQUE,
+      size INTEGER NOT NULL,
+      mtime_ns INTEGER NOT NULL,
+      indexed INTEGER NOT NULL,
+      trigrams TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS postings (
+      tri TEXT NOT NULL,
+      file_id INTEGER NOT NULL,
+      PRIMARY KEY (tri, file_id)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        max_file_bytes: int = 16 * 1024 * 1024,
+        commit_every: int = 200,
+    ) -> None:
+        if max_file_bytes <= 0:
+            raise ValueError("max_file_bytes 必须为正整数")
+        self.db_path = db_path
+        self.max_file_bytes = max_file_bytes
+        self.commit_every = commit_every
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, timeout=30.0, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(self.SCHEMA)
+        self._counters: Dict[str, int] = {"files_indexed": 0, "queries": 0}
+
+    def _read_text(self, path: str, size: int) -> Optional[str]:
+        if size > self.max_file_bytes:
+            return None
+        from .tool_utils import read_file_safe
+
+        text = read_file_safe(path)
+        if text is None or "\x00" in text:
+            return None
+        return text.lower()
+
+    def _load_rows(self, paths: List[str]) -> Dict[str, tuple]:
+        rows: Dict[str, tuple] = {}
+        for start in range(0, len(paths), 500):
+            chunk = paths[start : start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            for row in self._conn.execute(
+                "SELECT path, id, size, mtime_ns, indexed FROM files"
+                f" WHERE path IN ({placeholders})",
+                chunk,
+            ):
+                rows[row[0]] = row[1:]
+        return rows
+
+    def _index_file(
+        self, path: str, row: Optional[tuple], st: os.stat_result
+    ) -> Tuple[int, bool]:
+        text = self._read_text(path, st.st_size)
+        grams = trigrams_of(text) if text is not None else set()
+        old = set()
+        if row is not None:
+            (old_text,) = self._conn.execute(
+                "SELECT trigrams FROM files WHERE id = ?", (row[0],)
+            ).fetchone()
+            old = {old_text[i : i + 3] for i in range(0, len(old_text), 3)}
+        mtime_ns = st.st_mtime_ns
+        if mtime_ns >= time.time_ns() - RACY_WINDOW_NS:
+            # 刚修改过的文件下次查询时重新读取，避免同一时间粒度内的后续修改被漏掉
+            mtime_ns = -1
+        conn = self._conn
+        if row is None:
+            file_id = conn.execute(
+                "INSERT INTO files (path, size, mtime_ns, indexed, trigrams)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (path, st.st_size, mtime_ns, int(text is not None), "".join(grams)),
+            ).lastrowid
+        else:
+            file_id = row[0]
+            conn.execute(
+                "UPDATE files SET size = ?, mtime_ns = ?, indexed = ?, trigrams = ?"
+                " WHERE id = ?",
+                (st.st_size, mtime_ns, int(text is not None), "".join(grams), file_id),
+            )
+        conn.executemany(
+            "DELETE FROM postings WHERE tri = ? AND file_id = ?",
+            [(g, file_id) for g in old - grams],
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO postings (tri, file_id) VALUES (?, ?)",
+            [(g, file_id) for g in grams - old],
+        )
+        self._counters["files_indexed"] += 1
+        return file_id, text is not None
+
+    def sync(self, paths: List[str]) -> Dict[str, Tuple[int, bool]]:
+        """确保 paths 的索引是最新的，返回 path -> (id, indexed)"""
+        result: Dict[str, Tuple[int, bool]] = {}
+        with self._lock:
+            rows = self._load_rows(paths)
+            pending = 0
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for path in paths:
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    row = rows.get(path)
+                    if (
+                        row is not None
+                        and row[1] == st.st_size
+                        and row[2] == st.st_mtime_ns
+                    ):
+                        result[path] = (row[0], bool(row[3]))
+                        continue
+                    result[path] = self._index_file(path, row, st)
+                    pending += 1
+                    if pending >= self.commit_every:
+                        conn.execute("COMMIT")
+                        conn.execute("BEGIN IMMEDIATE")
+                        pending = 0
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def _postings(self, gram: str, cache: Dict[str, Set[int]]) -> Set[int]:
+        ids = cache.get(gram)
+        if ids is None:
+            ids = cache[gram] = {
+                r[0]
+                for r in self._conn.execute(
+                    "SELECT file_id FROM postings WHERE tri = ?", (gram,)
+                )
+            }
+        return ids
+
+    def _evaluate(self, query: Query, cache: Dict[str, Set[int]]) -> Set[int]:
+        if isinstance(query, str):
+            return self._postings(query, cache)
+        if query.op == "and":
+            # 先算较短的 posting 列表，结果为空时提前结束
+            children = sorted(
+                query.children,
+                key=lambda c: (
+                    len(self._postings(c, cache)) if isinstance(c, str) else 0
+                ),
+            )
+            result: Optional[Set[int]] = None
+            for child in children:
+                ids = self._evaluate(child, cache)
+                result = ids.copy() if result is None else result & ids
+                if not result:
+                    break
+            return result or set()
+        result = set()
+        for child in query.children:
+            result |= self._evaluate(child, cache)
+        return result
+
+    def candidates(self, paths: List[str], query: Query) -> List[str]:
+        """按查询过滤 paths，保持原有顺序；未建索引的文件始终保留"""
+        if query is None:
+            return list(paths)
+        ids = self.sync(paths)
+        with self._lock:
+            self._counters["queries"] += 1
+            matched = self._evaluate(query, {})
+        return [
+            path
+            for path in paths
+            if path not in ids or not ids[path][1] or ids[path][0] in matched
+        ]
+
+    def prune(self, root: str) -> int:
+        """
+        删除 root 下已不存在的文件的索引，返回删除的文件数
+
+        查询只会更新仍存在的文件，删除或改名后遗留的记录需要定期调用本方法清理。
+        """
+        root = os.path.abspath(root)
+        prefix = root.rstrip(os.sep) + os.sep
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, path, trigrams FROM files WHERE path >= ? AND path < ?",
+                (prefix, prefix[:-1] + chr(ord(os.sep) + 1)),
+            ).fetchall()
+            gone = [r for r in rows if not os.path.exists(r[1])]
+            if not gone:
+                return 0
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for file_id, _, grams in gone:
+                    conn.executemany(
+                        "DELETE FROM postings WHERE tri = ? AND file_id = ?",
+                        [(grams[i : i + 3], file_id) for i in range(0, len(grams), 3)],
+                    )
+                    conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return len(gone)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            files = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return {"files": files, **self._counters}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_indexes: Dict[str, TrigramIndex] = {}
+
+
+def get_trigram_index() -> Optional[TrigramIndex]:
+    """获取按配置创建的内容索引；TRIGRAM_INDEX_PATH 为空（默认）时返回 None"""
+    from src.config import settings
+
+    db_path = settings.TRIGRAM_INDEX_PATH
+    if not db_path:
+        return None
+    index = _indexes.get(db_path)
+    if index is None:
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        index = _indexes[db_path] = TrigramIndex(
+            db_path, max_file_bytes=settings.TRIGRAM_INDEX_MAX_FILE_BYTES
+        )
+    return index
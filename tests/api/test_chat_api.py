@@ -1,9 +1,26 @@
+import json
 from pathlib import Path
+from typing import Any, Dict
 
+import anyio
 import httpx
 import pytest
 
+from src.agents.prompt.react import REACT_PROMPT
+from src.agents.service.base_agent import BaseAgent
+from src.agents.tools.base_tool import BaseTool
+from src.agents.tools.registry import ToolRegistry
 from src.api.run import app
+from src.api.v1.chat_engine import (
+    FakeReActModel,
+    TurnEvent,
+    build_react_messages,
+    format_react_prompt,
+    format_session_observation,
+    run_react_turn,
+)
+from src.api.v1.chat_store import InMemoryChatStore
+from src.api.v1.routes.chat import get_store
 
 
 @pytest.mark.anyio
@@ -102,3 +119,337 @@ async def test_chat_tool_deny_flow_can_list_approvals(tmp_path: Path) -> None:
         approvals2 = approvals2_resp.json()
         assert len(approvals2) == 1
         assert approvals2[0]["id"] == approval_id
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for frame in body.split("\n\n"):
+        lines = [line for line in frame.splitlines() if not line.startswith(":")]
+        if not lines:
+            continue
+        name = lines[0].split(":", 1)[1].strip()
+        data = json.loads(lines[1].split(":", 1)[1])
+        events.append((name, data))
+    return events
+
+
+@pytest.mark.anyio
+async def test_chat_stream_emits_tool_and_final_events(tmp_path: Path) -> None:
+    (tmp_path / "a.txt").write_text("TODO: x", encoding="utf-8")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as client:
+        resp = await client.post(
+            "/api/v1/chat/sessions",
+            json={
+                "model": {"provider": "fake-react", "name": "fake-react"},
+                "workflow": "react",
+                "require_tool_approval": False,
+            },
+        )
+        session_id = resp.json()["session_id"]
+
+        resp2 = await client.post(
+            f"/api/v1/chat/sessions/{session_id}/messages:stream",
+            json={"content": f"WORKSPACE_DIR={tmp_path}"},
+        )
+        assert resp2.status_code == 200
+        assert resp2.headers["content-type"].startswith("text/event-stream")
+
+        events = _parse_sse(resp2.text)
+        names = [name for name, _ in events]
+        assert names[0] == "token"
+        assert names.index("tool_call") < names.index("observation")
+        # 匹配文件在工具结束前逐个推送
+        progress = [data for name, data in events if name == "tool_progress"]
+        assert [p["item"]["path"] for p in progress] == [str(tmp_path / "a.txt")]
+        assert names.index("tool_progress") < names.index("observation")
+        assert names[-1] == "final"
+        assert events[-1][1]["assistant"] == "ok"
+
+        session = (await client.get(f"/api/v1/chat/sessions/{session_id}")).json()
+        assert session["messages"][-1]["content"] == "ok"
+
+
+def test_react_messages_keep_static_prefix_across_iterations() -> None:
+    kwargs = {"user_input": "q", "tools_desc": "t: d", "tool_names": "t"}
+    first = build_react_messages(scratchpad="", **kwargs)
+    second = build_react_messages(scratchpad="Thought: x\nObservation: y\n", **kwargs)
+
+    assert first[0]["role"] == "system"
+    assert first[0]["content"] is second[0]["content"]
+    assert second[1]["content"].startswith(first[1]["content"])
+    assert format_react_prompt(scratchpad="s", **kwargs) == BaseAgent.format_prompt(
+        REACT_PROMPT,
+        {"tools": "t: d", "tool_names": "t", "input": "q", "agent_scratchpad": "s"},
+    )
+
+
+@pytest.mark.anyio
+async def test_chat_stream_reports_model_failure_as_terminal_event(
+    monkeypatch,
+) -> None:
+    async def failing_stream(self, prompt: str, **kwargs):
+        yield "Thought: "
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(FakeReActModel, "stream_generate", failing_stream)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as client:
+        resp = await client.post(
+            "/api/v1/chat/sessions",
+            json={
+                "model": {"provider": "fake-react", "name": "fake-react"},
+                "workflow": "react",
+                "require_tool_approval": False,
+            },
+        )
+        session_id = resp.json()["session_id"]
+
+        resp2 = await client.post(
+            f"/api/v1/chat/sessions/{session_id}/messages:stream",
+            json={"content": "hi"},
+        )
+        assert resp2.status_code == 200
+
+        # 已推送部分事件后模型失败，仍以终止事件结束响应
+        events = _parse_sse(resp2.text)
+        assert events[0] == ("token", {"text": "Thought: "})
+        assert events[-1] == ("invalid", {"error": "provider down"})
+
+
+@pytest.mark.anyio
+async def test_chat_native_function_calling_flow(tmp_path: Path) -> None:
+    (tmp_path / "a.txt").write_text("TODO: x", encoding="utf-8")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as client:
+        resp = await client.post(
+            "/api/v1/chat/sessions",
+            json={
+                "model": {
+                    "provider": "fake-react",
+                    "name": "fake-react",
+                    "function_calling": True,
+                },
+                "workflow": "react",
+                "require_tool_approval": False,
+            },
+        )
+        session_id = resp.json()["session_id"]
+
+        resp2 = await client.post(
+            f"/api/v1/chat/sessions/{session_id}/messages",
+            json={"content": f"WORKSPACE_DIR={tmp_path}"},
+        )
+        assert resp2.status_code == 200
+        assert resp2.json()["status"] == "completed"
+        assert resp2.json()["assistant"] == "ok"
+
+    session = await get_store().get_session(session_id)
+    assert "Action: batch-file-search" in session.scratchpad
+    assert "Observation:" in session.scratchpad
+
+
+class SleepyTool(BaseTool):
+    def __init__(self, name: str, delay: float, log: list) -> None:
+        self._name = name
+        self.delay = delay
+        self.log = log
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return "sleep"
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        return {"type": "object", "properties": {}, "required": []}
+
+    async def run(self, **kwargs) -> Any:
+        self.log.append(f"{self._name}:start")
+        await anyio.sleep(self.delay)
+        self.log.append(f"{self._name}:end")
+        return f"{self._name} done"
+
+
+class TwoActionModel(FakeReActModel):
+    async def generate(self, prompt: str, **kwargs) -> str:
+        if "Observation:" in prompt[prompt.rfind("## 开始") :]:
+            return "Final Answer: ok"
+        return (
+            "Thought: 两个查询互不依赖。\n"
+            'Action: slow\nAction Input: {"n": 1}\n'
+            'Action: fast\nAction Input: {"n": 2}\n'
+        )
+
+
+@pytest.mark.anyio
+async def test_react_turn_runs_actions_of_one_step_concurrently(tmp_path) -> None:
+    log: list = []
+    tools = ToolRegistry(skills_dir=str(tmp_path), scripts_dir=str(tmp_path))
+    tools.register(SleepyTool("slow", 0.05, log))
+    tools.register(SleepyTool("fast", 0.01, log))
+    store = InMemoryChatStore()
+    session = await store.create_session(
+        model_config={}, workflow="react", require_tool_approval=False
+    )
+
+    events = [
+        event
+        async for event in run_react_turn(
+            store=store,
+            session_id=session.id,
+            model=TwoActionModel({}),
+            tools=tools,
+            user_input="q",
+            scratchpad="",
+            require_tool_approval=False,
+        )
+    ]
+
+    # 两个工具同时开始执行，快的先结束；Observation 仍按 Action 顺序返回
+    assert set(log[:2]) == {"slow:start", "fast:start"}
+    assert log[2:] == ["fast:end", "slow:end"]
+    observations = [e.data["tool_name"] for e in events if e.type == "observation"]
+    assert observations == ["slow", "fast"]
+    assert events[-1] == TurnEvent("final", {"assistant": "ok"})
+    scratchpad = (await store.get_session(session.id)).scratchpad
+    assert scratchpad.index("slow done") < scratchpad.index("fast done")
+
+
+@pytest.mark.anyio
+async def test_tool_result_handle_endpoint_pages_full_result() -> None:
+    store = get_store()
+    owner = await store.create_session(
+        model_config={"provider": "fake-react"},
+        workflow="react",
+        require_tool_approval=False,
+    )
+    other = await store.create_session(
+        model_config={"provider": "fake-react"},
+        workflow="react",
+        require_tool_approval=False,
+    )
+    result = {"success": True, "copied_files": [f"f{i}" for i in range(250)]}
+    await store.save_tool_result(
+        owner.id, handle="h1", tool_name="batch-file-copy", result=result
+    )
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as client:
+        url = f"/api/v1/chat/sessions/{owner.id}/tool-results/h1"
+        resp = await client.get(
+            url, params={"field": "copied_files", "offset": 200, "limit": 100}
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["total"] == 250
+        assert body["items"] == [f"f{i}" for i in range(200, 250)]
+
+        full = await client.get(url)
+        assert full.json()["result"] == result
+
+        # 句柄只能在所属会话中取回
+        foreign = await client.get(f"/api/v1/chat/sessions/{other.id}/tool-results/h1")
+        assert foreign.status_code == 404
+        missing = await client.get(f"/api/v1/chat/sessions/{owner.id}/tool-results/x")
+        assert missing.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_delete_session_endpoint() -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as client:
+        resp = await client.post(
+            "/api/v1/chat/sessions",
+            json={"model": {"provider": "fake-react", "name": "fake-react"}},
+        )
+        url = f"/api/v1/chat/sessions/{resp.json()['session_id']}"
+
+        assert (await client.delete(url)).status_code == 204
+        assert (await client.get(url)).status_code == 404
+        assert (await client.delete(url)).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_chat_reuses_cached_response_for_temperature_zero(monkeypatch) -> None:
+    from types import SimpleNamespace
+
+    from src.agents.llm import client_pool, response_cache
+    from src.agents.llm.model_adapter import OpenAICompatibleModel
+
+    calls = []
+
+    async def fake_completion(self, **params):
+        calls.append(params)
+        message = SimpleNamespace(content="Final Answer: cached")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    monkeypatch.setattr(OpenAICompatibleModel, "_create_completion", fake_completion)
+    cache = response_cache.ResponseCache(response_cache.LRUCacheBackend())
+    monkeypatch.setattr(response_cache, "_default_cache", cache)
+    # 模型实例按配置复用，使用独立的池保证挂载的是本用例的缓存
+    monkeypatch.setattr(client_pool, "_default_pool", client_pool.ClientPool())
+
+    model = {
+        "provider": "openai-compatible",
+        "name": "cache-test",
+        "api_key": "sk-cache-test",
+        "base_url": "http://cache-test.invalid/v1",
+        "model": "m1",
+        "temperature": 0,
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as client:
+        for _ in range(2):
+            resp = await client.post(
+                "/api/v1/chat/sessions",
+                json={"model": model, "workflow": "react"},
+            )
+            session_id = resp.json()["session_id"]
+            resp2 = await client.post(
+                f"/api/v1/chat/sessions/{session_id}/messages",
+                json={"content": "你好"},
+            )
+            assert resp2.status_code == 200
+            assert resp2.json()["assistant"] == "cached"
+
+    assert len(calls) == 1
+    assert calls[0]["temperature"] == 0
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.anyio
+async def test_truncated_observation_is_saved_to_the_session() -> None:
+    store = InMemoryChatStore()
+    session = await store.create_session(
+        model_config={"provider": "fake-react"},
+        workflow="react",
+        require_tool_approval=False,
+    )
+    tool = SleepyTool("copy", 0, [])
+    result = {"copied_files": [f"f{i}" for i in range(250)]}
+
+    observation = await format_session_observation(
+        store, session.id, ToolRegistry(), tool, result
+    )
+
+    handle = json.loads(observation)["_result_handle"]
+    assert await store.get_tool_result(session.id, handle) == ("copy", result)
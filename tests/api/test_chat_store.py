@@ -0,0 +1,223 @@
+import anyio
+import pytest
+
+from src.api.v1.chat_store import ApprovalPage, InMemoryChatStore
+from src.api.v1.sqlite_chat_store import SqliteChatStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield InMemoryChatStore()
+    else:
+        sqlite_store = SqliteChatStore(str(tmp_path / "chat.sqlite3"))
+        yield sqlite_store
+        sqlite_store.close()
+
+
+@pytest.mark.anyio
+async def test_page_approvals_by_status_with_cursor(store) -> None:
+    session = await store.create_session(
+        model_config={"provider": "fake-react"},
+        workflow="react",
+        require_tool_approval=True,
+    )
+    other = await store.create_session(
+        model_config={"provider": "fake-react"},
+        workflow="react",
+        require_tool_approval=True,
+    )
+    ids = []
+    for i in range(5):
+        approval = await store.create_approval(
+            session_id=session.id, tool_name="t", tool_args={"i": i}
+        )
+        ids.append(approval.id)
+    await store.create_approval(session_id=other.id, tool_name="t", tool_args={})
+    await store.resolve_approval(ids[1], decision="deny", reason="")
+    await store.resolve_approval(ids[3], decision="deny", reason="")
+
+    first = await store.page_approvals(session_id=session.id, limit=2)
+    assert [a.id for a in first.items] == [ids[4], ids[3]]
+    assert first.next_cursor is not None
+
+    second = await store.page_approvals(
+        session_id=session.id, limit=2, cursor=first.next_cursor
+    )
+    assert [a.id for a in second.items] == [ids[2], ids[1]]
+
+    third = await store.page_approvals(
+        session_id=session.id, limit=2, cursor=second.next_cursor
+    )
+    assert [a.id for a in third.items] == [ids[0]]
+    assert third.next_cursor is None
+
+    denied = await store.list_approvals(session_id=session.id, status="denied")
+    assert [a.id for a in denied] == [ids[3], ids[1]]
+    pending = await store.list_approvals(session_id=session.id, status="pending")
+    assert [a.id for a in pending] == [ids[4], ids[2], ids[0]]
+
+    with pytest.raises(ValueError):
+        await store.page_approvals(session_id=session.id, cursor="bogus")
+
+
+@pytest.mark.anyio
+async def test_session_lock_serializes_same_session_only(store) -> None:
+    a = await store.create_session(
+        model_config={}, workflow="react", require_tool_approval=False
+    )
+    b = await store.create_session(
+        model_config={}, workflow="react", require_tool_approval=False
+    )
+    assert store.session_lock(a.id) is store.session_lock(a.id)
+
+    async with store.session_lock(a.id):
+        assert store.session_lock(a.id).locked()
+        # 其他会话不受影响
+        with anyio.fail_after(1):
+            async with store.session_lock(b.id):
+                await store.add_message(b.id, role="user", content="hi")
+
+    order = []
+
+    async def turn(name: str) -> None:
+        async with store.session_lock(a.id):
+            order.append(f"{name}:start")
+            await anyio.sleep(0.01)
+            order.append(f"{name}:end")
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(turn, "x")
+        tg.start_soon(turn, "y")
+
+    assert order[0].split(":")[0] == order[1].split(":")[0]
+    assert order[2].split(":")[0] == order[3].split(":")[0]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def _new_session(store) -> str:
+    session = await store.create_session(
+        model_config={}, workflow="react", require_tool_approval=True
+    )
+    return session.id
+
+
+@pytest.mark.anyio
+async def test_memory_store_evicts_idle_and_lru_sessions() -> None:
+    clock = FakeClock()
+    store = InMemoryChatStore(idle_ttl_s=10, max_sessions=2, clock=clock)
+
+    a = await _new_session(store)
+    await store.create_approval(session_id=a, tool_name="t", tool_args={})
+    clock.now = 5
+    b = await _new_session(store)
+    clock.now = 12
+    assert await store.sweep() == 1
+    assert await store.get_session(a) is None
+    assert await store.page_approvals(session_id=a) == ApprovalPage([], None)
+
+    c = await _new_session(store)
+    await store.get_session(b)
+    # 会话数达到上限时淘汰最久未访问的 c
+    d = await _new_session(store)
+    assert await store.get_session(c) is None
+    assert await store.get_session(d) is not None
+
+    # 持有会话锁的会话不会被淘汰
+    clock.now = 100
+    async with store.session_lock(b):
+        assert await store.sweep() == 1
+        assert await store.get_session(b) is not None
+
+    stats = store.stats()
+    assert stats["evicted_ttl"] == 2
+    assert stats["evicted_lru"] == 1
+    assert stats["sessions"] == 1
+    assert stats["approvals"] == 0
+
+
+@pytest.mark.anyio
+async def test_memory_store_enforces_session_byte_budget() -> None:
+    store = InMemoryChatStore(max_session_bytes=100)
+    session_id = await _new_session(store)
+
+    for i in range(5):
+        await store.add_message(session_id, role="user", content=f"{i}" * 30)
+    session = await store.get_session(session_id)
+    assert [m.content[0] for m in session.messages] == ["2", "3", "4"]
+
+    scratchpad = "".join(f"Thought: step {i}\n" for i in range(10))
+    await store.update_scratchpad(session_id, scratchpad)
+    assert len(session.messages) == 1
+    assert session.scratchpad.startswith("Thought: step")
+    assert session.scratchpad.endswith("Thought: step 9\n")
+    assert len(session.scratchpad) + 30 <= 100
+
+    stats = store.stats()
+    assert stats["bytes"] <= 100
+    assert stats["trimmed_messages"] == 4
+    assert stats["trimmed_scratchpad_bytes"] > 0
+
+
+@pytest.mark.anyio
+async def test_delete_session_removes_messages_and_approvals(store) -> None:
+    session = await store.create_session(
+        model_config={"provider": "fake-react"},
+        workflow="react",
+        require_tool_approval=True,
+    )
+    await store.add_message(session.id, role="user", content="hi")
+    approval = await store.create_approval(
+        session_id=session.id, tool_name="t", tool_args={}
+    )
+
+    assert await store.delete_session(session.id)
+    assert await store.get_session(session.id) is None
+    assert await store.get_approval(approval.id) is None
+    assert not await store.delete_session(session.id)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+async def test_tool_results_are_scoped_to_their_session(kind, tmp_path) -> None:
+    if kind == "memory":
+        store = InMemoryChatStore(max_tool_results=2)
+    else:
+        store = SqliteChatStore(str(tmp_path / "chat.sqlite3"), max_tool_results=2)
+    owner = await store.create_session(
+        model_config={"provider": "fake-react"},
+        workflow="react",
+        require_tool_approval=False,
+    )
+    other = await store.create_session(
+        model_config={"provider": "fake-react"},
+        workflow="react",
+        require_tool_approval=False,
+    )
+    for i in range(3):
+        await store.save_tool_result(
+            owner.id, handle=f"h{i}", tool_name="t", result={"items": [i]}
+        )
+
+    assert await store.get_tool_result(owner.id, "h2") == ("t", {"items": [2]})
+    assert await store.get_tool_result(other.id, "h2") is None
+    # 超出每个会话的条数上限时淘汰最早的结果
+    assert await store.get_tool_result(owner.id, "h0") is None
+
+    if kind == "sqlite":
+        # 其他 worker 进程打开同一数据库文件也能取回
+        peer = SqliteChatStore(store.db_path)
+        assert await peer.get_tool_result(owner.id, "h1") == ("t", {"items": [1]})
+        peer.close()
+
+    assert await store.delete_session(owner.id)
+    assert await store.get_tool_result(owner.id, "h1") is None
+    if kind == "sqlite":
+        store.close()
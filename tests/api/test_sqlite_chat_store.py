@@ -0,0 +1,269 @@
+import sqlite3
+import threading
+
+import anyio
+import pytest
+
+from src.api.v1.sqlite_chat_store import (
+    RuntimeSecretsUnsupportedError,
+    SqliteChatStore,
+    _WriteOp,
+)
+
+
+@pytest.mark.anyio
+async def test_sqlite_chat_store_round_trip_and_persistence(tmp_path) -> None:
+    db_path = str(tmp_path / "chat.sqlite3")
+    store = SqliteChatStore(db_path)
+    try:
+        session = await store.create_session(
+            model_config={"provider": "fake-react", "api_key": "sk-secret"},
+            workflow="react",
+            require_tool_approval=True,
+        )
+        await store.add_message(session.id, role="user", content="hi")
+        await store.update_scratchpad(session.id, "Thought: x\n")
+        approval = await store.create_approval(
+            session_id=session.id, tool_name="t", tool_args={"a": 1}
+        )
+
+        loaded = await store.get_session(session.id)
+        assert loaded is not None
+        assert [m.content for m in loaded.messages] == ["hi"]
+        assert loaded.scratchpad == "Thought: x\n"
+        assert loaded.model_config["api_key"] == "sk-secret"
+        assert loaded.pending_tool_call is not None
+        assert loaded.pending_tool_call.approval_id == approval.id
+
+        resolved = await store.resolve_approval(
+            approval.id, decision="deny", reason="no"
+        )
+        assert resolved.status == "denied"
+        denied = await store.list_approvals(session_id=session.id, status="denied")
+        assert [a.id for a in denied] == [approval.id]
+
+        with pytest.raises(KeyError):
+            await store.add_message("missing", role="user", content="x")
+    finally:
+        store.close()
+
+    # 新实例（模拟另一个 worker / 重启后）能读到数据，但 api_key 不落盘
+    reopened = SqliteChatStore(db_path)
+    try:
+        loaded = await reopened.get_session(session.id)
+        assert loaded is not None
+        assert loaded.pending_tool_call is None
+        assert "api_key" not in loaded.model_config
+    finally:
+        reopened.close()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+@pytest.mark.anyio
+async def test_sqlite_chat_store_batches_concurrent_writes(tmp_path) -> None:
+    store = SqliteChatStore(str(tmp_path / "chat.sqlite3"))
+    try:
+        session = await store.create_session(
+            model_config={"provider": "fake-react"},
+            workflow="react",
+            require_tool_approval=False,
+        )
+        async with anyio.create_task_group() as tg:
+            for i in range(20):
+                tg.start_soon(
+                    lambda i=i: store.add_message(
+                        session.id, role="user", content=str(i)
+                    )
+                )
+        loaded = await store.get_session(session.id)
+        assert loaded is not None
+        assert sorted(int(m.content) for m in loaded.messages) == list(range(20))
+    finally:
+        store.close()
+
+
+@pytest.mark.anyio
+async def test_sqlite_chat_store_rejects_runtime_keys_without_runtime_secrets(
+    tmp_path,
+) -> None:
+    store = SqliteChatStore(str(tmp_path / "chat.sqlite3"), runtime_secrets=False)
+    try:
+        with pytest.raises(RuntimeSecretsUnsupportedError):
+            await store.create_session(
+                model_config={"provider": "fake-react", "api_key": "sk-secret"},
+                workflow="react",
+                require_tool_approval=True,
+            )
+        session = await store.create_session(
+            model_config={"provider": "fake-react"},
+            workflow="react",
+            require_tool_approval=True,
+        )
+        assert await store.get_session(session.id) is not None
+    finally:
+        store.close()
+
+
+@pytest.mark.anyio
+async def test_sqlite_chat_store_clears_runtime_keys_on_delete_and_sweep(
+    tmp_path,
+) -> None:
+    now = [0.0]
+    store = SqliteChatStore(
+        str(tmp_path / "chat.sqlite3"), secret_idle_ttl_s=10, clock=lambda: now[0]
+    )
+    config = {"provider": "fake-react", "api_key": "sk-secret"}
+    try:
+        first = await store.create_session(
+            model_config=config, workflow="react", require_tool_approval=True
+        )
+        second = await store.create_session(
+            model_config=config, workflow="react", require_tool_approval=True
+        )
+        await store.add_message(first.id, role="user", content="hi")
+
+        assert await store.delete_session(first.id)
+        assert not await store.delete_session(first.id)
+        assert await store.get_session(first.id) is None
+        assert store.stats()["runtime_secrets"] == 1
+
+        now[0] = 11.0
+        await store.sweep()
+        assert store.stats()["runtime_secrets"] == 0
+        assert store.stats()["evicted_secrets"] == 1
+        loaded = await store.get_session(second.id)
+        assert loaded is not None
+        assert "api_key" not in loaded.model_config
+    finally:
+        store.close()
+
+
+@pytest.mark.anyio
+async def test_sqlite_chat_store_sweeps_expired_tool_results(tmp_path) -> None:
+    now = [1000.0]
+    store = SqliteChatStore(
+        str(tmp_path / "chat.sqlite3"),
+        tool_result_ttl_s=60,
+        wall_clock=lambda: now[0],
+    )
+    try:
+        session = await store.create_session(
+            model_config={"provider": "fake-react"},
+            workflow="react",
+            require_tool_approval=False,
+        )
+        await store.save_tool_result(session.id, handle="h", tool_name="t", result=1)
+        assert await store.get_tool_result(session.id, "h") == ("t", 1)
+
+        now[0] += 61
+        assert await store.get_tool_result(session.id, "h") is None
+        await store.sweep()
+        assert store.stats()["expired_tool_results"] == 1
+    finally:
+        store.close()
+
+
+@pytest.mark.anyio
+async def test_sqlite_chat_store_queued_writes_do_not_hold_worker_threads(
+    tmp_path,
+) -> None:
+    store = SqliteChatStore(str(tmp_path / "chat.sqlite3"))
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    release = threading.Event()
+
+    def _blocked(conn: sqlite3.Connection) -> None:
+        release.wait(5)
+
+    try:
+        async with anyio.create_task_group() as tg:
+            for _ in range(3):
+                tg.start_soon(store._write, _blocked)
+            await anyio.sleep(0.05)
+            # 等待写线程提交的调用方不占用 anyio 的工作线程名额
+            assert limiter.borrowed_tokens == 0
+            release.set()
+    finally:
+        store.close()
+
+
+class _BrokenConnection:
+    """COMMIT 与 ROLLBACK 都失败的连接，模拟磁盘错误"""
+
+    in_transaction = True
+
+    def execute(self, sql: str) -> None:
+        if sql in ("COMMIT", "ROLLBACK"):
+            raise sqlite3.OperationalError(f"disk I/O error during {sql}")
+
+
+def test_sqlite_chat_store_settles_writes_when_rollback_fails() -> None:
+    batch = [_WriteOp(lambda conn: None) for _ in range(3)]
+    SqliteChatStore._write_batch(_BrokenConnection(), batch)  # type: ignore[arg-type]
+
+    for op in batch:
+        assert op.future.done()
+        with pytest.raises(sqlite3.OperationalError, match="COMMIT"):
+            op.future.result()
+
+
+@pytest.mark.anyio
+async def test_sqlite_session_lock_serializes_turns_across_workers(tmp_path) -> None:
+    db_path = str(tmp_path / "chat.sqlite3")
+    # 两个实例共享同一数据库文件，模拟两个 worker 进程
+    first = SqliteChatStore(db_path, lease_poll_s=0.01)
+    second = SqliteChatStore(db_path, lease_poll_s=0.01)
+    order = []
+
+    async def turn(store: SqliteChatStore, name: str) -> None:
+        async with store.session_lock(session.id):
+            order.append(f"{name}:start")
+            await anyio.sleep(0.05)
+            order.append(f"{name}:end")
+
+    try:
+        session = await first.create_session(
+            model_config={}, workflow="react", require_tool_approval=False
+        )
+        with anyio.fail_after(5):
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(turn, first, "x")
+                tg.start_soon(turn, second, "y")
+    finally:
+        first.close()
+        second.close()
+
+    assert order[0].split(":")[0] == order[1].split(":")[0]
+    assert order[2].split(":")[0] == order[3].split(":")[0]
+
+
+class FakeWallClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.anyio
+async def test_sqlite_session_lease_expires_after_crashed_holder(tmp_path) -> None:
+    db_path = str(tmp_path / "chat.sqlite3")
+    clock = FakeWallClock()
+    crashed = SqliteChatStore(db_path, lease_ttl_s=30, wall_clock=clock)
+    survivor = SqliteChatStore(
+        db_path, lease_ttl_s=30, lease_poll_s=0.01, wall_clock=clock
+    )
+    try:
+        # 持有者异常退出，没有归还租约
+        assert await crashed._take_lease("s1", "dead-worker")
+        assert not await survivor._take_lease("s1", "other")
+
+        clock.now = 30.0
+        with anyio.fail_after(1):
+            async with survivor.session_lock("s1"):
+                assert survivor.session_lock("s1").locked()
+    finally:
+        crashed.close()
+        survivor.close()
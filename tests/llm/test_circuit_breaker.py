@@ -0,0 +1,229 @@
+import anyio
+import pytest
+
+from src.agents.llm.base import BaseModel
+from src.agents.llm.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    is_provider_failure,
+)
+from src.agents.llm.fallback import FallbackModel
+from src.agents.llm.manager import ModelManager
+from src.agents.llm.rate_limiter import RateLimiter
+from src.agents.llm.registry import ModelRegistry
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedModel(BaseModel):
+    def __init__(self, name: str, *, fail: bool = False, hang: bool = False):
+        self._name = name
+        self.fail = fail
+        self.hang = hang
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def provider(self) -> str:
+        return "test"
+
+    @property
+    def function_calling(self) -> bool:
+        return False
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        if self.hang:
+            await anyio.sleep_forever()
+        if self.fail:
+            raise StatusError(503)
+        return f"{self.name}:{prompt}"
+
+    async def stream_generate(self, prompt: str, **kwargs):
+        if self.fail:
+            raise StatusError(503)
+        for part in ("a", "b"):
+            yield f"{self.name}-{part}"
+
+
+def test_breaker_opens_half_opens_and_closes() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "svc", failure_threshold=2, recovery_timeout_s=10, clock=clock
+    )
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now = 10.0
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    # 探测名额用完后其余调用仍被拒绝
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now = 20.0
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats()["opened"] == 2
+
+
+def test_client_errors_do_not_count_as_provider_failures() -> None:
+    assert not is_provider_failure(StatusError(400))
+    assert is_provider_failure(StatusError(429))
+    assert is_provider_failure(StatusError(503))
+    assert is_provider_failure(TimeoutError())
+
+
+@pytest.mark.anyio
+async def test_open_circuit_fails_fast_without_waiting_for_timeout() -> None:
+    model = ScriptedModel("slow", hang=True)
+    model.circuit_breaker = CircuitBreaker("slow", failure_threshold=1)
+    with pytest.raises(TimeoutError):
+        await model.generate_with_retry("hi", timeout_s=0.05, max_retries=0)
+
+    start = anyio.current_time()
+    with pytest.raises(CircuitOpenError):
+        await model.generate_with_retry("hi", timeout_s=60, max_retries=2)
+    assert anyio.current_time() - start < 0.05
+    assert model.calls == 1
+
+
+@pytest.mark.anyio
+async def test_half_open_probe_is_not_held_while_waiting_for_rate_limit() -> None:
+    clock = FakeClock()
+    model = ScriptedModel("svc", fail=True)
+    model.circuit_breaker = CircuitBreaker(
+        "svc", failure_threshold=1, recovery_timeout_s=10, clock=clock
+    )
+    model.rate_limiter = RateLimiter(requests_per_min=600)
+    with pytest.raises(StatusError):
+        await model.generate_with_retry("hi", max_retries=0)
+
+    clock.now = 10.0
+    model.fail = False
+    # 服务端要求暂停 0.2 秒，下一次请求需要在限流队列中等待
+    model.rate_limiter.update_from_headers({"retry-after-ms": "200"})
+    results = []
+
+    async def _call() -> None:
+        results.append(await model.generate_with_retry("hi", max_retries=0))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_call)
+        await anyio.sleep(0.05)
+        # 请求仍在限流队列中，探测名额没有被占用
+        assert model.circuit_breaker.state == "half_open"
+        model.circuit_breaker.before_call()
+        model.circuit_breaker.release()
+
+    assert results == ["svc:hi"]
+    assert model.circuit_breaker.state == "closed"
+
+
+@pytest.mark.anyio
+async def test_fallback_chain_skips_tripped_provider() -> None:
+    primary = ScriptedModel("deepseek", fail=True)
+    primary.circuit_breaker = CircuitBreaker("deepseek", failure_threshold=1)
+    local = ScriptedModel("local")
+    chain = FallbackModel([primary, local])
+
+    assert await chain.generate_with_retry("hi", max_retries=0) == "local:hi"
+    assert await chain.generate_with_retry("hi", max_retries=0) == "local:hi"
+    # 第二次调用时主模型已熔断，没有再发出请求
+    assert primary.calls == 1
+    assert chain.name == "deepseek"
+    assert [c async for c in chain.stream_generate("hi")] == ["local-a", "local-b"]
+
+
+@pytest.mark.anyio
+async def test_streaming_consults_and_records_circuit_breaker() -> None:
+    model = ScriptedModel("stream", fail=True)
+    model.circuit_breaker = CircuitBreaker("stream", failure_threshold=1)
+
+    with pytest.raises(StatusError):
+        [c async for c in model.stream_with_breaker("hi")]
+    assert model.circuit_breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        [c async for c in model.stream_with_breaker("hi")]
+
+    healthy = ScriptedModel("ok")
+    healthy.circuit_breaker = CircuitBreaker("ok", failure_threshold=1)
+    assert [c async for c in healthy.stream_with_breaker("hi")] == ["ok-a", "ok-b"]
+    assert healthy.circuit_breaker.state == "closed"
+
+
+@pytest.mark.anyio
+async def test_fallback_stream_throttles_the_member_that_serves_it() -> None:
+    primary = ScriptedModel("deepseek", fail=True)
+    primary.circuit_breaker = CircuitBreaker("deepseek", failure_threshold=1)
+    local = ScriptedModel("local")
+    local.rate_limiter = RateLimiter(requests_per_min=600)
+    chain = FallbackModel([primary, local])
+
+    for _ in range(2):
+        chunks = [c async for c in chain.stream_with_breaker("hi", rate_limit_key="s")]
+        assert chunks == ["local-a", "local-b"]
+    # 接手流式请求的备用模型按自己的限流器排队
+    assert local.rate_limiter.stats()["acquired"] == 2
+
+
+@pytest.mark.anyio
+async def test_manager_uses_configured_fallback_chain() -> None:
+    registry = ModelRegistry()
+    registry.register(ScriptedModel("deepseek", fail=True))
+    registry.register(ScriptedModel("local"))
+    manager = ModelManager(registry)
+    manager.set_fallback_chain("deepseek", ["local"])
+    assert await manager.generate("hi", "deepseek", max_retries=0) == "local:hi"
+    with pytest.raises(ValueError):
+        manager.set_fallback_chain("deepseek", ["missing"])
+
+
+class RemoteModel(ScriptedModel):
+    @property
+    def provider(self) -> str:
+        return "remote"
+
+
+@pytest.mark.anyio
+async def test_manager_fallback_chain_fast_fails_on_open_circuit(monkeypatch) -> None:
+    from src.agents.llm import circuit_breaker
+    from src.config import settings
+
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_FAILURE_THRESHOLD", 1)
+    primary = RemoteModel("deepseek", fail=True)
+    registry = ModelRegistry()
+    registry.register(primary)
+    registry.register(ScriptedModel("local"))
+    manager = ModelManager(registry)
+    manager.set_fallback_chain("deepseek", ["local"])
+
+    for _ in range(2):
+        assert await manager.generate("hi", "deepseek", max_retries=0) == "local:hi"
+    # 注册表中的模型在组装降级链时挂上熔断器，熔断后不再发出请求
+    assert primary.circuit_breaker is not None
+    assert primary.circuit_breaker.state == "open"
+    assert primary.calls == 1
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from src.agents.llm.client_pool import ClientPool
+from src.agents.llm.model_adapter import OpenAICompatibleModel
+
+
+def _config(**overrides):
+    config = {
+        "provider": "openai-compatible",
+        "name": "local",
+        "api_key": "sk-test",
+        "base_url": "http://localhost:9999/v1",
+        "model": "m1",
+    }
+    config.update(overrides)
+    return config
+
+
+def test_client_pool_reuses_model_instances_per_config() -> None:
+    pool = ClientPool()
+
+    first = pool.get_model(_config(), OpenAICompatibleModel)
+    second = pool.get_model(_config(), OpenAICompatibleModel)
+    other_key = pool.get_model(_config(api_key="sk-other"), OpenAICompatibleModel)
+    other_temp = pool.get_model(_config(temperature=0.1), OpenAICompatibleModel)
+
+    assert first is second
+    assert other_key is not first
+    assert other_temp is not first
+    assert pool.stats()["models"] == 3
+
+
+def test_client_pool_shares_clients_by_base_url_and_key() -> None:
+    pool = ClientPool()
+
+    a = pool.get_client(api_key="sk-test", base_url="http://localhost:9999/v1")
+    b = pool.get_client(api_key="sk-test", base_url="http://localhost:9999/v1")
+    c = pool.get_client(api_key="sk-test", base_url="http://localhost:8888/v1")
+
+    assert a is b
+    assert a is not c
+
+
+def test_client_pool_evicts_idle_entries() -> None:
+    pool = ClientPool(idle_ttl_s=0.5)
+    pool.get_client(api_key="sk-test", base_url=None)
+    pool.get_model(_config(), OpenAICompatibleModel)
+
+    time.sleep(0.6)
+    assert pool.evict_idle() == 2
+    assert pool.stats() == {"clients": 0, "models": 0, "retired": 1}
+
+
+@pytest.mark.anyio
+async def test_client_pool_closes_retired_clients_after_grace_period() -> None:
+    pool = ClientPool(idle_ttl_s=0.2)
+    client = pool.get_client(api_key="sk-test", base_url=None)
+
+    time.sleep(0.3)
+    assert await pool.sweep() == 1
+    # 刚淘汰的客户端保留一个宽限期，进行中的请求仍可使用
+    assert not client.is_closed()
+
+    time.sleep(0.3)
+    await pool.sweep()
+    assert client.is_closed()
+    assert pool.stats()["retired"] == 0
+
+
+@pytest.mark.anyio
+async def test_client_pool_aclose_closes_all_clients() -> None:
+    pool = ClientPool()
+    client = pool.get_client(api_key="sk-test", base_url=None)
+
+    await pool.aclose()
+    assert client.is_closed()
+    assert pool.stats() == {"clients": 0, "models": 0, "retired": 0}
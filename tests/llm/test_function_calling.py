@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.agents.llm.base import ToolCall, ToolCallResponse
+from src.agents.llm.model_adapter import OpenAICompatibleModel
+from src.agents.prompt.react import (
+    REACT_PROMPT,
+    REACT_TASK_PROMPT,
+    to_native_tools_prompt,
+)
+
+
+class StubCompletions:
+    def __init__(self, message) -> None:
+        self.message = message
+        self.kwargs = {}
+
+    async def create(self, **kwargs):
+        self.kwargs = kwargs
+        return SimpleNamespace(choices=[SimpleNamespace(message=self.message)])
+
+
+def _tool_call(call_id: str, name: str, arguments: str):
+    return SimpleNamespace(
+        id=call_id, function=SimpleNamespace(name=name, arguments=arguments)
+    )
+
+
+@pytest.mark.anyio
+async def test_generate_tool_calls_parses_parallel_calls(monkeypatch) -> None:
+    message = SimpleNamespace(
+        content="",
+        tool_calls=[
+            _tool_call("c1", "search", '{"path": "a"}'),
+            _tool_call("c2", "search", '{"path": '),
+        ],
+    )
+    completions = StubCompletions(message)
+    monkeypatch.setattr(
+        OpenAICompatibleModel,
+        "client",
+        SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+    )
+    model = OpenAICompatibleModel({"api_key": "sk-test", "model": "m"})
+    tools = [{"type": "function", "function": {"name": "search"}}]
+
+    response = await model.generate_tool_calls("hi", tools)
+
+    assert completions.kwargs["tools"] == tools
+    # 未配置时不发送 parallel_tool_calls，兼容不支持该字段的服务
+    assert "parallel_tool_calls" not in completions.kwargs
+    assert response.tool_calls[0] == ToolCall(
+        id="c1", name="search", arguments={"path": "a"}
+    )
+    assert response.tool_calls[1].error
+    assert response.tool_calls[1].arguments == {}
+
+
+@pytest.mark.anyio
+async def test_generate_tool_calls_sends_parallel_flag_when_configured(
+    monkeypatch,
+) -> None:
+    completions = StubCompletions(SimpleNamespace(content="done", tool_calls=None))
+    monkeypatch.setattr(
+        OpenAICompatibleModel,
+        "client",
+        SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+    )
+    model = OpenAICompatibleModel(
+        {"api_key": "sk-test", "model": "m", "parallel_tool_calls": False}
+    )
+
+    await model.generate_tool_calls("hi", [])
+    assert completions.kwargs["parallel_tool_calls"] is False
+
+    await model.generate_tool_calls("hi", [], parallel_tool_calls=True)
+    assert completions.kwargs["parallel_tool_calls"] is True
+
+
+def test_native_prompt_drops_text_tool_format() -> None:
+    prompt = to_native_tools_prompt(REACT_PROMPT)
+    assert "## 流程格式" not in prompt
+    assert "## 可用工具" not in prompt
+    assert "{tools}" not in prompt
+    assert prompt.endswith(REACT_TASK_PROMPT)
+
+
+def test_tool_call_response_renders_react_transcript() -> None:
+    response = ToolCallResponse(
+        content="先搜索",
+        tool_calls=[ToolCall(id="c1", name="search", arguments={"path": "a"})],
+    )
+    assert response.to_react_text() == (
+        'Thought: 先搜索\nAction: search\nAction Input: {"path": "a"}'
+    )
+    assert ToolCallResponse(content="Final Answer: done").to_react_text() == (
+        "Final Answer: done"
+    )
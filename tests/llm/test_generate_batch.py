@@ -0,0 +1,72 @@
+import anyio
+import pytest
+
+from src.agents.llm.base import BaseModel
+
+
+class EchoModel(BaseModel):
+    def __init__(self) -> None:
+        self.active = 0
+        self.peak = 0
+
+    @property
+    def name(self) -> str:
+        return "echo"
+
+    @property
+    def provider(self) -> str:
+        return "test"
+
+    @property
+    def function_calling(self) -> bool:
+        return False
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await anyio.sleep(0.01 * (5 - int(prompt[-1])))
+            if prompt == "bad3":
+                raise RuntimeError("boom")
+            return prompt.upper()
+        finally:
+            self.active -= 1
+
+
+@pytest.mark.anyio
+async def test_generate_batch_is_bounded_ordered_and_reports_failures() -> None:
+    model = EchoModel()
+    prompts = ["p0", "p1", "p2", "bad3", "p4"]
+
+    results = await model.generate_batch(
+        prompts, max_concurrency=2, max_retries=0, backoff_s=0
+    )
+
+    assert [r.index for r in results] == [0, 1, 2, 3, 4]
+    assert [r.output for r in results] == ["P0", "P1", "P2", None, "P4"]
+    assert not results[3].ok
+    assert isinstance(results[3].error, RuntimeError)
+    assert model.peak == 2
+
+
+@pytest.mark.anyio
+async def test_stream_batch_yields_in_completion_order() -> None:
+    model = EchoModel()
+    async with model.stream_batch(["p0", "p4"], max_concurrency=2) as stream:
+        order = [item.index async for item in stream]
+    assert order == [1, 0]
+
+
+@pytest.mark.anyio
+async def test_stream_batch_early_break_cancels_pending_requests() -> None:
+    model = EchoModel()
+    prompts = ["p0", "p1", "p2", "p3", "p4"]
+
+    async with model.stream_batch(prompts, max_concurrency=5) as stream:
+        async for item in stream:
+            first = item
+            break
+
+    # p4 最先完成；提前退出后其余请求被取消，不会继续占用并发
+    assert first.index == 4
+    assert model.active == 0
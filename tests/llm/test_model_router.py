@@ -0,0 +1,111 @@
+from typing import Optional
+
+import anyio
+import pytest
+
+from src.agents.llm.base import BaseModel
+from src.agents.llm.manager import ModelManager
+from src.agents.llm.registry import ModelRegistry
+from src.agents.llm.router import LatencyStats, ModelRouter
+
+
+class TimedModel(BaseModel):
+    def __init__(self, name: str, delay_s: float, error: Optional[str] = None):
+        self._name = name
+        self.delay_s = delay_s
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def provider(self) -> str:
+        return "test"
+
+    @property
+    def function_calling(self) -> bool:
+        return False
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        try:
+            await anyio.sleep(self.delay_s)
+        except anyio.get_cancelled_exc_class():
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise RuntimeError(self.error)
+        return f"{self.name}:{prompt}"
+
+
+def _manager(*models: BaseModel, **router_kwargs) -> ModelManager:
+    registry = ModelRegistry()
+    for model in models:
+        registry.register(model)
+    manager = ModelManager(registry, ModelRouter(registry, **router_kwargs))
+    manager.set_model_group("chat", [model.name for model in models])
+    return manager
+
+
+def test_latency_stats_percentiles() -> None:
+    stats = LatencyStats(window=3)
+    for latency in (5.0, 1.0, 2.0, 3.0):
+        stats.record(latency, ok=latency != 3.0)
+    assert stats.samples == 3
+    assert stats.percentile(0.5) == 2.0
+    assert stats.percentile(0.95) == 3.0
+    assert stats.error_rate == pytest.approx(1 / 3)
+
+
+@pytest.mark.anyio
+async def test_router_prefers_fastest_healthy_model() -> None:
+    slow = TimedModel("slow", 0.03)
+    fast = TimedModel("fast", 0.0)
+    broken = TimedModel("broken", 0.0, error="down")
+    manager = _manager(slow, fast, broken, min_samples=2)
+
+    # 预热：每个模型都积累到足够样本
+    for _ in range(6):
+        try:
+            await manager.generate("hi", group="chat", max_retries=0)
+        except RuntimeError:
+            pass
+
+    ranked = [model.name for model in manager.router.rank("chat")]
+    assert ranked == ["fast", "slow", "broken"]
+    assert await manager.generate("hi", group="chat") == "fast:hi"
+
+
+@pytest.mark.anyio
+async def test_hedged_request_takes_faster_backup() -> None:
+    stuck = TimedModel("stuck", 5.0)
+    backup = TimedModel("backup", 0.0)
+    manager = _manager(stuck, backup, hedge=True, hedge_delay_s=0.05)
+
+    with anyio.fail_after(2):
+        result = await manager.generate("hi", group="chat")
+
+    assert result == "backup:hi"
+    assert stuck.cancelled == 1
+    stats = manager.router.stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+    # 被取消的首选请求只计为截尾样本，不进入延迟分位数
+    stuck_stats = manager.router.stats_for("stuck")
+    assert stuck_stats.percentile(0.5) is None
+    assert stuck_stats.censored == 1
+
+
+@pytest.mark.anyio
+async def test_hedge_starts_backup_immediately_when_primary_fails() -> None:
+    failing = TimedModel("failing", 0.0, error="boom")
+    backup = TimedModel("backup", 0.0)
+    manager = _manager(failing, backup, hedge=True, hedge_delay_s=5.0)
+
+    with anyio.fail_after(2):
+        result = await manager.generate("hi", group="chat", max_retries=0)
+
+    assert result == "backup:hi"
+    assert manager.router.stats_for("failing").error_rate == 1.0
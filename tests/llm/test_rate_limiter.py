@@ -0,0 +1,120 @@
+import anyio
+import httpx
+import pytest
+
+from src.agents.llm.base import BaseModel
+from src.agents.llm.rate_limiter import (
+    RateLimiter,
+    TokenBucket,
+    parse_duration,
+    retry_after_from_error,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ThrottledError(Exception):
+    def __init__(self, headers: dict) -> None:
+        super().__init__("429")
+        self.response = httpx.Response(429, headers=headers)
+
+
+class FlakyModel(BaseModel):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return "flaky"
+
+    @property
+    def provider(self) -> str:
+        return "test"
+
+    @property
+    def function_calling(self) -> bool:
+        return False
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        if self.calls == 1:
+            raise ThrottledError({"retry-after-ms": "50"})
+        return "ok"
+
+
+def test_token_bucket_refills_per_minute() -> None:
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now = 30.0
+    assert bucket.level == pytest.approx(30.0)
+    # 超过容量的请求按容量计算，不会永远等待
+    assert bucket.wait_time(1000) == pytest.approx(30.0)
+
+
+def test_headers_adjust_limiter() -> None:
+    clock = FakeClock()
+    limiter = RateLimiter(requests_per_min=100, tokens_per_min=1000, clock=clock)
+    limiter.update_from_headers(
+        {
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "1m30s",
+            "x-ratelimit-remaining-tokens": "200",
+        }
+    )
+    assert limiter.stats()["blocked_for_s"] == pytest.approx(90.0)
+    assert limiter.tokens is not None and limiter.tokens.level == pytest.approx(200)
+
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("6m0s") == pytest.approx(360.0)
+    assert retry_after_from_error(ThrottledError({"retry-after": "3"})) == 3.0
+    assert retry_after_from_error(RuntimeError("x")) is None
+
+    # 无法解析的 retry-after-ms 被忽略，继续读取 retry-after
+    limiter.update_from_headers({"retry-after-ms": "soon", "retry-after": "120"})
+    assert limiter.stats()["blocked_for_s"] == pytest.approx(120.0)
+
+
+@pytest.mark.anyio
+async def test_waiters_are_served_round_robin_across_keys() -> None:
+    # 每秒补充 20 个请求，初始名额已用完
+    limiter = RateLimiter(requests_per_min=1200)
+    assert limiter.requests is not None
+    limiter.requests.consume(limiter.requests.capacity)
+    order = []
+
+    async def call(key: str, n: int) -> None:
+        await limiter.acquire(key=key)
+        order.append(f"{key}{n}")
+
+    async with anyio.create_task_group() as tg:
+        for n in range(4):
+            tg.start_soon(call, "batch", n)
+        await anyio.sleep(0.01)
+        tg.start_soon(call, "chat", 0)
+
+    # 批量会话先排了 4 个请求，交互会话的请求只需等待正在放行的那一个
+    assert order.index("chat0") == 1
+    assert limiter.stats()["throttled"] >= 1
+    assert limiter.waiting() == 0
+
+
+@pytest.mark.anyio
+async def test_retry_honours_retry_after_and_limiter() -> None:
+    model = FlakyModel()
+    model.rate_limiter = RateLimiter(requests_per_min=600)
+    start = anyio.current_time()
+    result = await model.generate_with_retry(
+        "hi", backoff_s=0, rate_limit_key="session-1"
+    )
+    assert result == "ok"
+    assert model.calls == 2
+    assert anyio.current_time() - start >= 0.05
+    assert model.rate_limiter.stats()["acquired"] == 2
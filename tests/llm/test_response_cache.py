@@ -0,0 +1,110 @@
+import pytest
+
+from src.agents.llm.base import BaseModel, ToolCall, ToolCallResponse
+from src.agents.llm.response_cache import (
+    LRUCacheBackend,
+    ResponseCache,
+    SqliteCacheBackend,
+)
+
+
+class CountingModel(BaseModel):
+    def __init__(self, temperature: float = 0.0) -> None:
+        self.temperature = temperature
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return "counting"
+
+    @property
+    def provider(self) -> str:
+        return "test"
+
+    @property
+    def function_calling(self) -> bool:
+        return True
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        return f"{prompt}#{self.calls}"
+
+    async def generate_tool_calls(self, prompt, tools, **kwargs) -> ToolCallResponse:
+        self.calls += 1
+        return ToolCallResponse(
+            content="t", tool_calls=[ToolCall(id="c1", name="x", arguments={"a": 1})]
+        )
+
+    def get_model_info(self):
+        return {**super().get_model_info(), "temperature": self.temperature}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield LRUCacheBackend(max_entries=2)
+    else:
+        sqlite_backend = SqliteCacheBackend(
+            str(tmp_path / "cache.sqlite3"), max_entries=2
+        )
+        yield sqlite_backend
+        sqlite_backend.close()
+
+
+@pytest.mark.anyio
+async def test_response_cache_hits_misses_and_bypass(backend) -> None:
+    model = CountingModel()
+    model.response_cache = ResponseCache(backend)
+
+    assert await model.generate_with_retry("a") == "a#1"
+    assert await model.generate_with_retry("a") == "a#1"
+    assert await model.generate_with_retry("a", use_cache=False) == "a#2"
+    # 参数不同视为不同的调用
+    assert await model.generate_with_retry("a", max_tokens=5) == "a#3"
+
+    first = await model.generate_tool_calls_with_retry("p", [{"name": "x"}])
+    assert await model.generate_tool_calls_with_retry("p", [{"name": "x"}]) == first
+
+    stats = model.response_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+
+
+@pytest.mark.anyio
+async def test_response_cache_ttl_and_sampling_calls(backend) -> None:
+    now = [0.0]
+    model = CountingModel()
+    model.response_cache = ResponseCache(backend, ttl_s=10, clock=lambda: now[0])
+
+    assert await model.generate_with_retry("a") == "a#1"
+    now[0] = 11
+    assert await model.generate_with_retry("a") == "a#2"
+
+    # 非确定性调用（temperature > 0）不缓存
+    assert await model.generate_with_retry("b", temperature=0.7) == "b#3"
+    assert await model.generate_with_retry("b", temperature=0.7) == "b#4"
+
+
+class KeyedModel(CountingModel):
+    def __init__(self, api_key: str) -> None:
+        super().__init__()
+        self.api_key = api_key
+
+    @property
+    def api_key_hash(self) -> str:
+        return self.api_key
+
+
+@pytest.mark.anyio
+async def test_response_cache_is_scoped_by_api_key() -> None:
+    cache = ResponseCache(LRUCacheBackend())
+    alice, bob = KeyedModel("alice"), KeyedModel("bob")
+    alice.response_cache = bob.response_cache = cache
+
+    assert await alice.generate_with_retry("a") == "a#1"
+    # 不同 API Key 的调用不共享缓存
+    assert await bob.generate_with_retry("a") == "a#1"
+    assert bob.calls == 1
+    assert cache.stats()["hits"] == 0
@@ -0,0 +1,119 @@
+from functools import partial
+
+import anyio
+import pytest
+
+from src.agents.llm.base import BaseModel
+from src.agents.llm.single_flight import SingleFlight
+
+
+class SlowModel(BaseModel):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return "slow"
+
+    @property
+    def provider(self) -> str:
+        return "test"
+
+    @property
+    def function_calling(self) -> bool:
+        return False
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        await anyio.sleep(0.05)
+        if prompt == "boom":
+            raise RuntimeError("boom")
+        return f"{prompt}!"
+
+
+@pytest.mark.anyio
+async def test_identical_concurrent_calls_share_one_request() -> None:
+    model = SlowModel()
+    model.single_flight = SingleFlight()
+    results = []
+
+    async def call(prompt: str) -> None:
+        results.append(await model.generate_with_retry(prompt))
+
+    async with anyio.create_task_group() as tg:
+        for prompt in ["a", "a", "a", "b"]:
+            tg.start_soon(call, prompt)
+
+    assert sorted(results) == ["a!", "a!", "a!", "b!"]
+    assert model.calls == 2
+    assert model.single_flight.stats() == {"in_flight": 0, "leaders": 2, "shared": 2}
+
+    errors = []
+
+    async def failing() -> None:
+        try:
+            await model.generate_with_retry("boom", max_retries=0)
+        except RuntimeError as e:
+            errors.append(e)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(failing)
+        tg.start_soon(failing)
+    assert len(errors) == 2
+    assert model.calls == 3
+
+
+@pytest.mark.anyio
+async def test_cancelled_leader_does_not_fail_waiters() -> None:
+    model = SlowModel()
+    model.single_flight = SingleFlight()
+    leader_scope = anyio.CancelScope()
+    results = []
+
+    async def leader() -> None:
+        with leader_scope:
+            await model.generate_with_retry("a")
+
+    async def follower() -> None:
+        results.append(await model.generate_with_retry("a"))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(leader)
+        await anyio.sleep(0.01)
+        tg.start_soon(follower)
+        await anyio.sleep(0.01)
+        leader_scope.cancel()
+
+    # leader 被取消后，等待者重新发起请求并拿到结果
+    assert results == ["a!"]
+    assert model.calls == 2
+    assert model.single_flight.in_flight() == 0
+
+
+class KeyedSlowModel(SlowModel):
+    def __init__(self, api_key: str) -> None:
+        super().__init__()
+        self.api_key = api_key
+
+    @property
+    def api_key_hash(self) -> str:
+        return self.api_key
+
+
+@pytest.mark.anyio
+async def test_only_deterministic_calls_of_the_same_key_are_coalesced() -> None:
+    flights = SingleFlight()
+    alice, bob = KeyedSlowModel("alice"), KeyedSlowModel("bob")
+    alice.single_flight = bob.single_flight = flights
+
+    async with anyio.create_task_group() as tg:
+        # 不同 API Key 的相同请求各自发起
+        tg.start_soon(alice.generate_with_retry, "a")
+        tg.start_soon(bob.generate_with_retry, "a")
+        # 采样调用不合并
+        tg.start_soon(partial(alice.generate_with_retry, "b", temperature=0.7))
+        tg.start_soon(partial(alice.generate_with_retry, "b", temperature=0.7))
+
+    assert alice.calls == 3
+    assert bob.calls == 1
+    assert flights.stats()["shared"] == 0
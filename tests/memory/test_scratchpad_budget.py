@@ -0,0 +1,80 @@
+import pytest
+
+from src.agents.memory.scratchpad_budget import ScratchpadBudget
+
+
+def _count(text: str) -> int:
+    # 测试中按单词计数，结果与 tiktoken 是否可用无关
+    return len(text.split())
+
+
+def _scratchpad(steps: int, words: int = 50) -> str:
+    parts = []
+    for step in range(steps):
+        parts.append(f"Thought: step {step}\n")
+        parts.append("Action: batch-file-search\n")
+        parts.append('Action Input: {"pattern": "*.py"}\n')
+        parts.append("Observation: " + " ".join(f"f{step}_{i}" for i in range(words)))
+        parts.append("\n")
+    return "".join(parts)
+
+
+def test_under_budget_is_untouched() -> None:
+    budget = ScratchpadBudget(10_000, count_tokens=_count)
+    text = _scratchpad(3)
+    result = budget.compact(text)
+    assert result.text == text
+    assert not result.compacted
+
+
+def test_old_observations_are_elided_and_recent_kept() -> None:
+    budget = ScratchpadBudget(200, keep_last=2, preview_chars=20, count_tokens=_count)
+    text = _scratchpad(5)
+    result = budget.compact(text, reserved_tokens=20)
+
+    assert result.tokens <= 180
+    assert result.elided_observations[:2] == [1, 2]
+    assert (
+        "Observation: [已省略第 1 个观察结果，约 51 tokens；开头：f0_0" in result.text
+    )
+    # 最近两个观察结果保持原样
+    assert " ".join(f"f4_{i}" for i in range(50)) in result.text
+    assert " ".join(f"f3_{i}" for i in range(50)) in result.text
+    # 决策记录不受影响
+    assert result.text.count("Action: batch-file-search") == 5
+
+    # 压缩结果稳定：再次压缩不会继续改写
+    again = budget.compact(result.text, reserved_tokens=20)
+    assert again.text == result.text
+
+
+def test_drops_oldest_segments_when_eliding_is_not_enough() -> None:
+    budget = ScratchpadBudget(120, keep_last=1, count_tokens=_count)
+    result = budget.compact(_scratchpad(6))
+
+    assert result.dropped_segments > 0
+    assert result.text.startswith(f"[已省略早期 {result.dropped_segments} 段记录]")
+    assert " ".join(f"f5_{i}" for i in range(50)) in result.text
+    assert "Action Input" in result.text.split("Observation:")[-2]
+
+
+@pytest.mark.parametrize("steps", [3, 8, 14, 20])
+@pytest.mark.parametrize("keep_last", [0, 1, 2])
+def test_drops_whole_steps(steps: int, keep_last: int) -> None:
+    budget = ScratchpadBudget(60, keep_last=keep_last, count_tokens=_count)
+    result = budget.compact(_scratchpad(steps))
+
+    assert result.dropped_segments % 4 == 0
+    if result.dropped_segments:
+        body = result.text.split("段记录]\n", 1)[1]
+        # 丢弃后从完整的一步开始，不会留下缺少工具名的参数或孤立的观察结果
+        assert body.startswith("Thought:")
+
+    # 再次压缩同样按整组丢弃
+    again = budget.compact(result.text)
+    assert again.text.split("段记录]\n", 1)[-1].startswith("Thought:")
+
+
+def test_invalid_budget() -> None:
+    with pytest.raises(ValueError):
+        ScratchpadBudget(0)
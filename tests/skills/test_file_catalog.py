@@ -0,0 +1,71 @@
+import os
+
+from src.utils.file_catalog import FileCatalog
+
+
+def _backdate(path, seconds: int = 60) -> None:
+    # 目录 mtime 离扫描时刻过近时会被强制重扫，测试中先把时间调早
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - seconds * 1_000_000_000))
+
+
+def _tree(tmp_path):
+    root = tmp_path / "root"
+    (root / "sub" / "deep").mkdir(parents=True)
+    (root / "a.txt").write_text("a", encoding="utf-8")
+    (root / "b.LOG").write_text("b", encoding="utf-8")
+    (root / "sub" / "c.txt").write_text("c", encoding="utf-8")
+    (root / "sub" / "deep" / "d.md").write_text("d", encoding="utf-8")
+    for d in (root, root / "sub", root / "sub" / "deep"):
+        _backdate(d)
+    return root
+
+
+def test_catalog_lists_files_like_walk(tmp_path) -> None:
+    root = _tree(tmp_path)
+    catalog = FileCatalog(str(tmp_path / "catalog.sqlite3"))
+
+    names = sorted(name for _, name in catalog.iter_files(str(root)))
+    assert names == ["a.txt", "b.LOG", "c.txt", "d.md"]
+
+    top = [name for _, name in catalog.iter_files(str(root), recursive=False)]
+    assert sorted(top) == ["a.txt", "b.LOG"]
+
+    logs = [name for _, name in catalog.iter_files(str(root), exts=[".log"])]
+    assert logs == ["b.LOG"]
+
+
+def test_refresh_only_rescans_changed_directories(tmp_path) -> None:
+    root = _tree(tmp_path)
+    catalog = FileCatalog(str(tmp_path / "catalog.sqlite3"))
+
+    assert catalog.refresh(str(root)) == 3
+    assert catalog.refresh(str(root)) == 0
+
+    (root / "sub" / "e.txt").write_text("e", encoding="utf-8")
+    assert catalog.refresh(str(root)) == 1
+    assert "e.txt" in {name for _, name in catalog.iter_files(str(root))}
+
+
+def test_removed_directories_are_forgotten(tmp_path) -> None:
+    root = _tree(tmp_path)
+    catalog = FileCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.refresh(str(root))
+
+    (root / "sub" / "deep" / "d.md").unlink()
+    (root / "sub" / "deep").rmdir()
+    names = {name for _, name in catalog.iter_files(str(root))}
+    assert names == {"a.txt", "b.LOG", "c.txt"}
+    assert catalog.stats()["dirs"] == 2
+
+
+def test_sibling_with_common_prefix_is_not_included(tmp_path) -> None:
+    root = _tree(tmp_path)
+    sibling = tmp_path / "root2"
+    sibling.mkdir()
+    (sibling / "x.txt").write_text("x", encoding="utf-8")
+    catalog = FileCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.refresh(str(sibling))
+
+    names = {name for _, name in catalog.iter_files(str(root))}
+    assert "x.txt" not in names
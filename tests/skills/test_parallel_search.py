@@ -0,0 +1,145 @@
+import os
+
+import pytest
+
+from src.utils.tool_utils import count_matches, iter_files, parallel_search
+
+
+def _files(tmp_path, count: int):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"f{i:03d}.txt"
+        path.write_text(f"row {i}\nTODO item {i}" if i % 3 == 0 else "nothing", "utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def test_count_matches(tmp_path) -> None:
+    path = tmp_path / "a.txt"
+    path.write_text("todo TODO ToDo", encoding="utf-8")
+    assert count_matches(str(path), "todo", False, False) == 1
+    assert count_matches(str(path), "todo", True, False) == 3
+    assert count_matches(str(path), "todo", True, True) == 1
+    assert count_matches(str(tmp_path / "missing.txt"), "x", False, False) is None
+
+
+def test_parallel_search_keeps_input_order(tmp_path) -> None:
+    paths = _files(tmp_path, 40)
+    expected = [(p, count_matches(p, r"TODO item \d+", True, True)) for p in paths]
+    results = list(
+        parallel_search(paths, r"TODO item \d+", True, True, workers=2, chunk_size=4)
+    )
+    assert results == expected
+
+
+def test_parallel_search_can_stop_early(tmp_path) -> None:
+    paths = _files(tmp_path, 40)
+    results = parallel_search(paths, "todo", workers=2, chunk_size=4)
+    first = [next(results) for _ in range(5)]
+    results.close()
+    assert [p for p, _ in first] == paths[:5]
+
+
+@pytest.mark.parametrize("use_catalog", [False, True])
+def test_scandir_walk_with_and_without_catalog(
+    tmp_path, monkeypatch, use_catalog
+) -> None:
+    from src.config import settings
+
+    catalog_path = str(tmp_path / "catalog" / "files.sqlite3")
+    monkeypatch.setattr(
+        settings, "FILE_CATALOG_PATH", catalog_path if use_catalog else None
+    )
+    root = tmp_path / "root"
+    (root / "sub").mkdir(parents=True)
+    (root / "b.txt").write_text("b", encoding="utf-8")
+    (root / "a.md").write_text("a", encoding="utf-8")
+    (root / "sub" / "c.txt").write_text("c", encoding="utf-8")
+
+    names = [name for _, name in iter_files(str(root))]
+    assert names == ["a.md", "b.txt", "c.txt"]
+    top = [name for _, name in iter_files(str(root), recursive=False)]
+    assert top == ["a.md", "b.txt"]
+    assert [n for _, n in iter_files(str(root), allowed_exts=[".md"])] == ["a.md"]
+    assert os.path.exists(catalog_path) == use_catalog
+
+
+def test_relative_root_paths_match_with_and_without_catalog(
+    tmp_path, monkeypatch
+) -> None:
+    from src.agents.tools.scripts import batch_search
+    from src.config import settings
+    from src.utils import tool_utils
+
+    # 相对路径按当前目录解析，就地匹配，不依赖已启动的进程池的工作目录
+    monkeypatch.setattr(tool_utils, "_inline_search", True)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "ws" / "sub").mkdir(parents=True)
+    (tmp_path / "ws" / "a.txt").write_text("TODO a", encoding="utf-8")
+    (tmp_path / "ws" / "sub" / "b.txt").write_text("TODO b", encoding="utf-8")
+
+    results = {}
+    for use_catalog in (False, True):
+        catalog_path = str(tmp_path / "catalog.sqlite3") if use_catalog else None
+        monkeypatch.setattr(settings, "FILE_CATALOG_PATH", catalog_path)
+        result = batch_search.batch_search_files("ws", "todo")
+        results[use_catalog] = [item["path"] for item in result["matched_files"]]
+
+    expected = [os.path.join("ws", "a.txt"), os.path.join("ws", "sub", "b.txt")]
+    assert results[False] == results[True] == expected
+
+
+def test_search_stops_at_limit_and_reports_more(tmp_path, monkeypatch) -> None:
+    from src.agents.tools.scripts import batch_search
+
+    _files(tmp_path, 40)
+    search = batch_search.iter_search_files(str(tmp_path), "todo", max_results=3)
+    items = []
+    while True:
+        try:
+            items.append(next(search))
+        except StopIteration as stop:
+            result = stop.value
+            break
+
+    assert [item["path"] for item in items] == [
+        str(tmp_path / f"f{i:03d}.txt") for i in (0, 3, 6)
+    ]
+    assert result["matched_count"] == 3
+    assert result["has_more"] is True
+    # 第三个匹配之后不再检查其余文件
+    assert result["processed_count"] == 7
+
+    full = batch_search.batch_search_files(str(tmp_path), "todo")
+    assert full["matched_count"] == 14
+    assert full["has_more"] is False
+
+
+@pytest.mark.anyio
+async def test_skill_stream_yields_matches_then_result(tmp_path) -> None:
+    from src.agents.tools.registry import ToolRegistry
+
+    _files(tmp_path, 10)
+    registry = ToolRegistry()
+    registry.scan_skills()
+    tool = registry.get_tool("batch-file-search")
+    assert tool is not None
+
+    items = [
+        item async for item in tool.stream(search_path=str(tmp_path), keyword="todo")
+    ]
+    assert [item.final for item in items] == [False] * 4 + [True]
+    assert items[0].data["path"] == str(tmp_path / "f000.txt")
+    assert items[-1].data["matched_count"] == 4
+
+
+def test_default_search_workers_are_capped(monkeypatch) -> None:
+    from src.config import settings
+    from src.utils import tool_utils
+
+    monkeypatch.setattr(settings, "SEARCH_PROCESS_WORKERS", None)
+    monkeypatch.setattr(tool_utils.os, "cpu_count", lambda: 64)
+    assert tool_utils._search_workers() == tool_utils._MAX_DEFAULT_SEARCH_WORKERS
+
+    monkeypatch.setattr(tool_utils, "_inline_search", True)
+    assert tool_utils._search_workers() == 1
@@ -0,0 +1,198 @@
+import os
+import threading
+
+import anyio
+import pytest
+
+from src.agents.tools.executor import (
+    SkillExecutor,
+    SkillExecutorBusyError,
+    SkillModuleCache,
+)
+from src.agents.tools.registry import SkillTool
+
+
+@pytest.mark.anyio
+async def test_skill_executor_runs_script_off_event_loop(tmp_path) -> None:
+    script = tmp_path / "echo_skill.py"
+    script.write_text(
+        "import threading\n"
+        "def run(value):\n"
+        "    return {'value': value, 'thread': threading.current_thread().name}\n",
+        encoding="utf-8",
+    )
+
+    executor = SkillExecutor(thread_workers=1, process_workers=1, max_queue_depth=2)
+    try:
+        result = await executor.submit("thread", script, {"value": 1})
+    finally:
+        executor.shutdown()
+
+    assert result["value"] == 1
+    assert result["thread"] != threading.current_thread().name
+    assert executor.in_flight("thread") == 0
+
+
+@pytest.mark.anyio
+async def test_skill_executor_rejects_when_queue_is_full(tmp_path) -> None:
+    script = tmp_path / "slow_skill.py"
+    script.write_text(
+        "import time\n"
+        "def run(delay):\n"
+        "    time.sleep(delay)\n"
+        "    return 'done'\n",
+        encoding="utf-8",
+    )
+
+    executor = SkillExecutor(thread_workers=1, process_workers=1, max_queue_depth=1)
+    results = []
+
+    async def _first() -> None:
+        results.append(await executor.submit("thread", script, {"delay": 0.2}))
+
+    try:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(_first)
+            await anyio.sleep(0.05)
+            with pytest.raises(SkillExecutorBusyError):
+                await executor.submit("thread", script, {"delay": 0})
+    finally:
+        executor.shutdown()
+
+    assert results == ["done"]
+
+
+def test_skill_module_cache_reuses_and_invalidates_on_change(tmp_path) -> None:
+    script = tmp_path / "versioned_skill.py"
+    script.write_text("VERSION = 1\n", encoding="utf-8")
+
+    cache = SkillModuleCache(check_interval_s=3600)
+    first = cache.load(str(script))
+    assert cache.load(str(script)) is first
+
+    script.write_text("VERSION = 22\n", encoding="utf-8")
+    # 校验间隔内沿用缓存，hot_reload 会立即发现变化
+    assert cache.load(str(script)) is first
+    reloaded = cache.load(str(script), hot_reload=True)
+    assert reloaded is not first
+    assert reloaded.VERSION == 22
+
+    cache.invalidate(str(script))
+    assert len(cache) == 0
+
+
+@pytest.mark.anyio
+async def test_waiting_on_skill_does_not_hold_worker_threads(tmp_path) -> None:
+    script = tmp_path / "slow_skill.py"
+    script.write_text(
+        "import time\n"
+        "def run(delay):\n"
+        "    time.sleep(delay)\n"
+        "    return 'done'\n",
+        encoding="utf-8",
+    )
+
+    executor = SkillExecutor(thread_workers=1, process_workers=1, max_queue_depth=4)
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    results = []
+
+    async def _submit() -> None:
+        results.append(await executor.submit("thread", script, {"delay": 0.1}))
+
+    try:
+        async with anyio.create_task_group() as tg:
+            for _ in range(3):
+                tg.start_soon(_submit)
+            await anyio.sleep(0.05)
+            # 排队中的任务不占用 anyio 的工作线程名额
+            assert limiter.borrowed_tokens == 0
+    finally:
+        executor.shutdown()
+
+    assert results == ["done"] * 3
+
+
+@pytest.mark.anyio
+async def test_process_pool_workers_search_inline(tmp_path) -> None:
+    script = tmp_path / "search_workers.py"
+    script.write_text(
+        "from src.utils import tool_utils\n"
+        "def run():\n"
+        "    return tool_utils._search_workers(), tool_utils._search_pool is None\n",
+        encoding="utf-8",
+    )
+
+    executor = SkillExecutor(thread_workers=1, process_workers=1, max_queue_depth=2)
+    try:
+        result = await executor.submit("process", script, {})
+    finally:
+        executor.shutdown()
+
+    # 技能工作进程中不再嵌套创建匹配进程池
+    assert tuple(result) == (1, True)
+
+
+_STREAM_SCRIPT = (
+    "import os\n"
+    "import time\n"
+    "def stream(count, delay=0.0):\n"
+    "    time.sleep(delay)\n"
+    "    for index in range(count):\n"
+    "        yield {'index': index, 'pid': os.getpid()}\n"
+    "    return {'count': count}\n"
+)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("pool", ["thread", "process"])
+async def test_skill_executor_streams_items_then_result(tmp_path, pool) -> None:
+    script = tmp_path / "stream_skill.py"
+    script.write_text(_STREAM_SCRIPT, encoding="utf-8")
+
+    executor = SkillExecutor(thread_workers=1, process_workers=1, max_queue_depth=1)
+    try:
+        with anyio.fail_after(30):
+            async with executor.stream(
+                pool, script, {"count": 3, "delay": 0.2}
+            ) as items:
+                # 流式任务与 submit 共用排队上限
+                with pytest.raises(SkillExecutorBusyError):
+                    await executor.submit(pool, script, {})
+                received = [item async for item in items]
+    finally:
+        executor.shutdown()
+
+    assert [done for done, _ in received] == [False] * 3 + [True]
+    assert [value["index"] for _, value in received[:3]] == [0, 1, 2]
+    assert received[-1][1] == {"count": 3}
+    pids = {value["pid"] for _, value in received[:3]}
+    assert (pids == {os.getpid()}) == (pool == "thread")
+
+
+@pytest.mark.anyio
+async def test_skill_tool_stream_reports_errors_and_stops_early(tmp_path) -> None:
+    skill_dir = tmp_path / "stream-skill"
+    skill_dir.mkdir()
+    (skill_dir / "SKILL.md").write_text(
+        "---\nname: stream-skill\ndescription: test\n---\n", encoding="utf-8"
+    )
+    script = skill_dir / "stream_skill.py"
+    script.write_text(_STREAM_SCRIPT, encoding="utf-8")
+
+    executor = SkillExecutor(thread_workers=1, process_workers=1, max_queue_depth=1)
+    tool = SkillTool(skill_dir, script, executor=executor)
+    try:
+        # 参数错误转换为错误结果，而不是抛出异常
+        items = [item async for item in tool.stream(unknown=1)]
+        assert len(items) == 1 and items[0].final
+        assert "unknown" in items[0].data["error"]
+
+        stream = tool.stream(count=1000)
+        first = await stream.__anext__()
+        assert first.data["index"] == 0
+        await stream.aclose()
+        with anyio.fail_after(5):
+            while executor.in_flight("thread"):
+                await anyio.sleep(0.01)
+    finally:
+        executor.shutdown()
@@ -0,0 +1,100 @@
+import os
+import re
+
+import pytest
+
+from src.utils.text_stream import (
+    BinaryFileError,
+    contains_text,
+    detect_text_encoding,
+    iter_regex_segments,
+    replace_in_file,
+)
+
+
+def _chunks(text: str, size: int):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize(
+    "regex",
+    [r"ab+c", r"(?<=x)ab", r"\bab\b", r"^ab", r"(?m)^ab$", r"a*", r"c$", r"b\n?a"],
+)
+def test_regex_segments_match_whole_text(regex) -> None:
+    text = "ab abc xab abbbc\nab\nzzab c ab" * 3 + "c"
+    pattern = re.compile(regex)
+    for size in (1, 3, 7, 64):
+        segments = list(iter_regex_segments(_chunks(text, size), pattern, overlap=8))
+        matches = [m.group(0) for _, m in segments if m]
+        assert matches == pattern.findall(text)
+        rebuilt = "".join(t + (m.group(0) if m else "") for t, m in segments)
+        assert rebuilt == text
+
+
+def test_contains_text_across_chunks() -> None:
+    chunks = _chunks("hello wORLD again", 4)
+    assert contains_text(chunks, "World", ignore_case=True)
+    assert not contains_text(chunks, "World", ignore_case=False)
+
+
+def test_detect_encoding_and_binary(tmp_path) -> None:
+    utf8 = tmp_path / "a.txt"
+    utf8.write_text("中文内容", encoding="utf-8")
+    latin = tmp_path / "b.txt"
+    latin.write_bytes("café".encode("latin-1"))
+    binary = tmp_path / "c.bin"
+    binary.write_bytes(b"\x89PNG\x00\x01")
+
+    assert detect_text_encoding(str(utf8)) == "utf-8"
+    assert detect_text_encoding(str(latin)) == "latin-1"
+    with pytest.raises(BinaryFileError):
+        detect_text_encoding(str(binary))
+
+
+def test_replace_in_file_streams_and_preserves_file(tmp_path) -> None:
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"v1.0 first\r\nv1.0 second\r\n" * 100)
+    assert replace_in_file(str(path), r"v(\d)\.0", r"v\1.1", is_regex=True) == 200
+    data = path.read_bytes()
+    assert data == b"v1.1 first\r\nv1.1 second\r\n" * 100
+
+    # 没有匹配时不重写文件
+    stat = os.stat(path)
+    assert replace_in_file(str(path), "missing", "x") == 0
+    assert os.stat(path).st_mtime_ns == stat.st_mtime_ns
+    assert [p.name for p in tmp_path.iterdir()] == ["a.txt"]
+
+
+def test_replace_keeps_symlinks_and_hardlinks(tmp_path) -> None:
+    target = tmp_path / "target.txt"
+    target.write_text("old value\n", encoding="utf-8")
+    link = tmp_path / "link.txt"
+    link.symlink_to(target)
+    hard = tmp_path / "hard.txt"
+    os.link(target, hard)
+
+    assert replace_in_file(str(link), "old", "new") == 1
+    # 链接本身保持为符号链接，内容写入其指向的文件
+    assert link.is_symlink()
+    assert target.read_text(encoding="utf-8") == "new value\n"
+    # 硬链接共享同一份内容
+    assert hard.read_text(encoding="utf-8") == "new value\n"
+    assert os.stat(hard).st_ino == os.stat(target).st_ino
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "hard.txt",
+        "link.txt",
+        "target.txt",
+    ]
+
+    # 只有一个硬链接时仍原子替换目标文件，符号链接保持不变
+    hard.unlink()
+    assert replace_in_file(str(link), "new", "newer") == 1
+    assert link.is_symlink()
+    assert target.read_text(encoding="utf-8") == "newer value\n"
+
+
+def test_replace_falls_back_to_latin1_after_sniff_window(tmp_path) -> None:
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"x" * 10000 + "café old".encode("latin-1"))
+    assert replace_in_file(str(path), "old", "new") == 1
+    assert path.read_bytes().endswith("café new".encode("latin-1"))
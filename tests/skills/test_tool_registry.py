@@ -0,0 +1,76 @@
+import json
+from typing import Any, Dict
+
+from src.agents.tools.base_tool import BaseTool
+from src.agents.tools.registry import ToolRegistry
+from src.agents.tools.result_shaping import ResultLimits
+
+
+class CountingTool(BaseTool):
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self.parameter_reads = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return f"{self._name} tool"
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        self.parameter_reads += 1
+        return {"type": "object", "properties": {}, "required": []}
+
+    async def run(self, **kwargs) -> Any:
+        return None
+
+
+def test_render_is_cached_per_version_and_allowed_tools(tmp_path) -> None:
+    registry = ToolRegistry(skills_dir=str(tmp_path), scripts_dir=str(tmp_path))
+    a, b = CountingTool("a"), CountingTool("b")
+    registry.register(a)
+    registry.register(b)
+    version = registry.version
+
+    rendered = registry.render()
+    reads = a.parameter_reads
+    assert registry.render() is rendered
+    assert rendered.names == "a, b"
+    assert a.parameter_reads == reads
+
+    only_b = registry.render({"b"})
+    assert only_b.names == "b"
+    assert registry.render(frozenset({"b"})) is only_b
+
+    registry.unregister("a")
+    assert registry.version > version
+    assert registry.render().names == "b"
+    assert [t["function"]["name"] for t in registry.get_openai_tools()] == ["b"]
+
+
+def test_format_observation_truncates_large_results_with_handle(tmp_path) -> None:
+    registry = ToolRegistry(
+        skills_dir=str(tmp_path),
+        scripts_dir=str(tmp_path),
+        result_limits=ResultLimits(max_items=3, max_bytes=4096),
+    )
+    tool = CountingTool("copy")
+    small = {"success": True, "copied_files": ["a", "b"]}
+    assert registry.format_observation(tool, small) == str(small)
+    assert len(registry.result_store) == 0
+
+    big = {"success": True, "copied_files": [f"f{i}.txt" for i in range(10_000)]}
+    observation = registry.format_observation(tool, big)
+    shaped = json.loads(observation)
+    assert shaped["copied_files"] == ["f0.txt", "f1.txt", "f2.txt"]
+    assert shaped["_truncated"]["totals"] == {"copied_files": 10_000}
+    assert registry.result_store.get(shaped["_result_handle"]) == ("copy", big)
+
+    # 工具自身的上限优先于注册表默认值，字节上限同样生效
+    tool.result_limits = ResultLimits(max_items=10_000, max_bytes=200)
+    observation = registry.format_observation(tool, big)
+    assert len(observation.encode("utf-8")) <= 200
+    assert "完整结果句柄" in observation
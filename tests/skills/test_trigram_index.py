@@ -0,0 +1,63 @@
+import os
+
+from src.utils.trigram_index import TrigramIndex, TrigramQuery, build_query
+
+
+def _backdate(path) -> None:
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - 60 * 1_000_000_000))
+
+
+def test_literal_query_requires_all_trigrams() -> None:
+    query = build_query("Hello", is_regex=False, case_sensitive=True)
+    assert query == TrigramQuery("and", ["ell", "hel", "llo"])
+    assert build_query("ab", is_regex=False, case_sensitive=False) is None
+
+
+def test_regex_query_extracts_required_literals() -> None:
+    query = build_query(r"foo\d+(bar|qux)", is_regex=True, case_sensitive=True)
+    assert query == TrigramQuery("and", ["foo", TrigramQuery("or", ["bar", "qux"])])
+    # 可选部分不产生约束
+    assert build_query(r"(abc)?x", is_regex=True, case_sensitive=True) is None
+    assert build_query(r"a.c", is_regex=True, case_sensitive=True) is None
+    # 任一分支无约束时整个分支无约束
+    assert build_query(r"abc|.", is_regex=True, case_sensitive=True) is None
+
+
+def test_ignorecase_regex_skips_ambiguous_letters() -> None:
+    # 忽略大小写时 s 还能匹配 ſ，不能用于过滤
+    query = build_query("subject", is_regex=True, case_sensitive=False)
+    assert query == TrigramQuery("and", ["bje", "ect", "jec", "ubj"])
+    assert build_query("mission", is_regex=True, case_sensitive=False) is None
+    assert build_query("合同编号", is_regex=True, case_sensitive=False) == (
+        TrigramQuery("and", ["合同编", "同编号"])
+    )
+
+
+def test_candidates_filter_and_update_incrementally(tmp_path) -> None:
+    a = tmp_path / "a.txt"
+    b = tmp_path / "b.txt"
+    big = tmp_path / "big.txt"
+    a.write_text("the quick brown fox", encoding="utf-8")
+    b.write_text("lorem ipsum", encoding="utf-8")
+    big.write_text("x" * 200, encoding="utf-8")
+    for p in (a, b, big):
+        _backdate(p)
+    paths = [str(a), str(b), str(big)]
+    index = TrigramIndex(str(tmp_path / "index.sqlite3"), max_file_bytes=100)
+
+    query = build_query("Quick", is_regex=False, case_sensitive=False)
+    # 超过大小上限的文件不建索引，始终保留为候选
+    assert index.candidates(paths, query) == [str(a), str(big)]
+    assert index.stats()["files_indexed"] == 3
+
+    assert index.candidates(paths, query) == [str(a), str(big)]
+    assert index.stats()["files_indexed"] == 3
+
+    b.write_text("quick lorem", encoding="utf-8")
+    assert index.candidates(paths, query) == paths
+    assert index.stats()["files_indexed"] == 4
+
+    b.unlink()
+    assert index.prune(str(tmp_path)) == 1
+    assert index.stats()["files"] == 2